@@ -0,0 +1,384 @@
+import boto3
+import os
+import re
+import logging
+import time
+from decimal import Decimal
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict
+from dynamodb_metrics import instrument, instrumented_handler
+from data_version import get_active_version
+from dynamodb_batch import BATCH_GET_LIMIT, batch_get_items
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+dynamodb = instrument(boto3.resource('dynamodb'))
+
+# Recent ratings are counted per book and day; the trending list ranks books by
+# their ratings over the last TRENDING_DAYS days
+TRENDING_LIST_ID = 'trending'
+TRENDING_DAYS = 7
+TRENDING_REFRESH_SECONDS = 300
+MAX_LIST_BOOKS = 50
+
+# Rating changes are also folded into each book's totals in the active Books table and
+# into the pipeline's popular:* and top_rated:* lists the book belongs to. Lists are
+# written with an optimistic revision check and reread when another batch got there first
+LIST_UPDATE_ATTEMPTS = 3
+AVERAGE_PRECISION = Decimal('0.001')
+
+# Each stream record is applied in one transaction with a marker item keyed by its event
+# ID, so a batch the stream retries skips the records that were already counted. Markers
+# live in the rating activity table under their own partition and expire with the counters
+PROCESSED_MARKER_PREFIX = 'event:'
+
+_trending = {'lists_table': None, 'refreshed_at': 0.0}
+
+@instrumented_handler
+def lambda_handler(event, context):
+    """
+    Lambda function consuming the Ratings table stream: adds each rating write to a per-day
+    counter and to its book's totals, reranks the popular lists those books belong to,
+    then refreshes the trending list when it is stale
+    """
+    records = event.get('Records', [])
+    activity_table_name = os.environ['RATING_ACTIVITY_TABLE_NAME']
+
+    # Versions without a lists table have no rating sums on their Books items to add to
+    active_version = get_active_version()
+    books_table_name = active_version.get('books_table') if active_version.get('lists_table') else None
+
+    # A failed record fails the batch so the stream retries it; records applied before
+    # the failure are skipped on the retry
+    expires_at = int(time.time()) + (TRENDING_DAYS + 1) * 86400
+    applied = duplicates = 0
+    changed_isbns = set()
+    for record in records:
+        outcome, isbn = apply_record(record, activity_table_name, books_table_name, expires_at)
+        if outcome == 'applied':
+            applied += 1
+        elif outcome == 'duplicate':
+            duplicates += 1
+        if isbn:
+            # Reranking from the current totals is idempotent, so retried records rerank too
+            changed_isbns.add(isbn)
+
+    updated_books = {}
+    lists_updated = 0
+    if books_table_name and changed_isbns:
+        try:
+            updated_books = get_books(books_table_name, sorted(changed_isbns))
+            lists_updated = update_popular_lists(active_version['lists_table'], updated_books)
+        except Exception as e:
+            # The totals are already applied; the lists catch up when these books are rated again
+            logger.error(f"Error updating popular lists: {str(e)}")
+
+    refreshed = False
+    try:
+        refreshed = refresh_trending_list(dynamodb.Table(activity_table_name))
+    except Exception as e:
+        # The counters are already applied; the next batch retries the refresh
+        logger.error(f"Error refreshing trending list: {str(e)}")
+
+    logger.info(f"Applied {applied} of {len(records)} rating changes ({duplicates} already applied), "
+                f"reranked {len(updated_books)} books in {lists_updated} lists")
+    return {
+        'records': len(records),
+        'applied': applied,
+        'duplicates': duplicates,
+        'books_updated': len(updated_books),
+        'lists_updated': lists_updated,
+        'trending_refreshed': refreshed
+    }
+
+def activity_change(record):
+    """
+    (day, ISBN, rating) of a record that counts as recent activity: every insert or update
+    to an explicit rating (above 0). None for other records.
+    """
+    if record.get('eventName') not in ('INSERT', 'MODIFY'):
+        return None
+    change = record.get('dynamodb', {})
+    image = change.get('NewImage', {})
+    isbn = image.get('isbn', {}).get('S')
+    rating = Decimal(image.get('rating', {}).get('N', '0'))
+    if not isbn or rating <= 0:
+        return None
+    written_at = datetime.fromtimestamp(change.get('ApproximateCreationDateTime', time.time()), timezone.utc)
+    return written_at.strftime('%Y-%m-%d'), isbn, rating
+
+def rating_delta(record):
+    """
+    Net change in (ISBN, explicit rating count, rating sum) of a record: the old rating is
+    taken out and the new one added, so a changed rating moves the sum but not the count.
+    None when the record changes neither.
+    """
+    change = record.get('dynamodb', {})
+    if record.get('eventName') == 'MODIFY' and 'OldImage' not in change:
+        # Without the old image (stream view NEW_IMAGE) an update cannot be told from a new rating
+        return None
+    isbn = None
+    rating_count, rating_sum = 0, Decimal(0)
+    for image, sign in ((change.get('OldImage'), -1), (change.get('NewImage'), 1)):
+        if not image:
+            continue
+        image_isbn = image.get('isbn', {}).get('S')
+        rating = Decimal(image.get('rating', {}).get('N', '0'))
+        if image_isbn and rating > 0:
+            isbn = image_isbn
+            rating_count += sign
+            rating_sum += sign * rating
+    if not isbn or not (rating_count or rating_sum):
+        return None
+    return isbn, rating_count, rating_sum
+
+def apply_record(record, activity_table_name, books_table_name, expires_at):
+    """
+    Apply one stream record's counter and book total changes together with its processed
+    marker in a single transaction. Returns (outcome, ISBN whose totals it changes), where
+    outcome is 'applied', 'duplicate' (its marker already exists) or 'skipped' (nothing to apply).
+    """
+    activity = activity_change(record)
+    delta = rating_delta(record) if books_table_name else None
+    if not activity and not delta:
+        return 'skipped', None
+
+    isbn = activity[1] if activity else delta[0]
+    items = [{
+        'Put': {
+            'TableName': activity_table_name,
+            'Item': {
+                'day': PROCESSED_MARKER_PREFIX + record['eventID'],
+                'isbn': isbn,
+                'expires_at': expires_at
+            },
+            'ConditionExpression': 'attribute_not_exists(#day)',
+            'ExpressionAttributeNames': {'#day': 'day'}
+        }
+    }]
+    if activity:
+        day, _, rating = activity
+        items.append({
+            'Update': {
+                'TableName': activity_table_name,
+                'Key': {'day': day, 'isbn': isbn},
+                'UpdateExpression': 'SET expires_at = if_not_exists(expires_at, :expires_at) ADD rating_count :count, rating_sum :sum',
+                'ExpressionAttributeValues': {':expires_at': expires_at, ':count': 1, ':sum': rating}
+            }
+        })
+    if delta:
+        _, rating_count, rating_sum = delta
+        items.append({
+            'Update': {
+                'TableName': books_table_name,
+                'Key': {'isbn': isbn},
+                'UpdateExpression': 'ADD rating_count :count, rating_sum :sum',
+                'ConditionExpression': 'attribute_exists(isbn)',
+                'ExpressionAttributeValues': {':count': rating_count, ':sum': rating_sum}
+            }
+        })
+
+    # The resource's client takes plain Python values, as the tables do
+    client = dynamodb.meta.client
+    while True:
+        try:
+            client.transact_write_items(TransactItems=items)
+            return 'applied', isbn if delta else None
+        except client.exceptions.TransactionCanceledException as e:
+            reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+            if reasons and reasons[0] == 'ConditionalCheckFailed':
+                return 'duplicate', isbn if delta else None
+            if delta and len(reasons) == len(items) and reasons[-1] == 'ConditionalCheckFailed':
+                # Books the pipeline filtered out have no totals and are in no list
+                items.pop()
+                delta = None
+                continue
+            raise
+
+def list_scopes(book):
+    """Scopes of the popular lists a book belongs to (mirrors the pipeline)"""
+    scopes = ['all']
+    try:
+        year = int(book.get('year_of_publication') or 0)
+    except (TypeError, ValueError):
+        year = 0
+    if year > 0:
+        scopes.append(f"decade:{year // 10 * 10}s")
+    publisher = book.get('publisher')
+    if isinstance(publisher, str):
+        normalized = ' '.join(re.findall(r'\w+', publisher.lower()))
+        if normalized:
+            scopes.append(f"publisher:{normalized}")
+    return scopes
+
+def update_popular_lists(table_name, updated_books):
+    """
+    Rerank the popular:* and top_rated:* lists of each updated book with its new totals,
+    one read and one conditional write per list. Returns the number of lists written.
+    """
+    books_by_list = defaultdict(dict)
+    for isbn, book in updated_books.items():
+        for scope in list_scopes(book):
+            for prefix in ('popular', 'top_rated'):
+                books_by_list[f"{prefix}:{scope}"][isbn] = book
+
+    lists_table = dynamodb.Table(table_name)
+    list_ids = sorted(books_by_list)
+    list_items = {}
+    for start in range(0, len(list_ids), BATCH_GET_LIMIT):
+        keys = [{'list_id': list_id} for list_id in list_ids[start:start + BATCH_GET_LIMIT]]
+        for item in batch_get_items(table_name, keys):
+            list_items[item['list_id']] = item
+
+    # Scopes without a list had too few books when the pipeline ran
+    written = 0
+    for list_id, list_item in list_items.items():
+        for attempt in range(LIST_UPDATE_ATTEMPTS):
+            if put_reranked_list(lists_table, list_item, books_by_list[list_id]):
+                written += 1
+                break
+            list_item = lists_table.get_item(Key={'list_id': list_id}).get('Item')
+            if not list_item:
+                break
+        else:
+            logger.error(f"Gave up updating {list_id} after {LIST_UPDATE_ATTEMPTS} conflicting writes")
+    return written
+
+def put_reranked_list(lists_table, list_item, books):
+    """Write the list with the books' new entries, unless another writer changed it since it was read"""
+    prior_mean = list_item['prior_mean']
+    prior_ratings = list_item['prior_ratings']
+    entries = {entry['isbn']: entry for entry in list_item['books']}
+    for isbn, book in books.items():
+        entries.pop(isbn, None)
+        rating_count = int(book['rating_count'])
+        if rating_count <= 0:
+            continue
+        average = (prior_mean * prior_ratings + book['rating_sum']) / (prior_ratings + rating_count)
+        entries[isbn] = {
+            'isbn': isbn,
+            'title': book['title'],
+            'author': book.get('author'),
+            'rating_count': rating_count,
+            'average_rating': average.quantize(AVERAGE_PRECISION)
+        }
+
+    # A book that drops out is not replaced by the next best one, which the list does
+    # not hold; the lists are rebuilt exactly on the next pipeline run
+    if list_item['metric'] == 'bayesian_average':
+        ranked = sorted(entries.values(), key=lambda entry: (-entry['average_rating'], -entry['rating_count'], entry['isbn']))
+    else:
+        ranked = sorted(entries.values(), key=lambda entry: (-entry['rating_count'], entry['isbn']))
+
+    revision = list_item.get('revision')
+    condition = {'ExpressionAttributeNames': {'#revision': 'revision'}}
+    if revision is None:
+        condition['ConditionExpression'] = 'attribute_not_exists(#revision)'
+    else:
+        condition['ConditionExpression'] = '#revision = :revision'
+        condition['ExpressionAttributeValues'] = {':revision': revision}
+    try:
+        lists_table.put_item(
+            Item=dict(list_item, books=ranked[:MAX_LIST_BOOKS], revision=(revision or 0) + 1),
+            **condition
+        )
+    except lists_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+def refresh_trending_list(activity_table):
+    """
+    Rebuild the trending item in the active version's popular lists table when it is older
+    than TRENDING_REFRESH_SECONDS. Returns whether it was rebuilt.
+    """
+    active_version = get_active_version()
+    lists_table_name = active_version.get('lists_table')
+    if not lists_table_name:
+        return False
+
+    now = time.time()
+    if _trending['lists_table'] == lists_table_name and now - _trending['refreshed_at'] < TRENDING_REFRESH_SECONDS:
+        return False
+
+    # Another container may have refreshed it since
+    lists_table = dynamodb.Table(lists_table_name)
+    current = lists_table.get_item(Key={'list_id': TRENDING_LIST_ID}, ProjectionExpression='refreshed_at').get('Item')
+    if current and now - float(current['refreshed_at']) < TRENDING_REFRESH_SECONDS:
+        _trending.update(lists_table=lists_table_name, refreshed_at=float(current['refreshed_at']))
+        return False
+
+    totals = recent_activity(activity_table, datetime.fromtimestamp(now, timezone.utc))
+    ranked = sorted(totals.items(), key=lambda entry: (-entry[1][0], -entry[1][1], entry[0]))[:MAX_LIST_BOOKS]
+    books_table_name = active_version.get('books_table') or os.environ['BOOKS_TABLE_NAME']
+    details = batch_get_books(books_table_name, [isbn for isbn, _ in ranked])
+
+    books = [
+        {
+            'isbn': isbn,
+            'title': details[isbn]['title'],
+            'author': details[isbn].get('author'),
+            'rating_count': rating_count,
+            'average_rating': round(rating_sum / rating_count, 3)
+        }
+        for isbn, (rating_count, rating_sum) in ranked
+        if isbn in details
+    ]
+
+    try:
+        lists_table.put_item(
+            Item={
+                'list_id': TRENDING_LIST_ID,
+                'label': f"Most rated in the last {TRENDING_DAYS} days",
+                'metric': 'recent_ratings',
+                'books': books,
+                'refreshed_at': Decimal(str(round(now, 3)))
+            },
+            ConditionExpression='attribute_not_exists(refreshed_at) OR refreshed_at < :stale',
+            ExpressionAttributeValues={':stale': Decimal(str(round(now - TRENDING_REFRESH_SECONDS, 3)))}
+        )
+    except lists_table.meta.client.exceptions.ConditionalCheckFailedException:
+        # A concurrent batch refreshed it first
+        return False
+
+    _trending.update(lists_table=lists_table_name, refreshed_at=now)
+    logger.info(f"Refreshed trending list in {lists_table_name} with {len(books)} books")
+    return True
+
+def recent_activity(activity_table, today):
+    """Total (rating count, rating sum) per ISBN over the last TRENDING_DAYS day partitions"""
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for days_ago in range(TRENDING_DAYS):
+        day = (today - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+        query = {
+            'KeyConditionExpression': '#day = :day',
+            'ExpressionAttributeNames': {'#day': 'day'},
+            'ExpressionAttributeValues': {':day': day},
+            'ProjectionExpression': 'isbn, rating_count, rating_sum'
+        }
+        while True:
+            response = activity_table.query(**query)
+            for item in response['Items']:
+                total = totals[item['isbn']]
+                total[0] += int(item['rating_count'])
+                total[1] += item['rating_sum']
+            if 'LastEvaluatedKey' not in response:
+                break
+            query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return {isbn: total for isbn, total in totals.items() if total[0] > 0}
+
+def batch_get_books(table_name, isbns):
+    """Get title and author for up to 100 ISBNs"""
+    keys = [{'isbn': isbn} for isbn in isbns[:BATCH_GET_LIMIT]]
+    return {item['isbn']: item for item in batch_get_items(table_name, keys, ['isbn', 'title', 'author'])}
+
+def get_books(table_name, isbns):
+    """Get the full items of any number of ISBNs; books not in the table are left out"""
+    books = {}
+    for start in range(0, len(isbns), BATCH_GET_LIMIT):
+        keys = [{'isbn': isbn} for isbn in isbns[start:start + BATCH_GET_LIMIT]]
+        for item in batch_get_items(table_name, keys):
+            books[item['isbn']] = item
+    return books
@@ -0,0 +1,165 @@
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import logging
+import boto3
+
+# Local read replica of the pipeline's Books data. The Glue job writes a catalog
+# snapshot for each data version; handlers download it to /tmp once per container
+# and data version, memory-map it and serve metadata lookups from it, falling back
+# to DynamoDB when no snapshot is available.
+#
+# Layout (little-endian): a header with the format tag, record count, hash slot
+# count and section offsets, then the ISBN, normalized title and JSON detail
+# columns sorted by ISBN, each preceded by a uint32 offsets array, and finally
+# the hash index of 1-based record positions (crc32 of the ISBN, linear probing).
+
+logger = logging.getLogger()
+s3 = boto3.client('s3')
+
+CATALOG_ARTIFACT = 'catalog.bin'
+CATALOG_FORMAT = b'BRCAT001'
+CATALOG_HEADER = struct.Struct('<8sII7Q')
+UINT32 = struct.Struct('<I')
+OFFSET_PAIR = struct.Struct('<II')
+CATALOG_DIRECTORY = '/tmp'
+RETRY_AFTER_SECONDS = 60
+
+_catalog = {'version': None, 'snapshot': None, 'failed_at': 0.0}
+
+class CatalogSnapshot:
+    """Memory-mapped catalog snapshot with lookups by ISBN, ISBN order and title substring"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as catalog_file:
+            self._map = mmap.mmap(catalog_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.record_count, self.slot_count, *sections = CATALOG_HEADER.unpack_from(self._map, 0)
+        if magic != CATALOG_FORMAT:
+            self._map.close()
+            raise ValueError(f"Unsupported catalog snapshot format: {magic!r}")
+        (self._isbn_offsets, self._isbns, self._title_offsets, self._titles,
+         self._detail_offsets, self._details, self._slots) = sections
+        self.path = path
+
+    def __len__(self):
+        return self.record_count
+
+    def _offset(self, offsets, position):
+        return UINT32.unpack_from(self._map, offsets + 4 * position)[0]
+
+    def _value(self, offsets, column, position):
+        start, end = OFFSET_PAIR.unpack_from(self._map, offsets + 4 * position)
+        return self._map[column + start:column + end]
+
+    def isbn_at(self, position):
+        return self._value(self._isbn_offsets, self._isbns, position).decode('utf-8')
+
+    def title_at(self, position):
+        """Normalized title of the record at a position"""
+        return self._value(self._title_offsets, self._titles, position)[:-1].decode('utf-8')
+
+    def book_at(self, position):
+        return json.loads(self._value(self._detail_offsets, self._details, position))
+
+    def position_of(self, isbn):
+        """Position of an ISBN through the hash index, or None if the catalog does not have it"""
+        key = isbn.encode('utf-8')
+        mask = self.slot_count - 1
+        slot = zlib.crc32(key) & mask
+        while True:
+            entry = self._offset(self._slots, slot)
+            if entry == 0:
+                return None
+            if self._value(self._isbn_offsets, self._isbns, entry - 1) == key:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def get(self, isbn):
+        """Book details for an ISBN, or None"""
+        position = self.position_of(isbn)
+        return self.book_at(position) if position is not None else None
+
+    def position_after(self, isbn):
+        """Position of the first record whose ISBN sorts after the given one"""
+        key = isbn.encode('utf-8')
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._value(self._isbn_offsets, self._isbns, middle) <= key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def positions_with_title(self, term):
+        """Yield, in ISBN order, the positions of records whose normalized title contains the term"""
+        needle = term.encode('utf-8')
+        if not needle or b'\n' in needle or not self.record_count:
+            return
+        titles_end = self._titles + self._offset(self._title_offsets, self.record_count)
+        search_from = self._titles
+        position = 0
+        while True:
+            found = self._map.find(needle, search_from, titles_end)
+            if found < 0:
+                return
+            # The match lies in the last title starting at or before it
+            relative = found - self._titles
+            low, high = position, self.record_count - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if self._offset(self._title_offsets, middle) <= relative:
+                    low = middle
+                else:
+                    high = middle - 1
+            position = low
+            yield position
+            search_from = self._titles + self._offset(self._title_offsets, position + 1)
+
+    def close(self):
+        self._map.close()
+
+def get_catalog(active_version):
+    """
+    Get the catalog snapshot for the active data version, downloading it on first use.
+    Returns None when there is no snapshot to serve from, so callers read DynamoDB instead.
+    """
+    version = active_version.get('version')
+    if not version or not active_version.get('artifacts_prefix'):
+        return None
+    if _catalog['version'] == version:
+        return _catalog['snapshot']
+    if time.time() - _catalog['failed_at'] < RETRY_AFTER_SECONDS:
+        return None
+
+    path = os.path.join(CATALOG_DIRECTORY, f"catalog-{version}.bin")
+    try:
+        started = time.time()
+        if not os.path.exists(path):
+            s3.download_file(
+                active_version['artifacts_bucket'],
+                active_version['artifacts_prefix'] + CATALOG_ARTIFACT,
+                path + '.part'
+            )
+            os.replace(path + '.part', path)
+        snapshot = CatalogSnapshot(path)
+        logger.info(f"Loaded catalog snapshot for version {version}: {len(snapshot)} books in {time.time() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"Error loading catalog snapshot for version {version}: {str(e)}")
+        _catalog['failed_at'] = time.time()
+        return None
+
+    # Release the previous version's snapshot so /tmp holds one catalog at a time
+    previous = _catalog['snapshot']
+    if previous:
+        previous.close()
+        try:
+            os.remove(previous.path)
+        except OSError:
+            pass
+
+    _catalog.update(version=version, snapshot=snapshot, failed_at=0.0)
+    return snapshot
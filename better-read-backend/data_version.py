@@ -0,0 +1,36 @@
+import os
+import time
+import logging
+import boto3
+from dynamodb_metrics import instrument
+
+# Active data version pointer written by the recommendation pipeline. The
+# activate-version step points it at the versioned Books, Similarities and
+# PopularLists tables and the S3 artifact prefix of the latest verified run;
+# handlers read it through get_active_version, which caches it per container.
+
+logger = logging.getLogger()
+dynamodb = instrument(boto3.resource('dynamodb'))
+
+DATA_VERSION_CACHE_SECONDS = 60
+ACTIVE_VERSION_ID = 'active-version'
+
+_active_version = {'item': {}, 'fetched_at': 0.0}
+
+def get_active_version():
+    """Get the active data version pointer, refreshing the cached copy after its TTL"""
+    state_table_name = os.environ.get('PIPELINE_STATE_TABLE_NAME')
+    if not state_table_name:
+        return {}
+
+    now = time.time()
+    if now - _active_version['fetched_at'] > DATA_VERSION_CACHE_SECONDS:
+        try:
+            response = dynamodb.Table(state_table_name).get_item(Key={'id': ACTIVE_VERSION_ID})
+            _active_version['item'] = response.get('Item', {})
+        except Exception as e:
+            # Keep serving the last known version if the pointer cannot be read
+            logger.error(f"Error reading active data version: {str(e)}")
+        _active_version['fetched_at'] = now
+
+    return _active_version['item']
@@ -0,0 +1,36 @@
+import time
+import logging
+import boto3
+from dynamodb_metrics import instrument
+
+# BatchGetItem helper shared by the handlers that read many Books, PopularLists
+# or Similarities items at once.
+
+logger = logging.getLogger()
+dynamodb = instrument(boto3.resource('dynamodb'))
+
+BATCH_GET_LIMIT = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+
+def batch_get_items(table_name, keys, attributes=None):
+    """Run BatchGetItem for up to 100 keys, retrying unprocessed keys; returns the items found"""
+    if not keys:
+        return []
+
+    request = {'Keys': keys}
+    if attributes:
+        request['ProjectionExpression'] = ', '.join(f'#{name}' for name in attributes)
+        request['ExpressionAttributeNames'] = {f'#{name}': name for name in attributes}
+
+    items = []
+    request_items = {table_name: request}
+    for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+        response = dynamodb.batch_get_item(RequestItems=request_items)
+        items.extend(response['Responses'].get(table_name, []))
+        request_items = response.get('UnprocessedKeys')
+        if not request_items:
+            return items
+        time.sleep(0.05 * (2 ** attempt))
+
+    logger.error(f"Unprocessed keys remain for {table_name} after {BATCH_GET_MAX_ATTEMPTS} attempts")
+    return items
@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import random
+import functools
+import threading
+
+# DynamoDB call instrumentation for the backend handlers. instrument() hooks a boto3
+# DynamoDB resource or client through botocore's event system, so every table call
+# made through it is timed, asks for ReturnConsumedCapacity, and is tallied with its
+# item count, scanned count, consumed capacity and retries. instrumented_handler
+# aggregates the calls of one invocation and prints a single CloudWatch embedded
+# metric format (EMF) line, so the metrics need no agent or API calls.
+#
+# METRICS_SAMPLE_RATE (0 to 1, default 1) is the share of invocations measured;
+# unsampled invocations skip the hooks and emit nothing. Each line carries its
+# SampleRate so totals can be scaled back up.
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'BetterRead/Backend')
+
+# Operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = {
+    'GetItem', 'Query', 'Scan', 'BatchGetItem', 'TransactGetItems', 'ExecuteStatement',
+    'PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems'
+}
+READ_OPERATIONS = {'GetItem', 'Query', 'Scan', 'BatchGetItem', 'TransactGetItems'}
+
+METRIC_UNITS = {
+    'Duration': 'Milliseconds',
+    'DynamoDBCalls': 'Count',
+    'DynamoDBTime': 'Milliseconds',
+    'DynamoDBMaxLatency': 'Milliseconds',
+    'DynamoDBItems': 'Count',
+    'DynamoDBScannedItems': 'Count',
+    'ConsumedReadCapacity': 'Count',
+    'ConsumedWriteCapacity': 'Count',
+    'DynamoDBRetries': 'Count',
+    'DynamoDBErrors': 'Count'
+}
+
+_lock = threading.Lock()
+_invocation = {'calls': None}
+
+def sample_rate():
+    try:
+        return min(max(float(os.environ.get('METRICS_SAMPLE_RATE', '1')), 0.0), 1.0)
+    except ValueError:
+        return 1.0
+
+def _table_label(params):
+    if 'TableName' in params:
+        return params['TableName']
+    # Batch and transaction requests can span tables
+    tables = set(params.get('RequestItems', {}))
+    for entry in params.get('TransactItems', []):
+        tables.update(request['TableName'] for request in entry.values() if 'TableName' in request)
+    return ','.join(sorted(tables)) or None
+
+def _item_count(operation, params, parsed):
+    if operation == 'GetItem':
+        return int('Item' in parsed)
+    if operation in ('Query', 'Scan'):
+        return parsed.get('Count', 0)
+    if operation == 'BatchGetItem':
+        return sum(len(items) for items in parsed.get('Responses', {}).values())
+    if operation == 'TransactGetItems':
+        return sum(1 for response in parsed.get('Responses', []) if 'Item' in response)
+    if operation == 'ExecuteStatement':
+        return len(parsed.get('Items', []))
+    if operation == 'BatchWriteItem':
+        requested = sum(len(requests) for requests in params.get('RequestItems', {}).values())
+        unprocessed = sum(len(requests) for requests in parsed.get('UnprocessedItems', {}).values())
+        return requested - unprocessed
+    if operation == 'TransactWriteItems':
+        return len(params.get('TransactItems', []))
+    return 1 if operation in CAPACITY_OPERATIONS else 0
+
+def _consumed_capacity(operation, parsed):
+    """(read, write) capacity units from a response's ConsumedCapacity (one entry or one per table)"""
+    consumed = parsed.get('ConsumedCapacity') or []
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    read = write = 0.0
+    for entry in consumed:
+        if 'ReadCapacityUnits' in entry or 'WriteCapacityUnits' in entry:
+            read += entry.get('ReadCapacityUnits', 0.0)
+            write += entry.get('WriteCapacityUnits', 0.0)
+        elif operation in READ_OPERATIONS:
+            read += entry.get('CapacityUnits', 0.0)
+        else:
+            write += entry.get('CapacityUnits', 0.0)
+    return read, write
+
+def _record(context, parsed=None, error=False):
+    started = context.pop('metrics_started', None)
+    if started is None:
+        return
+    latency_ms = (time.perf_counter() - started) * 1000
+    operation = context['metrics_operation']
+    params = context['metrics_params']
+    parsed = parsed or {}
+    read, write = _consumed_capacity(operation, parsed)
+    key = (operation, context['metrics_table'])
+
+    with _lock:
+        calls = _invocation['calls']
+        if calls is None:
+            return
+        call = calls.setdefault(key, {
+            'calls': 0, 'latency_ms': 0.0, 'max_latency_ms': 0.0, 'items': 0, 'scanned': 0,
+            'read_capacity': 0.0, 'write_capacity': 0.0, 'retries': 0, 'errors': 0
+        })
+        call['calls'] += 1
+        call['latency_ms'] += latency_ms
+        call['max_latency_ms'] = max(call['max_latency_ms'], latency_ms)
+        call['items'] += _item_count(operation, params, parsed) if not error else 0
+        call['scanned'] += parsed.get('ScannedCount', 0)
+        call['read_capacity'] += read
+        call['write_capacity'] += write
+        call['retries'] += parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        call['errors'] += int(error)
+
+def _provide_params(params, model, context, **kwargs):
+    if _invocation['calls'] is None:
+        return
+    if model.name in CAPACITY_OPERATIONS:
+        params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+    context['metrics_operation'] = model.name
+    context['metrics_params'] = params
+    context['metrics_table'] = _table_label(params)
+
+def _before_call(context, **kwargs):
+    if 'metrics_operation' in context:
+        context['metrics_started'] = time.perf_counter()
+
+def _after_call(parsed, context, **kwargs):
+    # Service errors (throttling, failed conditions) arrive here before they are raised
+    _record(context, parsed, error='Error' in parsed)
+
+def _after_call_error(context, **kwargs):
+    _record(context, error=True)
+
+def instrument(dynamodb):
+    """Hook a boto3 DynamoDB resource or client; returns it for use as `dynamodb = instrument(boto3.resource('dynamodb'))`"""
+    client = dynamodb.meta.client if hasattr(dynamodb.meta, 'client') else dynamodb
+    events = client.meta.events
+    events.register('provide-client-params.dynamodb.*', _provide_params, unique_id='dynamodb-metrics-params')
+    events.register('before-call.dynamodb.*', _before_call, unique_id='dynamodb-metrics-before')
+    events.register('after-call.dynamodb.*', _after_call, unique_id='dynamodb-metrics-after')
+    events.register('after-call-error.dynamodb.*', _after_call_error, unique_id='dynamodb-metrics-error')
+    return dynamodb
+
+def metrics_line(handler_name, calls, duration_ms, status_code, request_id, rate):
+    """One invocation's DynamoDB totals and per-operation breakdown as an EMF record"""
+    breakdown = [
+        {'operation': operation, 'table': table, **{
+            name: round(value, 3) if isinstance(value, float) else value for name, value in call.items()
+        }}
+        for (operation, table), call in sorted(calls.items(), key=lambda entry: (entry[0][0], entry[0][1] or ''))
+    ]
+    values = {
+        'Duration': round(duration_ms, 3),
+        'DynamoDBCalls': sum(call['calls'] for call in calls.values()),
+        'DynamoDBTime': round(sum(call['latency_ms'] for call in calls.values()), 3),
+        'DynamoDBMaxLatency': round(max([call['max_latency_ms'] for call in calls.values()] or [0.0]), 3),
+        'DynamoDBItems': sum(call['items'] for call in calls.values()),
+        'DynamoDBScannedItems': sum(call['scanned'] for call in calls.values()),
+        'ConsumedReadCapacity': round(sum(call['read_capacity'] for call in calls.values()), 3),
+        'ConsumedWriteCapacity': round(sum(call['write_capacity'] for call in calls.values()), 3),
+        'DynamoDBRetries': sum(call['retries'] for call in calls.values()),
+        'DynamoDBErrors': sum(call['errors'] for call in calls.values())
+    }
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Handler']],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, unit in METRIC_UNITS.items()]
+            }]
+        },
+        'Handler': handler_name,
+        **values,
+        'StatusCode': status_code,
+        'RequestId': request_id,
+        'SampleRate': rate,
+        'DynamoDBOperations': breakdown
+    }
+
+def instrumented_handler(handler):
+    """Measure the DynamoDB calls of each sampled invocation and print one EMF metrics line"""
+    handler_name = handler.__module__
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        rate = sample_rate()
+        if rate <= 0 or random.random() >= rate:
+            return handler(event, context)
+
+        with _lock:
+            _invocation['calls'] = {}
+        started = time.perf_counter()
+        response = None
+        try:
+            response = handler(event, context)
+            return response
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            with _lock:
+                calls, _invocation['calls'] = _invocation['calls'], None
+            status_code = response.get('statusCode') if isinstance(response, dict) else None
+            request_id = getattr(context, 'aws_request_id', None)
+            print(json.dumps(metrics_line(handler_name, calls, duration_ms, status_code, request_id, rate)))
+
+    return wrapper
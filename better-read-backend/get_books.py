@@ -3,6 +3,9 @@ import boto3
 import os
 import logging
 from decimal import Decimal
+from catalog_snapshot import get_catalog
+from dynamodb_metrics import instrument, instrumented_handler
+from data_version import get_active_version
 
 # Custom JSON encoder to handle Decimal objects
 class DecimalEncoder(json.JSONEncoder):
@@ -16,8 +19,9 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+dynamodb = instrument(boto3.resource('dynamodb'))
 
+@instrumented_handler
 def lambda_handler(event, context):
     """
     Lambda function to get paginated list of books
@@ -34,8 +38,44 @@ def lambda_handler(event, context):
         if limit < 1:
             limit = 20
             
+        # Page through the local catalog snapshot when one is loaded; it uses the same
+        # {"isbn": ...} pagination token as a DynamoDB scan of the Books table
+        active_version = get_active_version()
+        catalog = get_catalog(active_version)
+        if catalog:
+            start = 0
+            if last_evaluated_key:
+                try:
+                    isbn = json.loads(last_evaluated_key)['isbn']
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    return create_error_response(400, "Invalid last_evaluated_key format")
+                if not isinstance(isbn, str):
+                    return create_error_response(400, "Invalid last_evaluated_key format")
+                start = catalog.position_after(isbn)
+            
+            end = min(start + limit, len(catalog))
+            books = []
+            for position in range(start, end):
+                item = catalog.book_at(position)
+                books.append({
+                    'isbn': item['isbn'],
+                    'title': item['title'],
+                    'author': item['author'],
+                    'year_of_publication': item['year_of_publication'],
+                    'publisher': item['publisher']
+                })
+            
+            pagination = {
+                'count': len(books),
+                'has_more': end < len(catalog)
+            }
+            if end < len(catalog):
+                pagination['last_evaluated_key'] = json.dumps({'isbn': books[-1]['isbn']})
+            
+            return create_success_response({'books': books, 'pagination': pagination})
+        
         # Get DynamoDB table
-        table_name = os.environ['BOOKS_TABLE_NAME']
+        table_name = active_version.get('books_table') or os.environ['BOOKS_TABLE_NAME']
         table = dynamodb.Table(table_name)
         
         # Prepare scan parameters
@@ -3,6 +3,7 @@ import boto3
 import os
 import logging
 from decimal import Decimal
+from dynamodb_metrics import instrument, instrumented_handler
 
 # Custom JSON encoder to handle Decimal objects
 class DecimalEncoder(json.JSONEncoder):
@@ -16,8 +17,9 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+dynamodb = instrument(boto3.resource('dynamodb'))
 
+@instrumented_handler
 def lambda_handler(event, context):
     """
     Lambda function to get user ratings
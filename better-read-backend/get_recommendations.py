@@ -1,8 +1,15 @@
 import json
 import boto3
 import os
+import re
 import logging
+import time
+import struct
 from decimal import Decimal
+from catalog_snapshot import get_catalog
+from dynamodb_metrics import instrument, instrumented_handler
+from data_version import get_active_version
+from dynamodb_batch import BATCH_GET_LIMIT, batch_get_items
 
 # Custom JSON encoder to handle Decimal objects
 class DecimalEncoder(json.JSONEncoder):
@@ -16,8 +23,20 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+dynamodb = instrument(boto3.resource('dynamodb'))
 
+# Packed similarity format written by the recommendation pipeline
+PACKED_FORMAT_VERSION = 1
+SCORE_SCALE = 65535
+
+# Popular lists (most rated, top rated by Bayesian average, trending) fill in where similarity
+# lists are short or missing. They are read together with one BatchGetItem and cached per container.
+LISTS_CACHE_SECONDS = 300
+OVERALL_LIST_IDS = ['trending', 'top_rated:all', 'popular:all']
+BOOK_ATTRIBUTES = ['isbn', 'title', 'author', 'publisher', 'year_of_publication']
+_popular_lists = {}
+
+@instrumented_handler
 def lambda_handler(event, context):
     """
     Lambda function to get personalized book recommendations
@@ -32,21 +51,44 @@ def lambda_handler(event, context):
         except json.JSONDecodeError:
             return create_error_response(400, "Invalid JSON in request body")
         
-        books = body.get('books', [])
+        books = body.get('books')
         limit_per_book = body.get('limit_per_book', 5)
         
-        if not books:
+        # An empty array is valid: a new user gets popular books
+        if not isinstance(books, list):
             return create_error_response(400, "books array is required")
         
         if limit_per_book > 20:
             limit_per_book = 20
         
         # Get DynamoDB tables
-        books_table_name = os.environ['BOOKS_TABLE_NAME']
-        similarities_table_name = os.environ['SIMILARITIES_TABLE_NAME']
+        active_version = get_active_version()
+        books_table_name = active_version.get('books_table') or os.environ['BOOKS_TABLE_NAME']
+        similarities_table_name = active_version.get('similarities_table') or os.environ['SIMILARITIES_TABLE_NAME']
+        
+        similarities_format = active_version.get('similarities_format', 'rows')
+        
+        input_isbns = [book_input.get('isbn') for book_input in books if book_input.get('isbn')]
+        catalog = get_catalog(active_version)
         
-        books_table = dynamodb.Table(books_table_name)
-        similarities_table = dynamodb.Table(similarities_table_name)
+        # Get source book details in batches instead of one round trip per book
+        source_books = batch_get_books(books_table_name, input_isbns, catalog)
+        
+        # Get similar books for every source book found
+        if similarities_format == 'packed':
+            neighbours_by_isbn = batch_get_packed_neighbours(similarities_table_name, list(source_books), limit_per_book)
+        else:
+            neighbours_by_isbn = {}
+            for isbn in source_books:
+                try:
+                    neighbours_by_isbn[isbn] = query_neighbour_rows(similarities_table_name, isbn, limit_per_book)
+                except Exception as e:
+                    logger.error(f"Error getting similarities for {isbn}: {str(e)}")
+        
+        # Get book details for all similar books at once
+        similar_isbns = {similar_isbn for neighbours in neighbours_by_isbn.values() for similar_isbn, _ in neighbours}
+        book_details = batch_get_books(books_table_name, [i for i in similar_isbns if i not in source_books], catalog)
+        book_details.update(source_books)
         
         results = []
         
@@ -55,66 +97,40 @@ def lambda_handler(event, context):
             isbn = book_input.get('isbn')
             rating = book_input.get('rating', 1)
             
-            if not isbn:
+            if not isbn or isbn not in source_books:
                 continue
             
-            # Get source book details
-            try:
-                source_book_response = books_table.get_item(Key={'isbn': isbn})
-                if 'Item' not in source_book_response:
-                    continue
-                
-                source_book = source_book_response['Item']
-            except Exception as e:
-                logger.error(f"Error getting source book {isbn}: {str(e)}")
-                continue
+            similar_books = []
+            for similar_isbn, similarity_score in neighbours_by_isbn.get(isbn, []):
+                if similar_isbn in book_details:
+                    similar_books.append({
+                        'isbn': similar_isbn,
+                        'title': book_details[similar_isbn]['title'],
+                        'author': book_details[similar_isbn]['author'],
+                        'similarity_score': similarity_score
+                    })
             
-            # Get similar books
-            try:
-                similar_response = similarities_table.query(
-                    KeyConditionExpression='isbn = :isbn',
-                    ExpressionAttributeValues={':isbn': isbn},
-                    Limit=limit_per_book
-                )
-                
-                similar_books = []
-                for item in similar_response['Items']:
-                    similar_isbn = item['similar_isbn']
-                    similarity_score = float(item['similarity_score'])
-                    
-                    # Get book details for similar book
-                    try:
-                        book_response = books_table.get_item(Key={'isbn': similar_isbn})
-                        if 'Item' in book_response:
-                            book_details = book_response['Item']
-                            similar_books.append({
-                                'isbn': similar_isbn,
-                                'title': book_details['title'],
-                                'author': book_details['author'],
-                                'similarity_score': similarity_score
-                            })
-                    except Exception as e:
-                        logger.error(f"Error getting book details for {similar_isbn}: {str(e)}")
-                        continue
-                
-                # Add to results
-                results.append({
-                    'source_book': {
-                        'isbn': isbn,
-                        'title': source_book['title'],
-                        'user_rating': rating
-                    },
-                    'similar_books': similar_books
-                })
-                
-            except Exception as e:
-                logger.error(f"Error getting similarities for {isbn}: {str(e)}")
-                continue
+            # Add to results
+            results.append({
+                'source_book': {
+                    'isbn': isbn,
+                    'title': source_books[isbn]['title'],
+                    'user_rating': rating
+                },
+                'similar_books': similar_books
+            })
+        
+        # Fill short or missing neighbour lists from the popular lists
+        popular_books = []
+        if active_version.get('lists_table'):
+            popular_books = fill_from_popular_lists(active_version['lists_table'], results, source_books, input_isbns, limit_per_book)
         
         # Create response
         result = {
             'results': results
         }
+        if popular_books:
+            result['popular_books'] = popular_books
         
         return create_success_response(result)
         
@@ -122,6 +138,170 @@ def lambda_handler(event, context):
         logger.error(f"Error getting recommendations: {str(e)}")
         return create_error_response(500, "Internal server error")
 
+def batch_get_books(table_name, isbns, catalog=None):
+    """
+    Get title, author, publisher and year for a list of ISBNs from the local catalog snapshot when one is loaded,
+    reading any it does not have from DynamoDB, 100 keys per BatchGetItem call
+    """
+    books = {}
+    unique_isbns = list(dict.fromkeys(isbns))
+    if catalog:
+        for isbn in unique_isbns:
+            item = catalog.get(isbn)
+            if item:
+                books[isbn] = item
+        unique_isbns = [isbn for isbn in unique_isbns if isbn not in books]
+    for start in range(0, len(unique_isbns), BATCH_GET_LIMIT):
+        keys = [{'isbn': isbn} for isbn in unique_isbns[start:start + BATCH_GET_LIMIT]]
+        try:
+            for item in batch_get_items(table_name, keys, BOOK_ATTRIBUTES):
+                books[item['isbn']] = item
+        except Exception as e:
+            logger.error(f"Error getting book details: {str(e)}")
+    return books
+
+def fill_from_popular_lists(table_name, results, source_books, input_isbns, limit):
+    """
+    Top up similar_books lists shorter than limit from the source book's publisher and decade
+    lists, then the overall lists. Returns up to limit popular_books when fewer than limit books
+    are recommended in total, such as when no input book was found.
+    """
+    taken = set(input_isbns) | {book['isbn'] for result in results for book in result['similar_books']}
+    short_results = [result for result in results if len(result['similar_books']) < limit]
+    if not short_results and len(taken - set(input_isbns)) >= limit:
+        return []
+    
+    scoped_list_ids = {
+        result['source_book']['isbn']: scope_list_ids(source_books[result['source_book']['isbn']])
+        for result in short_results
+    }
+    lists = get_popular_lists(table_name, [list_id for ids in scoped_list_ids.values() for list_id in ids] + OVERALL_LIST_IDS)
+    
+    for result in short_results:
+        for list_id in scoped_list_ids[result['source_book']['isbn']] + OVERALL_LIST_IDS:
+            for book in lists.get(list_id, []):
+                if len(result['similar_books']) >= limit:
+                    break
+                if book['isbn'] not in taken:
+                    taken.add(book['isbn'])
+                    result['similar_books'].append({
+                        'isbn': book['isbn'],
+                        'title': book['title'],
+                        'author': book.get('author'),
+                        'similarity_score': None,
+                        'fallback': list_id
+                    })
+    
+    popular_books = []
+    if len(taken - set(input_isbns)) < limit:
+        for list_id in OVERALL_LIST_IDS:
+            for book in lists.get(list_id, []):
+                if len(popular_books) >= limit:
+                    break
+                if book['isbn'] not in taken:
+                    taken.add(book['isbn'])
+                    popular_books.append({'isbn': book['isbn'], 'title': book['title'], 'author': book.get('author'), 'fallback': list_id})
+    return popular_books
+
+def scope_list_ids(book):
+    """Top rated list IDs for a book's publisher and decade of publication (mirrors the pipeline)"""
+    list_ids = []
+    publisher = book.get('publisher')
+    if isinstance(publisher, str):
+        normalized = ' '.join(re.findall(r'\w+', publisher.lower()))
+        if normalized:
+            list_ids.append(f"top_rated:publisher:{normalized}")
+    try:
+        year = int(book.get('year_of_publication') or 0)
+    except (TypeError, ValueError):
+        year = 0
+    if year > 0:
+        list_ids.append(f"top_rated:decade:{year // 10 * 10}s")
+    return list_ids
+
+def get_popular_lists(table_name, list_ids):
+    """Get the books of each popular list by ID, reading the ones not cached with BatchGetItem (one call per 100)"""
+    now = time.time()
+    lists = {}
+    missing = []
+    for list_id in dict.fromkeys(list_ids):
+        cached = _popular_lists.get((table_name, list_id))
+        if cached and now - cached[0] < LISTS_CACHE_SECONDS:
+            lists[list_id] = cached[1]
+        else:
+            missing.append(list_id)
+    if not missing:
+        return lists
+    
+    found = {}
+    try:
+        for start in range(0, len(missing), BATCH_GET_LIMIT):
+            keys = [{'list_id': list_id} for list_id in missing[start:start + BATCH_GET_LIMIT]]
+            for item in batch_get_items(table_name, keys, ['list_id', 'books']):
+                found[item['list_id']] = item.get('books', [])
+    except Exception as e:
+        # Lists that cannot be read are cached as empty, so requests do not retry them until the TTL
+        logger.error(f"Error getting popular lists: {str(e)}")
+    
+    # Keep only the active version's lists
+    for key in [key for key in _popular_lists if key[0] != table_name]:
+        del _popular_lists[key]
+    for list_id in missing:
+        lists[list_id] = found.get(list_id, [])
+        _popular_lists[(table_name, list_id)] = (now, lists[list_id])
+    return lists
+
+def batch_get_packed_neighbours(table_name, isbns, limit):
+    """Get the packed neighbour lists for a list of source ISBNs"""
+    neighbours = {}
+    for start in range(0, len(isbns), BATCH_GET_LIMIT):
+        keys = [{'isbn': isbn} for isbn in isbns[start:start + BATCH_GET_LIMIT]]
+        try:
+            for item in batch_get_items(table_name, keys):
+                neighbours[item['isbn']] = decode_neighbours(item)[:limit]
+        except Exception as e:
+            logger.error(f"Error getting similarities: {str(e)}")
+    return neighbours
+
+def query_neighbour_rows(table_name, isbn, limit):
+    """Get similar books from the legacy one-row-per-pair similarities table"""
+    response = dynamodb.Table(table_name).query(
+        KeyConditionExpression='isbn = :isbn',
+        ExpressionAttributeValues={':isbn': isbn},
+        Limit=limit
+    )
+    return [(item['similar_isbn'], float(item['similarity_score'])) for item in response['Items']]
+
+def decode_neighbours(item):
+    """
+    Decode a packed similarity item into (similar_isbn, similarity_score) pairs, best first.
+    Supports the "list" encoding (similar_isbns + scores) and the "binary" encoding (neighbours).
+    """
+    if 'neighbours' in item:
+        packed = item['neighbours']
+        data = bytes(getattr(packed, 'value', packed))
+        if data[0] != PACKED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported packed neighbour format: {data[0]}")
+        neighbours = []
+        offset = 1
+        while offset < len(data):
+            isbn_length = data[offset]
+            similar_isbn = data[offset + 1:offset + 1 + isbn_length].decode('utf-8')
+            offset += 1 + isbn_length
+            (score,) = struct.unpack_from('>H', data, offset)
+            offset += 2
+            neighbours.append((similar_isbn, dequantize_score(score)))
+        return neighbours
+    
+    return [
+        (similar_isbn, dequantize_score(score))
+        for similar_isbn, score in zip(item.get('similar_isbns', []), item.get('scores', []))
+    ]
+
+def dequantize_score(score):
+    """Map a uint16 quantized score back onto a cosine similarity in [-1, 1]"""
+    return round(float(score) / SCORE_SCALE * 2.0 - 1.0, 4)
+
 def create_success_response(body):
     """Create a successful API Gateway response"""
     return {
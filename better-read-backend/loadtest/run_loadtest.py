@@ -0,0 +1,356 @@
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import logging
+import argparse
+import platform
+import importlib
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+from collections import Counter
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+import boto3
+
+from seed import read_dataset, seed, handler_environment
+from scenarios import SCENARIO_HANDLERS, DEFAULT_MIX, ARTIFACT_SCENARIOS, Workload, parse_mix
+
+# Replays a mix of API Gateway events against the Lambda handlers, in-process, with
+# DynamoDB and S3 served by a local stand-in: a moto server started here (default)
+# or DynamoDB Local at --endpoint-url. The stand-in is seeded from a run_local.py
+# output directory and its Ratings.csv. Each worker process plays one warm Lambda
+# container that handles one request at a time; --concurrency sets how many run.
+#
+#   python run_loadtest.py --pipeline-output out/ --ratings data/Ratings.csv --save-baseline
+#   python run_loadtest.py --pipeline-output out/ --ratings data/Ratings.csv   (compare)
+#
+# Per scenario it reports warm latency percentiles, cold starts, and the DynamoDB
+# calls, items scanned and capacity units per request, taken from the EMF line
+# dynamodb_metrics prints for each invocation.
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(LOADTEST_DIR)
+
+# Latency regresses when p95 grows by more than the tolerance and by at least
+# MIN_LATENCY_CHANGE_MS. DynamoDB calls or capacity units per request regress when
+# they grow by more than 5% and by more than 0.1, which leaves room for the cached
+# version pointer being refreshed a different number of times.
+DEFAULT_TOLERANCE = 0.25
+MIN_LATENCY_CHANGE_MS = 5
+CAPACITY_TOLERANCE = 0.05
+MIN_CAPACITY_CHANGE = 0.1
+
+# The stand-ins accept any credentials; fixed ones keep real keys out of the run
+LOCAL_ENVIRONMENT = {
+    'AWS_ACCESS_KEY_ID': 'loadtest',
+    'AWS_SECRET_ACCESS_KEY': 'loadtest',
+    'AWS_SESSION_TOKEN': 'loadtest',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'METRICS_SAMPLE_RATE': '1'
+}
+
+# EMF field -> per-request sample field
+EMF_FIELDS = {
+    'DynamoDBCalls': 'dynamodb_calls',
+    'DynamoDBTime': 'dynamodb_ms',
+    'DynamoDBScannedItems': 'scanned_items',
+    'ConsumedReadCapacity': 'read_units',
+    'ConsumedWriteCapacity': 'write_units'
+}
+
+class LambdaContext:
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self.memory_limit_in_mb = 128
+
+    def get_remaining_time_in_millis(self):
+        return 30000
+
+def emf_metrics(output):
+    """The DynamoDB totals of the metrics line a handler printed"""
+    for line in output.splitlines():
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if '_aws' in record:
+                return {field: record.get(name, 0) for name, field in EMF_FIELDS.items()}
+    return {field: 0 for field in EMF_FIELDS.values()}
+
+def next_page_token(response):
+    try:
+        return json.loads(response['body'])['pagination'].get('last_evaluated_key')
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def run_worker(entries):
+    """Handle entries one at a time, like a single Lambda container; runs in its own process"""
+    sys.path.insert(0, BACKEND_DIR)
+    import_ms = {}
+    handlers = {}
+    for module_name in sorted({SCENARIO_HANDLERS[name] for name, _, _ in entries}):
+        started = time.perf_counter()
+        handlers[module_name] = importlib.import_module(module_name).lambda_handler
+        import_ms[module_name] = round((time.perf_counter() - started) * 1000, 3)
+
+    # Containers do not share /tmp, so each worker downloads its own catalog snapshot
+    import catalog_snapshot
+    catalog_snapshot.CATALOG_DIRECTORY = tempfile.mkdtemp(prefix='loadtest-catalog-')
+
+    samples = []
+    warm = set()
+    page_token = None
+    started_at = time.time()
+    try:
+        for name, event, next_page in entries:
+            module_name = SCENARIO_HANDLERS[name]
+            if next_page and page_token:
+                event = dict(event, queryStringParameters={**event['queryStringParameters'], 'last_evaluated_key': page_token})
+            output = io.StringIO()
+            started = time.perf_counter()
+            with redirect_stdout(output):
+                response = handlers[module_name](event, LambdaContext(module_name))
+            latency_ms = (time.perf_counter() - started) * 1000
+            if name == 'browse':
+                page_token = next_page_token(response)
+            samples.append({
+                'scenario': name,
+                'status': response['statusCode'],
+                'latency_ms': latency_ms,
+                'cold': module_name not in warm,
+                **emf_metrics(output.getvalue())
+            })
+            warm.add(module_name)
+    finally:
+        shutil.rmtree(catalog_snapshot.CATALOG_DIRECTORY, ignore_errors=True)
+    return {'samples': samples, 'import_ms': import_ms, 'started_at': started_at, 'finished_at': time.time()}
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return round(sorted_values[int(rank) - 1], 3)
+
+def summarize(samples):
+    warm = sorted(sample['latency_ms'] for sample in samples if not sample['cold'])
+    cold = sorted(sample['latency_ms'] for sample in samples if sample['cold'])
+    count = len(samples)
+    summary = {
+        'requests': count,
+        'statuses': dict(sorted(Counter(str(sample['status']) for sample in samples).items())),
+        'errors': sum(sample['status'] >= 500 for sample in samples),
+        'latency_ms': {
+            'p50': percentile(warm, 50),
+            'p95': percentile(warm, 95),
+            'p99': percentile(warm, 99),
+            'mean': round(sum(warm) / len(warm), 3) if warm else None,
+            'max': round(warm[-1], 3) if warm else None
+        },
+        'cold_starts': len(cold),
+        'cold_latency_ms': {'p50': percentile(cold, 50), 'max': round(cold[-1], 3) if cold else None}
+    }
+    for field in EMF_FIELDS.values():
+        summary[f"{field}_per_request"] = round(sum(sample[field] for sample in samples) / count, 3) if count else 0
+    return summary
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=LOADTEST_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no', '--', BACKEND_DIR], cwd=LOADTEST_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def start_stand_in(args):
+    """(name, endpoint environment, server to stop) of the DynamoDB stand-in"""
+    if args.endpoint_url:
+        return 'dynamodb-local', {'AWS_ENDPOINT_URL_DYNAMODB': args.endpoint_url}, None
+    from moto.server import ThreadedMotoServer
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=args.port, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    # moto serves S3 on the same endpoint, so the artifacts are available too
+    return 'moto', {'AWS_ENDPOINT_URL': f"http://{host}:{port}"}, server
+
+def print_summary(results):
+    print(f"\n{'scenario':<16}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'calls/req':>11}{'RCU/req':>9}{'WCU/req':>9}")
+    for name, summary in [*results['scenarios'].items(), ('all', results['overall'])]:
+        latency = summary['latency_ms']
+        print(f"{name:<16}{summary['requests']:>9}{summary['errors']:>8}"
+              + ''.join(f"{latency[p] if latency[p] is not None else '-':>9}" for p in ('p50', 'p95', 'p99'))
+              + f"{summary['dynamodb_calls_per_request']:>11}{summary['read_units_per_request']:>9}{summary['write_units_per_request']:>9}")
+    print(f"\n{results['overall']['requests']} requests in {results['duration_seconds']:.1f}s "
+          f"({results['throughput_rps']:.1f}/s) with {results['concurrency']} workers, "
+          f"{results['overall']['cold_starts']} cold starts excluded from latency")
+
+def compare(results, baseline, tolerance):
+    """Print each scenario against the baseline; returns the regressions found"""
+    config_keys = ('stand_in', 'artifacts', 'search_cache', 'concurrency', 'requests', 'seed', 'mix', 'dataset')
+    changed = [key for key in config_keys if results[key] != baseline.get(key)]
+    if changed:
+        print(f"\nBaseline was recorded with a different {', '.join(changed)}; not comparing")
+        return []
+    if baseline.get('host') != results['host']:
+        print("\nWarning: baseline was recorded on a different host; latencies may not be comparable")
+
+    print(f"\nAgainst baseline {baseline.get('commit') or baseline.get('created_at')}:")
+    print(f"{'scenario':<16}{'p95 ms':>21}{'calls/req':>21}{'RCU/req':>21}")
+    regressions = []
+    for name, summary in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if not base:
+            print(f"{name:<16} not in baseline")
+            continue
+        flags = []
+        p95, base_p95 = summary['latency_ms']['p95'] or 0, base['latency_ms']['p95'] or 0
+        if p95 > base_p95 * (1 + tolerance) and p95 - base_p95 >= MIN_LATENCY_CHANGE_MS:
+            flags.append('slower')
+        for field, flag in (('dynamodb_calls', 'more calls'), ('read_units', 'more reads'), ('write_units', 'more writes')):
+            value, base_value = summary[f"{field}_per_request"], base[f"{field}_per_request"]
+            if value > base_value * (1 + CAPACITY_TOLERANCE) and value - base_value > MIN_CAPACITY_CHANGE:
+                flags.append(flag)
+        if summary['errors'] > base['errors']:
+            flags.append('errors')
+        print(f"{name:<16}{base_p95:>9.1f} -> {p95:<8.1f}"
+              f"{base['dynamodb_calls_per_request']:>9.2f} -> {summary['dynamodb_calls_per_request']:<8.2f}"
+              f"{base['read_units_per_request']:>9.2f} -> {summary['read_units_per_request']:<8.2f}{' '.join(flags)}")
+        regressions.extend(f"{name}: {flag}" for flag in flags)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend handlers against a local DynamoDB stand-in")
+    parser.add_argument('--pipeline-output', required=True, help="output directory of run_local.py")
+    parser.add_argument('--ratings', required=True, help="Ratings.csv the pipeline run was trained on")
+    parser.add_argument('--max-ratings', type=int, default=200000, help="ratings loaded into the Ratings table")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=4, help="worker processes, each one Lambda container")
+    parser.add_argument('--mix', default=None, help="scenario weights, e.g. browse=20,suggest=10 (default: all scenarios)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--endpoint-url', default=None, help="DynamoDB Local endpoint (default: start a moto server)")
+    parser.add_argument('--port', type=int, default=0, help="moto server port (default: any free port)")
+    parser.add_argument('--skip-seed', action='store_true', help="reuse tables already seeded at --endpoint-url")
+    parser.add_argument('--no-artifacts', action='store_true', help="do not publish S3 artifacts, so handlers read DynamoDB only")
+    parser.add_argument('--search-cache', action='store_true', help="create the search cache table and enable it")
+    parser.add_argument('--output', default=None, help="results file (default: results/<timestamp>-<stand-in>.json)")
+    parser.add_argument('--baseline', default=None, help="baseline file (default: baselines/<stand-in>.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed relative p95 growth before a scenario regresses")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else dict(DEFAULT_MIX)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.endpoint_url and 'amazonaws.com' in args.endpoint_url:
+        parser.error("--endpoint-url must point at a local stand-in such as DynamoDB Local, not AWS")
+    if args.skip_seed and not args.endpoint_url:
+        parser.error("--skip-seed needs --endpoint-url; the moto server starts empty")
+
+    dataset = read_dataset(args.pipeline_output, args.ratings, args.max_ratings)
+    stand_in, endpoint_environment, server = start_stand_in(args)
+    # DynamoDB Local has no S3, so artifacts need the moto server
+    artifacts = stand_in == 'moto' and dataset['has_artifacts'] and not args.no_artifacts
+    if not artifacts:
+        skipped = sorted(set(mix) & ARTIFACT_SCENARIOS)
+        if skipped:
+            print(f"No S3 artifacts in this run; skipping {', '.join(skipped)}")
+        mix = {name: weight for name, weight in mix.items() if name not in ARTIFACT_SCENARIOS}
+    if not mix:
+        parser.error("no scenarios left to run")
+
+    # Worker processes inherit this environment
+    os.environ.update(LOCAL_ENVIRONMENT)
+    os.environ.update(endpoint_environment)
+    os.environ.update(handler_environment(dataset['manifest'], args.search_cache))
+
+    try:
+        if not args.skip_seed:
+            started = time.perf_counter()
+            seed(boto3.resource('dynamodb'), boto3.client('s3'), dataset, artifacts, args.search_cache)
+            print(f"Seeded {stand_in} in {time.perf_counter() - started:.1f}s")
+
+        schedule = Workload(dataset, args.seed).schedule(mix, args.requests)
+        concurrency = max(1, min(args.concurrency, len(schedule)))
+        print(f"\nReplaying {len(schedule)} requests with {concurrency} workers")
+        with ProcessPoolExecutor(max_workers=concurrency, mp_context=multiprocessing.get_context('spawn')) as pool:
+            workers = list(pool.map(run_worker, [schedule[worker::concurrency] for worker in range(concurrency)]))
+    finally:
+        if server is not None:
+            server.stop()
+
+    samples = [sample for worker in workers for sample in worker['samples']]
+    duration = max(worker['finished_at'] for worker in workers) - min(worker['started_at'] for worker in workers)
+    manifest = dataset['manifest']
+    results = {
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'commit': git_commit(),
+        'stand_in': stand_in,
+        'artifacts': artifacts,
+        'search_cache': args.search_cache,
+        'concurrency': concurrency,
+        'requests': len(schedule),
+        'seed': args.seed,
+        'mix': mix,
+        'data_version': manifest['data_version'],
+        'dataset': {
+            'books': manifest['books_count'],
+            'similarity_items': manifest['similarity_items'],
+            'similarity_engine': manifest.get('similarity_engine'),
+            'similarity_encoding': manifest.get('similarity_encoding'),
+            'ratings': len(dataset['ratings'])
+        },
+        'host': {'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(), 'python': platform.python_version()},
+        'duration_seconds': round(duration, 3),
+        'throughput_rps': round(len(samples) / duration, 2) if duration > 0 else None,
+        'import_ms': {
+            module_name: max(worker['import_ms'][module_name] for worker in workers if module_name in worker['import_ms'])
+            for module_name in sorted({name for worker in workers for name in worker['import_ms']})
+        },
+        'overall': summarize(samples),
+        'scenarios': {name: summarize([sample for sample in samples if sample['scenario'] == name]) for name in mix}
+    }
+    print_summary(results)
+
+    output_path = args.output or os.path.join(
+        LOADTEST_DIR, 'results', f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}-{stand_in}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as output:
+        json.dump(results, output, indent=2)
+    print(f"\nWrote {output_path}")
+
+    baseline_path = args.baseline or os.path.join(LOADTEST_DIR, 'baselines', f"{stand_in}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+        print(f"Saved baseline {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; rerun with --save-baseline to record one")
+        return 0
+
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        regressions = compare(results, json.load(baseline_file), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import json
+import random
+import itertools
+
+# API Gateway proxy events for the load test, drawn from the seeded data so that
+# traffic has the same skew as real use: books are picked by rating count, users
+# by how many ratings they have, and search terms come from the titles, authors
+# and publishers of popular books.
+
+# Scenario name -> handler module
+SCENARIO_HANDLERS = {
+    'browse': 'get_books',
+    'search_title': 'search_books',
+    'search_facet': 'search_books',
+    'search_fuzzy': 'search_books',
+    'suggest': 'suggest_books',
+    'get_ratings': 'get_rating',
+    'get_rating': 'get_rating',
+    'put_rating': 'upsert_rating',
+    'recommendations': 'get_recommendations',
+    'cold_start': 'get_recommendations'
+}
+
+# Relative request weights
+DEFAULT_MIX = {
+    'browse': 20,
+    'search_title': 10,
+    'search_facet': 5,
+    'search_fuzzy': 5,
+    'suggest': 15,
+    'get_ratings': 10,
+    'get_rating': 5,
+    'put_rating': 10,
+    'recommendations': 20,
+    'cold_start': 5
+}
+
+# Served only from the pipeline's S3 artifacts
+ARTIFACT_SCENARIOS = {'search_fuzzy', 'suggest'}
+
+# Share of browse requests that fetch the next page of the previous browse
+BROWSE_NEXT_PAGE_SHARE = 0.3
+
+def parse_mix(text):
+    """'browse=20,suggest=10' -> {'browse': 20.0, 'suggest': 10.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIO_HANDLERS:
+            raise ValueError(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIO_HANDLERS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise ValueError(f"Scenario {name} needs a numeric weight, as in {name}=10")
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+def api_event(method, path, query=None, body=None):
+    return {
+        'httpMethod': method,
+        'path': path,
+        'resource': path,
+        'headers': {'Content-Type': 'application/json'},
+        'queryStringParameters': query,
+        'pathParameters': None,
+        'body': json.dumps(body) if body is not None else None,
+        'isBase64Encoded': False
+    }
+
+def title_words(title):
+    return [word for word in ''.join(c if c.isalnum() else ' ' for c in str(title).lower()).split() if len(word) >= 4]
+
+class Workload:
+    """Builds the event of each scenario from the seeded books and ratings"""
+
+    def __init__(self, dataset, seed):
+        self.random = random.Random(seed)
+        self.books = dataset['books']
+        self.book_weights = list(itertools.accumulate(int(book.get('rating_count') or 0) + 1 for book in self.books))
+        self.ratings = dataset['ratings']
+        # Rated books the pipeline filtered out, as a new user's first ratings would be
+        catalog = {book['isbn'] for book in self.books}
+        self.unknown_isbns = sorted({isbn for _, isbn, _ in self.ratings if isbn not in catalog}) or ['0000000000']
+        self.user_books = {}
+        for user_id, isbn, rating in self.ratings:
+            self.user_books.setdefault(user_id, []).append((isbn, rating))
+
+    def popular_book(self, field=None):
+        """A book drawn by rating count, with a value for field if given"""
+        while True:
+            book = self.random.choices(self.books, cum_weights=self.book_weights)[0]
+            if field is None or book.get(field):
+                return book
+
+    def title_term(self):
+        while True:
+            words = title_words(self.popular_book()['title'])
+            if words:
+                return self.random.choice(words)
+
+    def browse(self):
+        return api_event('GET', '/books', {'limit': '20'}), self.random.random() < BROWSE_NEXT_PAGE_SHARE
+
+    def search_title(self):
+        return api_event('GET', '/books/search', {'title': self.title_term(), 'limit': '20'}), False
+
+    def search_facet(self):
+        field = 'author' if self.random.random() < 0.75 else 'publisher'
+        return api_event('GET', '/books/search', {field: str(self.popular_book(field)[field]), 'limit': '20'}), False
+
+    def search_fuzzy(self):
+        # One transposed pair of letters, the most common typo
+        term = list(self.title_term())
+        position = self.random.randrange(len(term) - 1)
+        term[position], term[position + 1] = term[position + 1], term[position]
+        return api_event('GET', '/books/search', {'title': ''.join(term), 'mode': 'fuzzy', 'limit': '20'}), False
+
+    def suggest(self):
+        term = self.title_term()
+        return api_event('GET', '/books/suggest', {'q': term[:self.random.randint(3, len(term))], 'limit': '10'}), False
+
+    def get_ratings(self):
+        user_id, _, _ = self.random.choice(self.ratings)
+        return api_event('GET', '/ratings', {'user_id': user_id}), False
+
+    def get_rating(self):
+        user_id, isbn, _ = self.random.choice(self.ratings)
+        return api_event('GET', '/ratings', {'user_id': user_id, 'isbn': isbn}), False
+
+    def put_rating(self):
+        user_id, _, _ = self.random.choice(self.ratings)
+        body = {'user_id': user_id, 'isbn': self.popular_book()['isbn'], 'rating': self.random.randint(1, 10)}
+        return api_event('PUT', '/ratings', body=body), False
+
+    def recommendations(self):
+        user_id, _, _ = self.random.choice(self.ratings)
+        rated = self.user_books[user_id]
+        books = self.random.sample(rated, min(len(rated), self.random.randint(1, 5)))
+        body = {'books': [{'isbn': isbn, 'rating': rating} for isbn, rating in books], 'limit_per_book': 5}
+        return api_event('POST', '/recommendations', body=body), False
+
+    def cold_start(self):
+        # A new user whose few rated books have no similarity lists, or who has rated nothing yet
+        isbns = self.random.sample(self.unknown_isbns, min(len(self.unknown_isbns), self.random.randint(0, 2)))
+        body = {'books': [{'isbn': isbn, 'rating': self.random.randint(1, 10)} for isbn in isbns], 'limit_per_book': 5}
+        return api_event('POST', '/recommendations', body=body), False
+
+    def schedule(self, mix, requests):
+        """requests (scenario, event, next_page) entries drawn by the mix weights"""
+        names = self.random.choices(list(mix), weights=list(mix.values()), k=requests)
+        return [(name, *getattr(self, name)()) for name in names]
@@ -0,0 +1,142 @@
+import os
+import csv
+import json
+import base64
+from decimal import Decimal
+from datetime import datetime
+
+# Loads a local pipeline run into a DynamoDB stand-in the way the Glue job and the
+# activation Lambda would: the versioned Books, BookSimilarities, SearchFacets and
+# PopularLists tables from run_local.py's JSON lines, the S3 artifacts, the active-version
+# pointer, and a Ratings table from the Ratings.csv the run was trained on.
+
+PIPELINE_STATE_TABLE = 'PipelineState'
+RATINGS_TABLE = 'Ratings'
+SEARCH_CACHE_TABLE = 'SearchCache'
+ARTIFACTS_BUCKET = 'book-recommender-artifacts'
+ARTIFACTS = ('catalog.bin', 'title_index.json.gz', 'title_trigrams.json.gz')
+
+def read_json_lines(path):
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            if line.strip():
+                yield json.loads(line, parse_float=Decimal)
+
+def read_ratings(path, max_ratings):
+    """(user_id, isbn, rating) tuples from a Book-Crossing style Ratings.csv"""
+    ratings = []
+    with open(path, newline='', encoding='utf-8', errors='replace') as source:
+        for row in csv.DictReader(source):
+            ratings.append((str(row['User-ID']), row['ISBN'], int(float(row['Book-Rating']))))
+            if len(ratings) >= max_ratings:
+                break
+    return ratings
+
+def read_dataset(pipeline_dir, ratings_path, max_ratings):
+    """The manifest, Books items and ratings of a run_local.py output directory"""
+    with open(os.path.join(pipeline_dir, 'manifest.json'), encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+    return {
+        'pipeline_dir': pipeline_dir,
+        'manifest': manifest,
+        'books': list(read_json_lines(os.path.join(pipeline_dir, 'books.jsonl'))),
+        'ratings': read_ratings(ratings_path, max_ratings),
+        'has_artifacts': all(os.path.exists(os.path.join(pipeline_dir, name)) for name in ARTIFACTS)
+    }
+
+def similarity_item(record):
+    if 'neighbours' in record:
+        record['neighbours'] = base64.b64decode(record['neighbours'])
+    return record
+
+def rating_item(rating, now):
+    user_id, isbn, value = rating
+    return {'user_id': user_id, 'isbn': isbn, 'rating': Decimal(value), 'created_at': now, 'updated_at': now}
+
+def create_table(client, name, keys):
+    """(Re)create an on-demand table; keys are (attribute, type, key type) tuples"""
+    try:
+        client.delete_table(TableName=name)
+        client.get_waiter('table_not_exists').wait(TableName=name)
+    except client.exceptions.ResourceNotFoundException:
+        pass
+    client.create_table(
+        TableName=name,
+        KeySchema=[{'AttributeName': attribute, 'KeyType': key_type} for attribute, _, key_type in keys],
+        AttributeDefinitions=[{'AttributeName': attribute, 'AttributeType': kind} for attribute, kind, _ in keys],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    client.get_waiter('table_exists').wait(TableName=name)
+
+def write_items(dynamodb, table_name, items):
+    count = 0
+    with dynamodb.Table(table_name).batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+            count += 1
+    return count
+
+def seed(dynamodb, s3, dataset, artifacts=True, search_cache=False):
+    """Create and load every table the handlers read, then write the active-version pointer"""
+    client = dynamodb.meta.client
+    manifest = dataset['manifest']
+    version = manifest['data_version']
+    pipeline_dir = dataset['pipeline_dir']
+    now = datetime.utcnow().isoformat()
+
+    tables = [
+        (manifest['books_table'], [('isbn', 'S', 'HASH')]),
+        (manifest['similarities_table'], [('isbn', 'S', 'HASH')]),
+        (manifest['facets_table'], [('term', 'S', 'HASH')]),
+        (manifest['lists_table'], [('list_id', 'S', 'HASH')]),
+        (RATINGS_TABLE, [('user_id', 'S', 'HASH'), ('isbn', 'S', 'RANGE')]),
+        (PIPELINE_STATE_TABLE, [('id', 'S', 'HASH')])
+    ]
+    if search_cache:
+        tables.append((SEARCH_CACHE_TABLE, [('cache_key', 'S', 'HASH')]))
+    for name, keys in tables:
+        create_table(client, name, keys)
+
+    loads = {
+        manifest['books_table']: dataset['books'],
+        manifest['similarities_table']: map(similarity_item, read_json_lines(os.path.join(pipeline_dir, 'similarities.jsonl'))),
+        manifest['facets_table']: read_json_lines(os.path.join(pipeline_dir, 'search_facets.jsonl')),
+        manifest['lists_table']: read_json_lines(os.path.join(pipeline_dir, 'popular_lists.jsonl')),
+        RATINGS_TABLE: (rating_item(rating, now) for rating in dataset['ratings'])
+    }
+    for table_name, items in loads.items():
+        print(f"Loaded {write_items(dynamodb, table_name, items)} items into {table_name}")
+
+    pointer = {
+        'id': 'active-version',
+        'version': version,
+        'books_table': manifest['books_table'],
+        'similarities_table': manifest['similarities_table'],
+        'similarities_format': 'packed',
+        'facets_table': manifest['facets_table'],
+        'lists_table': manifest['lists_table'],
+        'activated_at': now + 'Z'
+    }
+    if artifacts:
+        try:
+            s3.create_bucket(Bucket=ARTIFACTS_BUCKET)
+        except s3.exceptions.BucketAlreadyOwnedByYou:
+            pass
+        prefix = f"versions/{version}/"
+        for name in ARTIFACTS:
+            s3.upload_file(os.path.join(pipeline_dir, name), ARTIFACTS_BUCKET, prefix + name)
+        pointer.update({'artifacts_bucket': ARTIFACTS_BUCKET, 'artifacts_prefix': prefix})
+        print(f"Uploaded {', '.join(ARTIFACTS)} to s3://{ARTIFACTS_BUCKET}/{prefix}")
+    dynamodb.Table(PIPELINE_STATE_TABLE).put_item(Item=pointer)
+
+def handler_environment(manifest, search_cache=False):
+    """Table environment variables of the handlers for a seeded dataset"""
+    environment = {
+        'PIPELINE_STATE_TABLE_NAME': PIPELINE_STATE_TABLE,
+        'BOOKS_TABLE_NAME': manifest['books_table'],
+        'SIMILARITIES_TABLE_NAME': manifest['similarities_table'],
+        'RATINGS_TABLE_NAME': RATINGS_TABLE
+    }
+    if search_cache:
+        environment['SEARCH_CACHE_TABLE_NAME'] = SEARCH_CACHE_TABLE
+    return environment
@@ -2,7 +2,21 @@ import json
 import boto3
 import os
 import logging
+import time
+import re
+import math
+import sys
+import gzip
+import heapq
+import base64
+import hashlib
+from array import array
+from collections import OrderedDict
 from decimal import Decimal
+from catalog_snapshot import get_catalog
+from dynamodb_metrics import instrument, instrumented_handler
+from data_version import get_active_version
+from dynamodb_batch import batch_get_items
 
 # Custom JSON encoder to handle Decimal objects
 class DecimalEncoder(json.JSONEncoder):
@@ -16,82 +30,435 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+dynamodb = instrument(boto3.resource('dynamodb'))
+s3 = boto3.client('s3')
 
+# Ranked results can be paged through up to this depth, bounding memory per request
+MAX_RESULT_WINDOW = 500
+SEARCH_ATTRIBUTES = ['isbn', 'title', 'title_normalized', 'author', 'year_of_publication', 'publisher', 'rating_count']
+
+# Fuzzy search shortlists books through the rarest query trigrams, then scores
+# at most MAX_FUZZY_CANDIDATES of them by trigram similarity
+TRIGRAM_INDEX_ARTIFACT = 'title_trigrams.json.gz'
+MAX_FUZZY_CANDIDATES = 300
+MIN_SHORTLIST_TRIGRAMS = 3
+MAX_POSTING_FRACTION = 0.05
+MIN_FUZZY_COVERAGE = 0.5
+_trigram_index = {'version': None, 'books': [], 'postings': {}, 'decoded': {}}
+
+# Author and publisher searches read one precomputed facets item per term, then
+# fetch the requested page of books in a single batch
+FIELD_SEARCH_ATTRIBUTES = ['isbn', 'title', 'author', 'year_of_publication', 'publisher']
+
+# Search results are cached per container in an LRU, and optionally in a shared
+# DynamoDB table (SEARCH_CACHE_TABLE_NAME, with expires_at as its TTL attribute).
+# Keys include the data version, so a new pipeline load never serves stale results.
+# Empty results are cached too: they usually come from misspelled queries that
+# cost a full scan and stay empty until the next data version
+SEARCH_CACHE_MAX_ENTRIES = 512
+SEARCH_CACHE_TTL_SECONDS = 300
+NEGATIVE_CACHE_TTL_SECONDS = 900
+_search_cache = OrderedDict()
+_search_cache_stats = {'lookups': 0, 'memory_hits': 0, 'shared_hits': 0, 'negative_hits': 0}
+
+def get_trigram_index(active_version):
+    """Load the trigram index for the active data version, reusing the copy already in memory"""
+    version = active_version.get('version')
+    if _trigram_index['version'] != version:
+        started = time.time()
+        response = s3.get_object(
+            Bucket=active_version['artifacts_bucket'],
+            Key=active_version['artifacts_prefix'] + TRIGRAM_INDEX_ARTIFACT
+        )
+        index = json.loads(gzip.decompress(response['Body'].read()))
+        _trigram_index.update(version=version, books=index['books'], postings=index['postings'], decoded={})
+        logger.info(f"Loaded trigram index for version {version}: {len(index['postings'])} trigrams in {time.time() - started:.2f}s")
+    return _trigram_index
+
+def get_posting(index, trigram):
+    """Decode a trigram's posting list (little-endian uint32 book ids) on first use"""
+    if trigram not in index['decoded']:
+        book_ids = array('I')
+        encoded = index['postings'].get(trigram)
+        if encoded:
+            book_ids.frombytes(base64.b64decode(encoded))
+            if sys.byteorder != 'little':
+                book_ids.byteswap()
+        index['decoded'][trigram] = book_ids
+    return index['decoded'][trigram]
+
+def normalize_title(title):
+    """Lowercase a title and reduce it to space-separated word characters (mirrors the pipeline)"""
+    return ' '.join(re.findall(r'\w+', title.lower()))
+
+def title_trigrams(normalized):
+    """Character trigrams of each word, padded with two leading spaces and one trailing space (mirrors the pipeline)"""
+    trigrams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        for start in range(len(padded) - 2):
+            trigrams.add(padded[start:start + 3])
+    return trigrams
+
+def fuzzy_search(index, title, offset, limit):
+    """
+    Find titles similar to a possibly misspelled query. Candidates come from the posting lists
+    of the query's rarest trigrams; each is ranked by the share of query trigrams it contains,
+    then by trigram Jaccard similarity, then by rating count.
+    """
+    query_trigrams = title_trigrams(normalize_title(title))
+    books = index['books']
+    
+    # Count shared trigrams per book, rarest trigrams first; very common ones ("the")
+    # are skipped once a few rarer trigrams have been counted
+    hits = {}
+    counted = 0
+    for trigram in sorted(query_trigrams, key=lambda trigram: len(get_posting(index, trigram))):
+        book_ids = get_posting(index, trigram)
+        if counted >= MIN_SHORTLIST_TRIGRAMS and len(book_ids) > MAX_POSTING_FRACTION * len(books):
+            break
+        counted += 1
+        for book_id in book_ids:
+            hits[book_id] = hits.get(book_id, 0) + 1
+    
+    shortlist = heapq.nlargest(MAX_FUZZY_CANDIDATES, hits.items(), key=lambda hit: hit[1])
+    
+    matches = []
+    for book_id, _ in shortlist:
+        isbn, book_title, author, year_of_publication, publisher, rating_count = books[book_id]
+        book_trigrams = title_trigrams(normalize_title(book_title))
+        shared = len(query_trigrams & book_trigrams)
+        coverage = shared / len(query_trigrams) if query_trigrams else 0.0
+        if coverage < MIN_FUZZY_COVERAGE:
+            continue
+        jaccard = shared / len(query_trigrams | book_trigrams)
+        matches.append(((round(coverage, 4), round(jaccard, 4), rating_count), isbn, {
+            'isbn': isbn,
+            'title': book_title,
+            'author': author,
+            'year_of_publication': year_of_publication,
+            'publisher': publisher
+        }))
+    
+    ranked = sorted(matches, key=lambda match: match[:2], reverse=True)
+    books_page = [book for _, _, book in ranked[offset:offset + limit]]
+    
+    result = {
+        'books': books_page,
+        'search_term': title,
+        'mode': 'fuzzy',
+        'count': len(books_page),
+        'total_matches': len(matches)
+    }
+    next_offset = offset + limit
+    if next_offset < min(len(matches), MAX_RESULT_WINDOW):
+        result['next_cursor'] = str(next_offset)
+    return result
+
+def field_search(active_version, field, value, offset, limit):
+    """
+    Find books by author or publisher from the term's precomputed facets item: the most rated
+    matching ISBNs and facet counts by author, publisher and decade over all matching books
+    """
+    result = {
+        'books': [],
+        'search_term': value,
+        'field': field,
+        'count': 0,
+        'total_matches': 0,
+        'facets': {}
+    }
+    
+    term = f"{field}:{normalize_title(value)}"
+    response = dynamodb.Table(active_version['facets_table']).get_item(Key={'term': term})
+    facet_item = response.get('Item')
+    if not facet_item:
+        return result
+    
+    isbns = facet_item['isbns'][offset:offset + limit]
+    catalog = get_catalog(active_version)
+    if catalog:
+        items = [item for item in map(catalog.get, isbns) if item]
+        result['books'] = [{name: item[name] for name in FIELD_SEARCH_ATTRIBUTES} for item in items]
+    elif isbns:
+        items = batch_get_items(
+            active_version['books_table'],
+            [{'isbn': isbn} for isbn in isbns],
+            FIELD_SEARCH_ATTRIBUTES
+        )
+        items_by_isbn = {item['isbn']: item for item in items}
+        result['books'] = [items_by_isbn[isbn] for isbn in isbns if isbn in items_by_isbn]
+    
+    result['label'] = facet_item['label']
+    result['count'] = len(result['books'])
+    result['total_matches'] = int(facet_item['match_count'])
+    # DynamoDB maps are unordered, so list the most frequent facet values first again
+    result['facets'] = {
+        facet: dict(sorted(((facet_value, int(facet_count)) for facet_value, facet_count in counts.items()),
+                           key=lambda facet_entry: (-facet_entry[1], facet_entry[0])))
+        for facet, counts in facet_item['facets'].items()
+    }
+    
+    next_offset = offset + limit
+    if next_offset < min(len(facet_item['isbns']), MAX_RESULT_WINDOW):
+        result['next_cursor'] = str(next_offset)
+    return result
+
+@instrumented_handler
 def lambda_handler(event, context):
     """
-    Lambda function to search books by title using full-text search
+    Lambda function to search books by title using full-text search, or by author or publisher
     """
     try:
         # Get query parameters
         query_params = event.get('queryStringParameters') or {}
         title = query_params.get('title')
+        fields = [field for field in ('author', 'publisher') if query_params.get(field)]
         
-        if not title:
-            return create_error_response(400, "title parameter is required")
+        if not title and not fields:
+            return create_error_response(400, "title, author or publisher parameter is required")
+        if len(fields) + bool(title) > 1:
+            return create_error_response(400, "Search by only one of title, author or publisher")
         
-        # Normalize search term
-        search_term = title.lower().strip()
+        # Parse paging parameters
+        try:
+            limit = int(query_params.get('limit', 20))
+            offset = int(query_params.get('cursor') or 0)
+        except ValueError:
+            return create_error_response(400, "limit and cursor must be numbers")
         
-        # Get DynamoDB table
-        table_name = os.environ['BOOKS_TABLE_NAME']
-        table = dynamodb.Table(table_name)
+        # Validate limit and keep the ranked window bounded
+        if limit > 100:
+            limit = 100
+        if limit < 1:
+            limit = 20
+        if offset < 0 or offset >= MAX_RESULT_WINDOW:
+            return create_error_response(400, f"Only the top {MAX_RESULT_WINDOW} results can be paged through")
+        # The last page of the window is shortened rather than rejected
+        limit = min(limit, MAX_RESULT_WINDOW - offset)
         
-        # For partial text search, use scan with contains filter on title_normalized field
-        logger.info(f"Searching for: '{search_term}'")
+        # 'field' is implied by an author or publisher parameter, never requested directly
+        mode = query_params.get('mode') or 'contains'
+        if mode not in ('contains', 'fuzzy'):
+            return create_error_response(400, "mode must be 'contains' or 'fuzzy'")
+        if fields:
+            mode = 'field'
         
-        # Scan through the entire dataset with proper pagination
-        all_items = []
-        last_evaluated_key = None
+        # Author and publisher searches are key lookups into the pipeline's facets table,
+        # typo-tolerant searches are served from its trigram index instead of a scan
+        active_version = get_active_version()
+        if mode == 'field' and not active_version.get('facets_table'):
+            return create_error_response(503, "Author and publisher search is not available yet")
+        if mode == 'fuzzy' and not active_version.get('artifacts_prefix'):
+            return create_error_response(503, "Fuzzy search is not available yet")
         
-        while True:
-            scan_kwargs = {
-                'FilterExpression': 'contains(title_normalized, :search_term)',
-                'ExpressionAttributeValues': {
-                    ':search_term': search_term
-                }
-            }
-            
-            if last_evaluated_key:
-                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
-            
-            response = table.scan(**scan_kwargs)
-            all_items.extend(response['Items'])
-            
-            # Check if there are more items to scan
-            if 'LastEvaluatedKey' not in response:
-                break
-            last_evaluated_key = response['LastEvaluatedKey']
-            
-            logger.info(f"Scanned batch, found {len(response['Items'])} items, total so far: {len(all_items)}")
+        search_value = query_params[fields[0]] if fields else title
+        cache_key = search_cache_key(active_version, mode, fields[0] if fields else 'title', search_value, offset, limit)
+        result = get_cached_result(cache_key)
         
-        logger.info(f"Found {len(all_items)} items after scanning entire dataset")
-        
-        # Format books for response
-        books = []
-        for item in all_items:
-            book = {
-                'isbn': item['isbn'],
-                'title': item['title'],
-                'author': item['author'],
-                'year_of_publication': item['year_of_publication'],
-                'publisher': item['publisher']
-            }
-            books.append(book)
-        
-        # Create response
-        result = {
-            'books': books,
-            'search_term': title,
-            'count': len(books)
-        }
+        if result is None:
+            if mode == 'field':
+                result = field_search(active_version, fields[0], search_value, offset, limit)
+            elif mode == 'fuzzy':
+                result = fuzzy_search(get_trigram_index(active_version), title, offset, limit)
+            else:
+                result = title_search(active_version, title, offset, limit)
+            put_cached_result(cache_key, result)
         
+        # Cached results are shared by queries that normalize alike, so echo this request's term
+        result = dict(result, search_term=search_value)
         return create_success_response(result)
         
     except Exception as e:
         logger.error(f"Error searching books: {str(e)}")
         return create_error_response(500, "Internal server error")
 
+def search_cache_key(active_version, mode, field, value, offset, limit):
+    """Key a search by data version and normalized query, so equivalent queries share an entry"""
+    if mode == 'contains':
+        normalized = value.lower().strip()
+    else:
+        normalized = normalize_title(value)
+    data_version = active_version.get('version') or os.environ.get('BOOKS_TABLE_NAME', '')
+    key = json.dumps([data_version, mode, field, normalized, offset, limit])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def get_cached_result(cache_key):
+    """Look a search up in the container cache, then in the shared cache table if configured"""
+    now = time.time()
+    entry = _search_cache.get(cache_key)
+    if entry and entry[0] > now:
+        _search_cache.move_to_end(cache_key)
+        record_cache_lookup('memory', entry[1])
+        return entry[1]
+    if entry:
+        del _search_cache[cache_key]
+    
+    cache_table_name = os.environ.get('SEARCH_CACHE_TABLE_NAME')
+    if cache_table_name:
+        try:
+            item = dynamodb.Table(cache_table_name).get_item(Key={'cache_key': cache_key}).get('Item')
+            # Expired items stay readable until DynamoDB's TTL sweep deletes them
+            if item and float(item['expires_at']) > now:
+                result = json.loads(item['result'])
+                remember_result(cache_key, result, float(item['expires_at']))
+                record_cache_lookup('shared', result)
+                return result
+        except Exception as e:
+            logger.error(f"Error reading search cache: {str(e)}")
+    
+    record_cache_lookup('miss', None)
+    return None
+
+def put_cached_result(cache_key, result):
+    """Cache a search result in the container and, if configured, in the shared cache table"""
+    ttl = NEGATIVE_CACHE_TTL_SECONDS if result['total_matches'] == 0 else SEARCH_CACHE_TTL_SECONDS
+    expires_at = time.time() + ttl
+    remember_result(cache_key, result, expires_at)
+    
+    cache_table_name = os.environ.get('SEARCH_CACHE_TABLE_NAME')
+    if cache_table_name:
+        try:
+            dynamodb.Table(cache_table_name).put_item(Item={
+                'cache_key': cache_key,
+                'result': json.dumps(result, cls=DecimalEncoder),
+                'expires_at': int(expires_at)
+            })
+        except Exception as e:
+            logger.error(f"Error writing search cache: {str(e)}")
+
+def remember_result(cache_key, result, expires_at):
+    """Store a result in the container LRU, evicting the least recently used entries"""
+    _search_cache[cache_key] = (expires_at, result)
+    _search_cache.move_to_end(cache_key)
+    while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+        _search_cache.popitem(last=False)
+
+def record_cache_lookup(outcome, result):
+    """Count a cache lookup and log the container's running hit rate as one JSON line"""
+    stats = _search_cache_stats
+    stats['lookups'] += 1
+    if outcome != 'miss':
+        stats[f'{outcome}_hits'] += 1
+        if result['total_matches'] == 0:
+            stats['negative_hits'] += 1
+    
+    hits = stats['memory_hits'] + stats['shared_hits']
+    logger.info(json.dumps({
+        'search_cache': outcome,
+        'negative': bool(result) and result['total_matches'] == 0,
+        'entries': len(_search_cache),
+        'hit_rate': round(hits / stats['lookups'], 4),
+        **stats
+    }))
+
+def title_search(active_version, title, offset, limit):
+    """Scan for titles containing the term, keeping only the best offset + limit matches"""
+    # Normalize search term
+    search_term = title.lower().strip()
+    search_tokens = set(re.findall(r'\w+', search_term))
+    
+    # For partial text search, use scan with contains filter on title_normalized field
+    logger.info(f"Searching for: '{search_term}'")
+    
+    # Go through the entire dataset, keeping only the best offset + limit matches in a heap
+    window = offset + limit
+    top_matches = []
+    total_matches = 0
+    
+    for item in iter_title_matches(active_version, search_term):
+        total_matches += 1
+        entry = (rank_match(item, search_term, search_tokens), item['isbn'], item)
+        if len(top_matches) < window:
+            heapq.heappush(top_matches, entry)
+        elif entry[:2] > top_matches[0][:2]:
+            heapq.heapreplace(top_matches, entry)
+    
+    logger.info(f"Found {total_matches} items after scanning entire dataset")
+    
+    # Best matches first, in the same (rank, ISBN) order the heap kept them by, so pages are stable
+    ranked = sorted(top_matches, key=lambda entry: entry[:2], reverse=True)
+    
+    # Format books for response
+    books = []
+    for _, _, item in ranked[offset:offset + limit]:
+        book = {
+            'isbn': item['isbn'],
+            'title': item['title'],
+            'author': item['author'],
+            'year_of_publication': item['year_of_publication'],
+            'publisher': item['publisher']
+        }
+        books.append(book)
+    
+    # Create response
+    result = {
+        'books': books,
+        'search_term': title,
+        'count': len(books),
+        'total_matches': total_matches
+    }
+    
+    next_offset = offset + limit
+    if next_offset < min(total_matches, MAX_RESULT_WINDOW):
+        result['next_cursor'] = str(next_offset)
+    
+    return result
+
+def iter_title_matches(active_version, search_term):
+    """Yield books whose normalized title contains the term, from the local catalog snapshot or a DynamoDB scan"""
+    catalog = get_catalog(active_version)
+    if catalog:
+        for position in catalog.positions_with_title(search_term):
+            item = catalog.book_at(position)
+            item['title_normalized'] = catalog.title_at(position)
+            yield item
+        return
+    
+    # Get DynamoDB table
+    table_name = active_version.get('books_table') or os.environ['BOOKS_TABLE_NAME']
+    table = dynamodb.Table(table_name)
+    last_evaluated_key = None
+    
+    while True:
+        scan_kwargs = {
+            'FilterExpression': 'contains(title_normalized, :search_term)',
+            'ProjectionExpression': ', '.join(f'#{name}' for name in SEARCH_ATTRIBUTES),
+            'ExpressionAttributeNames': {f'#{name}': name for name in SEARCH_ATTRIBUTES},
+            'ExpressionAttributeValues': {
+                ':search_term': search_term
+            }
+        }
+        
+        if last_evaluated_key:
+            scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+        
+        response = table.scan(**scan_kwargs)
+        yield from response['Items']
+        
+        # Check if there are more items to scan
+        if 'LastEvaluatedKey' not in response:
+            break
+        last_evaluated_key = response['LastEvaluatedKey']
+
+def rank_match(item, search_term, search_tokens):
+    """
+    Rank a matching book: exact title, then title prefix, then substring matches;
+    within a tier by query-token overlap, then by popularity (rating count)
+    """
+    title_normalized = item.get('title_normalized', '')
+    if title_normalized == search_term:
+        tier = 3
+    elif title_normalized.startswith(search_term):
+        tier = 2
+    else:
+        tier = 1
+    
+    title_tokens = set(re.findall(r'\w+', title_normalized))
+    overlap = len(search_tokens & title_tokens) / len(search_tokens) if search_tokens else 0.0
+    popularity = math.log1p(float(item.get('rating_count', 0)))
+    return (tier, overlap, popularity)
+
 def create_success_response(body):
     """Create a successful API Gateway response"""
     return {
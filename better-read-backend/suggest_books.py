@@ -0,0 +1,163 @@
+import json
+import boto3
+import re
+import gzip
+import heapq
+import logging
+import time
+from bisect import bisect_left
+from decimal import Decimal
+from dynamodb_metrics import instrument, instrumented_handler
+from data_version import get_active_version
+
+# Custom JSON encoder to handle Decimal objects
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize AWS clients
+dynamodb = instrument(boto3.resource('dynamodb'))
+s3 = boto3.client('s3')
+
+# Title index built by the pipeline, loaded once per container and data version
+TITLE_INDEX_ARTIFACT = 'title_index.json.gz'
+_title_index = {'version': None, 'keys': [], 'refs': [], 'books': [], 'by_rating_count': []}
+
+# Prefix ranges of up to this many keys are ranked directly. Larger ranges (short or common
+# prefixes) walk the key positions in rating count order instead, which reaches enough matches
+# after about len(keys) / range size steps per candidate
+MAX_RANKED_KEYS = 5000
+
+def get_title_index(active_version):
+    """Load the title index for the active data version, reusing the copy already in memory"""
+    version = active_version.get('version')
+    if _title_index['version'] != version:
+        started = time.time()
+        response = s3.get_object(
+            Bucket=active_version['artifacts_bucket'],
+            Key=active_version['artifacts_prefix'] + TITLE_INDEX_ARTIFACT
+        )
+        index = json.loads(gzip.decompress(response['Body'].read()))
+        _title_index.update(
+            version=version, keys=index['keys'], refs=index['refs'], books=index['books'],
+            by_rating_count=index.get('by_rating_count', [])
+        )
+        logger.info(f"Loaded title index for version {version}: {len(index['keys'])} keys in {time.time() - started:.2f}s")
+    return _title_index
+
+def normalize_title(title):
+    """Lowercase a title and reduce it to space-separated word characters (mirrors the pipeline)"""
+    return ' '.join(re.findall(r'\w+', title.lower()))
+
+@instrumented_handler
+def lambda_handler(event, context):
+    """
+    Lambda function to suggest book titles for a typed prefix
+    """
+    try:
+        # Get query parameters
+        query_params = event.get('queryStringParameters') or {}
+        query = query_params.get('q')
+
+        if not query:
+            return create_error_response(400, "q parameter is required")
+
+        try:
+            limit = int(query_params.get('limit', 10))
+        except ValueError:
+            return create_error_response(400, "limit must be a number")
+
+        # Validate limit
+        if limit > 50:
+            limit = 50
+        if limit < 1:
+            limit = 10
+
+        active_version = get_active_version()
+        if not active_version.get('artifacts_prefix'):
+            return create_error_response(503, "Suggestions are not available yet")
+
+        index = get_title_index(active_version)
+
+        # A typed trailing space still means "this word is complete"
+        prefix = normalize_title(query) + (' ' if query.endswith(' ') else '')
+        if not prefix.strip():
+            return create_success_response({'suggestions': [], 'query': query, 'count': 0})
+
+        # All keys starting with the prefix form one contiguous range of the sorted keys
+        keys, refs, books = index['keys'], index['refs'], index['books']
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + '\uffff', start)
+
+        # Most rated books first; over-fetch so several matching words of one title collapse
+        candidate_count = limit * 4
+        if end - start <= MAX_RANKED_KEYS or not index['by_rating_count']:
+            candidates = heapq.nlargest(candidate_count, range(start, end), key=lambda position: books[refs[position]][3])
+        else:
+            candidates = []
+            for position in index['by_rating_count']:
+                if start <= position < end:
+                    candidates.append(position)
+                    if len(candidates) == candidate_count:
+                        break
+
+        suggestions = []
+        seen_isbns = set()
+        seen_titles = set()
+        for position in candidates:
+            isbn, title, author, rating_count = books[refs[position]]
+            if isbn in seen_isbns or title.lower() in seen_titles:
+                continue
+            seen_isbns.add(isbn)
+            seen_titles.add(title.lower())
+            suggestions.append({
+                'isbn': isbn,
+                'title': title,
+                'author': author
+            })
+            if len(suggestions) == limit:
+                break
+
+        result = {
+            'suggestions': suggestions,
+            'query': query,
+            'count': len(suggestions)
+        }
+
+        return create_success_response(result)
+
+    except Exception as e:
+        logger.error(f"Error suggesting books: {str(e)}")
+        return create_error_response(500, "Internal server error")
+
+def create_success_response(body):
+    """Create a successful API Gateway response"""
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'
+        },
+        'body': json.dumps(body, cls=DecimalEncoder)
+    }
+
+def create_error_response(status_code, message):
+    """Create an error API Gateway response"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS'
+        },
+        'body': json.dumps({'error': message})
+    }
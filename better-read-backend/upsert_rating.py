@@ -4,6 +4,7 @@ import os
 import logging
 from decimal import Decimal
 from datetime import datetime
+from dynamodb_metrics import instrument, instrumented_handler
 
 # Custom JSON encoder to handle Decimal objects
 class DecimalEncoder(json.JSONEncoder):
@@ -17,8 +18,9 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+dynamodb = instrument(boto3.resource('dynamodb'))
 
+@instrumented_handler
 def lambda_handler(event, context):
     """
     Lambda function to upsert (create or update) user ratings
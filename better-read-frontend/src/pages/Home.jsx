@@ -38,7 +38,7 @@ export default function Home() {
   const navigate = useNavigate();
   const [books, setBooks] = useState([]);
   const [userId, setUserId] = useState(null);
-  const [userBooks, setUserBooks] = useState([]);
+  const [userBooks, setUserBooks] = useState(null);
   const [displayBooks, setDisplayBooks] = useState([]);
   const [loading, setLoading] = useState(true);
 
@@ -61,11 +61,12 @@ export default function Home() {
   }, [userId]);
 
   useEffect(() => {
-    if (userBooks.length === 0 || !userId) return;
+    if (!userBooks || !userId) return;
     (async () => {
       const recsResponse = await getRecommendations(userBooks);
       const recsData = await recsResponse.json();
-      const recsBooks = recsData.results.flatMap(r => r.similar_books);
+      // popular_books fills in when the user's ratings give too few similar books
+      const recsBooks = recsData.results.flatMap(r => r.similar_books).concat(recsData.popular_books || []);
       setBooks(recsBooks)
       if (displayBooks.length === 0) {
         const shuffled = recsBooks.sort(() => 0.5 - Math.random());
@@ -74,11 +74,11 @@ export default function Profile() {
 
     setLoadingIndex(index);
     try {
-      const res = await fetch(`${API_GATEWAY}/books/search?title=${query}`);
+      const res = await fetch(`${API_GATEWAY}/books/suggest?q=${encodeURIComponent(query)}`);
       const data = await res.json();
 
       // Simple fuzzy filter for mock data
-      const filtered = data.books.filter((b) =>
+      const filtered = (data.suggestions || []).filter((b) =>
         b.title.toLowerCase().includes(query.toLowerCase()) || 
         b.author.toLowerCase().includes(query.toLowerCase())
       );
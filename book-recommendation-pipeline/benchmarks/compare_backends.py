@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'glue'))
+
+from recommender import compute_similarities
+from recommender.pipeline import TOP_N_SIMILAR, ALS_SEED
+
+# Checks that the Spark and NumPy backends produce equivalent outputs on a dataset
+# from generate_data.py:
+#   - preprocessing: the same book mapping, with the same rating count and sum per book
+#   - co-occurrence: the same neighbour lists and quantized scores. The backends list
+#     books in different orders, so neighbours tied at the lowest score of a list may
+#     differ, and scores may differ by one quantization step from summation order.
+#   - ALS: both backends hold out the same hashed split, so the training and held-out
+#     rating counts and the books with factors must match exactly. The backends draw
+#     their initial factors differently, so factors and neighbour lists differ; each
+#     backend trains with --als-runs seeds, and the mean training and held-out RMSEs
+#     must agree within --rmse-tolerance (relative).
+#
+#   python compare_backends.py --data data/books-10000                 (runs both, needs pyspark)
+#   python compare_backends.py --data data/books-10000 --backend spark --record references/spark-books-10000.json
+#   python compare_backends.py --data data/books-10000 --reference references/spark-books-10000.json
+#
+# A recorded reference lets the NumPy backend be checked where Spark is not installed.
+# Exits with status 1 when the outputs are not equivalent.
+
+DATASET_KEYS = ('name', 'books', 'ratings', 'users', 'explicit_ratings')
+SCORE_TOLERANCE = 1
+DEFAULT_ALS_RUNS = 5
+DEFAULT_RMSE_TOLERANCE = 0.025
+ALS_COUNTS = ('training_ratings', 'held_out_ratings')
+ALS_RMSES = ('training_rmse', 'held_out_rmse')
+
+def backend_outputs(backend_name, data_dir, engines, als_runs=DEFAULT_ALS_RUNS, spark=None, threads=None):
+    """Book mapping totals, co-occurrence neighbour lists and ALS evaluations from one backend"""
+    if backend_name == 'spark':
+        from recommender import spark_backend as backend
+        prepared = backend.load_and_prepare(spark, os.path.abspath(data_dir))
+    else:
+        from recommender import numpy_backend as backend
+        prepared = backend.load_and_prepare(os.path.join(data_dir, 'Books.csv'), os.path.join(data_dir, 'Ratings.csv'), threads)
+
+    with open(os.path.join(data_dir, 'dataset.json'), encoding='utf-8') as dataset_file:
+        dataset = json.load(dataset_file)
+    outputs = {
+        'backend': backend_name,
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'dataset': {key: dataset[key] for key in DATASET_KEYS},
+        'books': {
+            row.ISBN: [int(row.book_rating_count), int(row.book_rating_sum)]
+            for row in prepared['book_mapping_pd'].itertuples(index=False)
+        }
+    }
+    if 'cooccurrence' in engines:
+        _, similarity_list = compute_similarities(backend, prepared, 'cooccurrence', 'cosine', TOP_N_SIMILAR, 'list')
+        outputs['cooccurrence'] = {
+            isbn: [[neighbour, int(score)] for neighbour, score in zip(similar_isbns, scores)]
+            for isbn, _, similar_isbns, scores in similarity_list
+        }
+    if 'als' in engines:
+        prepared['evaluate_als'] = True
+        runs = []
+        for run in range(als_runs):
+            prepared['als_seed'] = ALS_SEED + run
+            item_isbns, _ = compute_similarities(backend, prepared, 'als', 'cosine', TOP_N_SIMILAR, 'list')
+            runs.append(prepared['als_evaluation'])
+        # The split, and so the books with factors, is the same in every run
+        outputs['als'] = {
+            **{name: runs[0][name] for name in ALS_COUNTS},
+            **{name: [run[name] for run in runs] for name in ALS_RMSES},
+            'isbns': sorted(item_isbns)
+        }
+    if spark is not None:
+        spark.catalog.clearCache()
+    return outputs
+
+def compare_books(reference, candidate):
+    """Books missing from either mapping or with different rating totals"""
+    return sorted(
+        isbn for isbn in set(reference) | set(candidate)
+        if reference.get(isbn) != candidate.get(isbn)
+    )
+
+def lists_match(reference, candidate):
+    """Whether two neighbour lists agree up to ties at their lowest score and one quantization step"""
+    if len(reference) != len(candidate):
+        return False
+    if any(abs(reference_score - candidate_score) > SCORE_TOLERANCE
+           for (_, reference_score), (_, candidate_score) in zip(reference, candidate)):
+        return False
+    if not reference:
+        return True
+    lowest = reference[-1][1] + SCORE_TOLERANCE
+    # Every neighbour clearly above the lowest score must be in both lists
+    above = {neighbour for neighbour, score in reference if score > lowest}
+    return above <= {neighbour for neighbour, _ in candidate}
+
+def compare_cooccurrence(reference, candidate):
+    """Books whose co-occurrence lists are missing from either output or differ"""
+    return sorted(
+        isbn for isbn in set(reference) | set(candidate)
+        if isbn not in reference or isbn not in candidate or not lists_match(reference[isbn], candidate[isbn])
+    )
+
+def mean(values):
+    return sum(values) / len(values)
+
+def compare_als(reference, candidate, rmse_tolerance):
+    """Failed ALS checks: split sizes and trained books must match, mean RMSEs agree within the relative tolerance"""
+    failures = []
+    for name in ALS_COUNTS:
+        if reference[name] != candidate[name]:
+            failures.append(f"ALS: {name} {candidate[name]} vs {reference[name]}")
+    missing, extra = set(reference['isbns']) - set(candidate['isbns']), set(candidate['isbns']) - set(reference['isbns'])
+    if missing or extra:
+        failures.append(f"ALS: {len(missing)} books without factors and {len(extra)} extra, e.g. {sorted(missing | extra)[:5]}")
+    for name in ALS_RMSES:
+        candidate_rmse, reference_rmse = mean(candidate[name]), mean(reference[name])
+        difference = abs(candidate_rmse - reference_rmse) / reference_rmse
+        if difference > rmse_tolerance:
+            failures.append(f"ALS: mean {name} {candidate_rmse:.4f} vs {reference_rmse:.4f} differs by {difference:.1%}")
+    return failures
+
+def compare(reference, candidate, rmse_tolerance):
+    """Print how the candidate's outputs compare with the reference's; returns the failed checks"""
+    if reference['dataset'] != candidate['dataset']:
+        return [f"datasets differ: {reference['dataset']} vs {candidate['dataset']}"]
+
+    print(f"\n=== {candidate['backend']} against {reference['backend']} on {candidate['dataset']['name']} ===")
+    failures = []
+    mismatched = compare_books(reference['books'], candidate['books'])
+    print(f"book mapping: {len(reference['books'])} vs {len(candidate['books'])} books, {len(mismatched)} differ")
+    if mismatched:
+        failures.append(f"book mapping: {len(mismatched)} books differ, e.g. {mismatched[:5]}")
+
+    if 'cooccurrence' in reference and 'cooccurrence' in candidate:
+        mismatched = compare_cooccurrence(reference['cooccurrence'], candidate['cooccurrence'])
+        print(f"co-occurrence: {len(reference['cooccurrence'])} vs {len(candidate['cooccurrence'])} lists, {len(mismatched)} differ")
+        if mismatched:
+            failures.append(f"co-occurrence: {len(mismatched)} lists differ, e.g. {mismatched[:5]}")
+
+    if 'als' in reference and 'als' in candidate:
+        reference_als, candidate_als = reference['als'], candidate['als']
+        print(f"ALS: {candidate_als['training_ratings']} vs {reference_als['training_ratings']} training ratings, "
+              f"{len(candidate_als['isbns'])} vs {len(reference_als['isbns'])} books with factors, "
+              f"mean training RMSE {mean(candidate_als['training_rmse']):.4f} vs {mean(reference_als['training_rmse']):.4f}, "
+              f"mean held-out RMSE {mean(candidate_als['held_out_rmse']):.4f} vs {mean(reference_als['held_out_rmse']):.4f}")
+        failures.extend(compare_als(reference_als, candidate_als, rmse_tolerance))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the Spark and NumPy backends produce equivalent outputs")
+    parser.add_argument('--data', required=True, help="dataset directory from generate_data.py")
+    parser.add_argument('--engine', choices=['als', 'cooccurrence'], action='append', help="engines to compare (default: both)")
+    parser.add_argument('--backend', choices=['spark', 'numpy'], default='numpy', help="backend to run with --record or --reference")
+    parser.add_argument('--record', default=None, help="write this backend's outputs to a reference file instead of comparing")
+    parser.add_argument('--reference', default=None, help="compare this backend with a recorded reference instead of running Spark")
+    parser.add_argument('--als-runs', type=int, default=DEFAULT_ALS_RUNS, help="ALS trainings per backend, each with its own seed")
+    parser.add_argument('--rmse-tolerance', type=float, default=DEFAULT_RMSE_TOLERANCE,
+                        help="allowed relative difference of the ALS training and held-out RMSE")
+    parser.add_argument('--threads', type=int, default=None, help="ALS solver threads for the numpy backend")
+    parser.add_argument('--driver-memory', default='8g', help="Spark driver memory")
+    args = parser.parse_args()
+    if args.record and args.reference:
+        parser.error("--record and --reference cannot be combined")
+    engines = args.engine or ['cooccurrence', 'als']
+
+    backends = [args.backend] if args.record or args.reference else ['spark', 'numpy']
+    spark = None
+    if 'spark' in backends:
+        from pyspark.sql import SparkSession
+        spark = SparkSession.builder.master('local[*]').appName('book-recommender-compare') \
+            .config('spark.driver.memory', args.driver_memory).getOrCreate()
+    try:
+        outputs = [backend_outputs(name, args.data, engines, args.als_runs, spark, args.threads) for name in backends]
+    finally:
+        if spark is not None:
+            spark.stop()
+
+    if args.record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.record)), exist_ok=True)
+        with open(args.record, 'w', encoding='utf-8') as output:
+            json.dump(outputs[0], output)
+        print(f"\nWrote {args.record}")
+        return 0
+
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as reference_file:
+            reference, candidate = json.load(reference_file), outputs[0]
+    else:
+        reference, candidate = outputs
+    failures = compare(reference, candidate, args.rmse_tolerance)
+    if failures:
+        print(f"\n{len(failures)} check(s) failed:\n  " + "\n  ".join(failures))
+        return 1
+    print("\nOutputs are equivalent")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+# Synthetic Books.csv / Ratings.csv in the Book-Crossing layout the pipeline reads.
+# Book popularity, user activity, author and publisher sizes follow Zipf-like power
+# laws, so a few books get most ratings and most books get one or two, as in the
+# real data. Defaults match its shape: about 4 ratings per book, 0.4 users per book
+# and 62% implicit (0) ratings.
+#
+#   python generate_data.py --books 100000 --output data/books-100000
+
+TITLE_WORDS = (
+    "the of and a in to my your our their night day house garden river city road war love "
+    "secret last first little great lost dark silent broken golden summer winter autumn spring "
+    "wind fire water stone glass shadow light moon sun star sea island mountain forest desert "
+    "king queen prince princess daughter son mother father sister brother friend stranger "
+    "murder mystery journey return story history guide book letters diary memoir song dream "
+    "heart soul mind time life death world end beginning promise truth lie game trial case "
+    "harry potter rings hobbit dune foundation emma persuasion dracula ulysses odyssey iliad"
+).split()
+FIRST_NAMES = (
+    "John Mary James Patricia Robert Jennifer Michael Linda William Elizabeth David Barbara "
+    "Richard Susan Joseph Jessica Thomas Sarah Charles Karen Stephen Nora Agatha Ernest Jane"
+).split()
+LAST_NAMES = (
+    "Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Hernandez Lopez "
+    "Wilson Anderson Taylor Moore Jackson Martin Lee King Christie Austen Hemingway Rowling"
+).split()
+PUBLISHER_WORDS = "Penguin Random House Harper Collins Simon Schuster Ballantine Bantam Vintage Press Books".split()
+
+# Explicit rating distribution (1-10), skewed high like the real data
+EXPLICIT_RATING_WEIGHTS = np.array([1, 1, 2, 3, 11, 8, 16, 23, 16, 19], dtype=float)
+
+def zipf_positions(rng, n_values, size, exponent):
+    """Draw size positions in [0, n_values) with probability proportional to 1 / (rank + 1) ** exponent"""
+    cumulative = np.cumsum(1.0 / np.arange(1, n_values + 1) ** exponent)
+    positions = np.searchsorted(cumulative, rng.random(size) * cumulative[-1])
+    return np.minimum(positions, n_values - 1)
+
+def isbn10(numbers):
+    """ISBN-10 strings for 9-digit numbers, with the mod-11 check digit ('X' for 10)"""
+    digits = (numbers[:, None] // 10 ** np.arange(8, -1, -1)) % 10
+    check = (digits * np.arange(10, 1, -1)).sum(axis=1) * 10 % 11
+    check_chars = np.array(list('0123456789X'))[check]
+    return np.char.add(np.char.zfill(numbers.astype(str), 9), check_chars)
+
+def generate_books(rng, n_books, exponent):
+    # Real ISBN-10s; check digits of 'X' keep Spark from inferring the column as a number
+    isbns = isbn10(rng.choice(10 ** 9, n_books, replace=False))
+
+    words = np.array(TITLE_WORDS)
+    lengths = rng.integers(1, 6, n_books)
+    title_words = words[zipf_positions(rng, len(words), lengths.sum(), 0.8)]
+    titles = [' '.join(chunk).title() for chunk in np.split(title_words, np.cumsum(lengths)[:-1])]
+    # A few titles with separators and quotes, as in the real data
+    for position in rng.choice(n_books, n_books // 50, replace=False):
+        titles[position] = f'{titles[position]}: "A Novel", Vol. {position % 9 + 1}'
+
+    n_authors = max(1, n_books // 4)
+    author_names = np.array([
+        f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+        + (f" {i // (len(FIRST_NAMES) * len(LAST_NAMES))}" if i >= len(FIRST_NAMES) * len(LAST_NAMES) else "")
+        for i in range(n_authors)
+    ])
+    n_publishers = max(1, n_books // 100)
+    publisher_names = np.array([
+        f"{PUBLISHER_WORDS[i % len(PUBLISHER_WORDS)]} {PUBLISHER_WORDS[(i // len(PUBLISHER_WORDS)) % len(PUBLISHER_WORDS)]} {i}"
+        for i in range(n_publishers)
+    ])
+    publishers = publisher_names[zipf_positions(rng, n_publishers, n_books, exponent)].astype(object)
+    publishers[rng.random(n_books) < 0.001] = None
+
+    # Mostly recent publication years, with the 0 placeholder the real data has
+    years = np.clip(2005 - rng.exponential(12, n_books).astype(int), 1900, 2005)
+    years[rng.random(n_books) < 0.01] = 0
+
+    image_url = "http://images.amazon.com/images/P/{}.01.{}ZZZZZZZ.jpg"
+    return pd.DataFrame({
+        'ISBN': isbns,
+        'Book-Title': titles,
+        'Book-Author': author_names[zipf_positions(rng, n_authors, n_books, exponent)],
+        'Year-Of-Publication': years,
+        'Publisher': publishers,
+        'Image-URL-S': [image_url.format(isbn, 'T') for isbn in isbns],
+        'Image-URL-M': [image_url.format(isbn, 'M') for isbn in isbns],
+        'Image-URL-L': [image_url.format(isbn, 'L') for isbn in isbns]
+    })
+
+def generate_ratings(rng, isbns, n_ratings, n_users, exponent, implicit_fraction):
+    # Popularity ranks are shuffled over the catalog so popular books are spread across ISBNs
+    book_by_rank = rng.permutation(len(isbns))
+    books = book_by_rank[zipf_positions(rng, len(isbns), n_ratings, exponent)]
+    users = rng.permutation(n_users)[zipf_positions(rng, n_users, n_ratings, exponent)] + 1
+
+    # One rating per user and book
+    pairs = np.unique(users.astype(np.int64) * len(isbns) + books)
+    users, books = pairs // len(isbns), pairs % len(isbns)
+    order = rng.permutation(len(pairs))
+    users, books = users[order], books[order]
+
+    ratings = rng.choice(np.arange(1, 11), len(pairs), p=EXPLICIT_RATING_WEIGHTS / EXPLICIT_RATING_WEIGHTS.sum())
+    ratings[rng.random(len(pairs)) < implicit_fraction] = 0
+    return pd.DataFrame({'User-ID': users, 'ISBN': isbns[books], 'Book-Rating': ratings})
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Books.csv and Ratings.csv")
+    parser.add_argument('--books', type=int, default=10000, help="number of books (10k to 1M)")
+    parser.add_argument('--ratings-per-book', type=float, default=4.2, help="ratings drawn per book, before removing duplicate pairs")
+    parser.add_argument('--users-per-book', type=float, default=0.4)
+    parser.add_argument('--exponent', type=float, default=1.0, help="power-law exponent of popularity and activity")
+    parser.add_argument('--implicit-fraction', type=float, default=0.62, help="share of 0 (implicit) ratings")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', required=True, help="directory for Books.csv, Ratings.csv and dataset.json")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    os.makedirs(args.output, exist_ok=True)
+
+    books = generate_books(rng, args.books, args.exponent)
+    n_users = max(1, int(args.books * args.users_per_book))
+    ratings = generate_ratings(
+        rng, books['ISBN'].values, int(args.books * args.ratings_per_book), n_users,
+        args.exponent, args.implicit_fraction
+    )
+
+    books.to_csv(os.path.join(args.output, 'Books.csv'), index=False)
+    ratings.to_csv(os.path.join(args.output, 'Ratings.csv'), index=False)
+
+    dataset = {
+        'name': os.path.basename(os.path.normpath(args.output)),
+        'books': len(books),
+        'ratings': len(ratings),
+        'users': int(ratings['User-ID'].nunique()),
+        'explicit_ratings': int((ratings['Book-Rating'] > 0).sum()),
+        'parameters': vars(args)
+    }
+    with open(os.path.join(args.output, 'dataset.json'), 'w', encoding='utf-8') as output:
+        json.dump(dataset, output, indent=2)
+    print(f"Wrote {dataset['books']} books and {dataset['ratings']} ratings from {dataset['users']} users to {args.output}")
+
+if __name__ == '__main__':
+    main()
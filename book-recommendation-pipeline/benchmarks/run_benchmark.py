@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import resource
+import argparse
+import platform
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'glue'))
+
+from recommender.instrumentation import start_run, stage, record_rows
+from recommender.pipeline import TOP_N_SIMILAR
+from recommender.similarity import dense_cosine_blocks, dense_top_n, user_item_matrix, cooccurrence_blocks, sparse_top_n
+
+# Runs the recommender pipeline stage by stage on generated datasets and records wall
+# time, peak resident memory and output size per stage, then compares the results with
+# a stored baseline from the same machine.
+#
+#   python run_benchmark.py --data data/books-10000 --data data/books-100000 --backend spark
+#   python run_benchmark.py ... --save-baseline   (store this run as the baseline)
+#
+# Spark runs on local[*]. Each stage's DataFrames are cached and counted before the
+# stage ends, so lazily evaluated work is charged to the stage that defines it. Stages
+# are recorded with recommender.instrumentation, sampling the resident memory of the
+# process tree; similarity blocks and top-N selection interleave, so each stage is
+# charged its self_seconds, summed over its records.
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ALS_STAGES = ['ingest', 'filter', 'index', 'als_fit', 'similarity', 'top_n']
+COOCCURRENCE_STAGES = ['ingest', 'filter', 'index', 'interactions', 'similarity', 'top_n']
+
+# A stage regresses when it is slower or larger than the baseline by more than the
+# tolerance and by more than these absolute amounts, so timer noise on short stages
+# is not reported
+DEFAULT_TOLERANCE = 0.25
+MIN_SECONDS_CHANGE = 0.5
+MIN_MEMORY_CHANGE_MB = 64
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def process_tree_rss():
+    """
+    Resident memory in bytes of this process and its descendants (the local Spark JVM),
+    read from /proc. Without /proc, the peak resident memory of this process is used.
+    """
+    if not os.path.isdir('/proc'):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    children, rss = {}, {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat_file:
+                fields = stat_file.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        pid = int(entry)
+        children.setdefault(int(fields[1]), []).append(pid)
+        rss[pid] = int(fields[21]) * PAGE_SIZE
+
+    total, pending = 0, [os.getpid()]
+    while pending:
+        pid = pending.pop()
+        total += rss.get(pid, 0)
+        pending.extend(children.get(pid, []))
+    return total
+
+def output_size(value):
+    """(rows, bytes) of a stage output; Spark DataFrames are cached and counted, their bytes are not known"""
+    if hasattr(value, 'rdd'):
+        value.cache()
+        return value.count(), 0
+    if hasattr(value, 'memory_usage'):
+        return len(value), int(value.memory_usage(deep=True).sum())
+    if hasattr(value, 'nbytes'):
+        return value.shape[0], value.nbytes
+    return len(value), 0
+
+def record_outputs(record, outputs):
+    """Record the rows and bytes of named stage outputs on the current stage"""
+    for name, value in outputs.items():
+        rows, size = output_size(value)
+        record_rows(name, rows)
+        record['output_bytes'] = record.get('output_bytes', 0) + size
+
+def timed_blocks(name, blocks):
+    """Iterate blocks, charging the work of producing each block to a record of the named stage"""
+    iterator = iter(blocks)
+    while True:
+        with stage(name) as record:
+            try:
+                start, block = next(iterator)
+            except StopIteration:
+                return
+            sparse = hasattr(block, 'nnz')
+            record_rows('scores', block.nnz if sparse else block.size)
+            record['output_bytes'] = block.data.nbytes if sparse else block.nbytes
+        yield start, block
+
+def similarity_bytes(similarity_list):
+    """Approximate stored size of packed similarity items: ISBN strings, 16-bit scores or binary lists"""
+    total = 0
+    for item in similarity_list:
+        total += len(item[0])
+        if len(item) == 3:
+            total += len(item[2])
+        else:
+            total += sum(len(isbn) for isbn in item[2]) + 2 * len(item[3])
+    return total
+
+def run_pipeline(backend, source, engine, metric):
+    """Run the pipeline stages on one dataset"""
+    with stage('ingest') as record:
+        prepared = backend.load_data(*source)
+        record_outputs(record, {'books': prepared['books'], 'ratings': prepared['ratings']})
+
+    with stage('filter') as record:
+        backend.filter_ratings(prepared)
+        record_outputs(record, {'ratings_filtered': prepared['ratings_filtered']})
+
+    with stage('index') as record:
+        backend.index_books(prepared)
+        record_outputs(record, {'books': prepared['book_mapping_pd']})
+
+    if engine == 'cooccurrence':
+        with stage('interactions') as record:
+            item_isbns = list(dict.fromkeys(prepared['book_mapping_pd']['ISBN']))
+            interactions_pd = backend.interactions(prepared)
+            record_outputs(record, {'interactions': interactions_pd})
+        with stage('similarity'):
+            user_items = user_item_matrix(item_isbns, interactions_pd)
+        blocks = cooccurrence_blocks(user_items, metric)
+        select_top_n = sparse_top_n
+    else:
+        with stage('als_fit') as record:
+            item_isbns, features = backend.als_item_factors(prepared)
+            record_outputs(record, {'item_factors': features})
+        blocks = dense_cosine_blocks(features)
+        select_top_n = dense_top_n
+
+    with stage('top_n') as record:
+        _, similarity_list = select_top_n(item_isbns, timed_blocks('similarity', blocks), TOP_N_SIMILAR)
+        record_rows('similarity_items', len(similarity_list))
+        record['output_bytes'] = similarity_bytes(similarity_list)
+
+def stage_totals(report):
+    """Wall time of each stage without its nested stages, peak memory and output size, over its records"""
+    totals = {}
+    for record in report['stages']:
+        total = totals.setdefault(record['name'], {'seconds': 0.0, 'peak_rss_mb': 0.0, 'output_rows': 0, 'output_bytes': 0})
+        total['seconds'] += record['self_seconds']
+        total['peak_rss_mb'] = max(total['peak_rss_mb'], record.get('peak_rss_mb', 0.0))
+        total['output_rows'] += sum(record['rows'].values())
+        total['output_bytes'] += record.get('output_bytes', 0)
+    for total in totals.values():
+        total['seconds'] = round(total['seconds'], 3)
+    return totals
+
+def benchmark_dataset(args, data_dir, spark=None):
+    with open(os.path.join(data_dir, 'dataset.json'), encoding='utf-8') as dataset_file:
+        dataset = json.load(dataset_file)
+
+    if args.backend == 'spark':
+        from recommender import spark_backend as backend
+        source = (spark, os.path.abspath(data_dir))
+    else:
+        from recommender import numpy_backend as backend
+        source = (os.path.join(data_dir, 'Books.csv'), os.path.join(data_dir, 'Ratings.csv'), args.threads)
+
+    print(f"\n=== BENCHMARK {dataset['name']}: {dataset['books']} books, {dataset['ratings']} ratings ===")
+    run_report = start_run(dataset['name'], spark.sparkContext if spark is not None else None, process_tree_rss)
+    try:
+        run_pipeline(backend, source, args.engine, args.metric)
+        report = run_report.finish()
+    except BaseException:
+        run_report.finish('failed')
+        raise
+    finally:
+        if spark is not None:
+            spark.catalog.clearCache()
+
+    stages = stage_totals(report)
+    stage_order = COOCCURRENCE_STAGES if args.engine == 'cooccurrence' else ALS_STAGES
+    return {
+        'dataset': {key: dataset[key] for key in ('name', 'books', 'ratings', 'users', 'explicit_ratings')},
+        'total_seconds': report['total_seconds'],
+        'stages': {name: stages[name] for name in stage_order if name in stages}
+    }
+
+def compare(results, baseline, tolerance):
+    """Print each stage against the baseline; returns the regressions found"""
+    config_keys = ('backend', 'engine', 'metric')
+    if any(results[key] != baseline.get(key) for key in config_keys):
+        print(f"\nBaseline was recorded with a different configuration "
+              f"({', '.join(f'{key}={baseline.get(key)}' for key in config_keys)}); not comparing")
+        return []
+    if baseline.get('host') != results['host']:
+        print("\nWarning: baseline was recorded on a different host; timings may not be comparable")
+
+    baseline_runs = {run['dataset']['name']: run for run in baseline.get('runs', [])}
+    regressions = []
+    for run in results['runs']:
+        name = run['dataset']['name']
+        baseline_run = baseline_runs.get(name)
+        if not baseline_run:
+            print(f"\n{name}: not in baseline")
+            continue
+        if baseline_run['dataset'] != run['dataset']:
+            print(f"\n{name}: dataset differs from the baseline's; not comparing")
+            continue
+
+        print(f"\n{name}: {'stage':<13}{'seconds':>19}{'peak MB':>21}{'output rows':>25}")
+        for stage_name, stage in run['stages'].items():
+            base = baseline_run['stages'].get(stage_name)
+            if not base:
+                print(f"  {stage_name:<13} not in baseline")
+                continue
+            flags = []
+            if stage['seconds'] > base['seconds'] * (1 + tolerance) and stage['seconds'] - base['seconds'] > MIN_SECONDS_CHANGE:
+                flags.append('slower')
+            if stage['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance) and stage['peak_rss_mb'] - base['peak_rss_mb'] > MIN_MEMORY_CHANGE_MB:
+                flags.append('more memory')
+            if stage['output_rows'] != base['output_rows']:
+                flags.append('output changed')
+            print(f"  {stage_name:<13}{base['seconds']:>9.2f} -> {stage['seconds']:<8.2f}"
+                  f"{base['peak_rss_mb']:>9.0f} -> {stage['peak_rss_mb']:<10.0f}"
+                  f"{base['output_rows']:>11} -> {stage['output_rows']:<11}{' '.join(flags)}")
+            regressions.extend(f"{name}/{stage_name}: {flag}" for flag in flags if flag != 'output changed')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommender pipeline stages")
+    parser.add_argument('--data', action='append', required=True, help="dataset directory from generate_data.py (repeatable)")
+    parser.add_argument('--backend', choices=['spark', 'numpy'], default='spark')
+    parser.add_argument('--engine', choices=['als', 'cooccurrence'], default='als')
+    parser.add_argument('--metric', choices=['cosine', 'jaccard'], default='cosine')
+    parser.add_argument('--threads', type=int, default=None, help="ALS solver threads for the numpy backend")
+    parser.add_argument('--driver-memory', default='8g', help="Spark driver memory")
+    parser.add_argument('--output', default=None, help="results file (default: results/<timestamp>-<backend>-<engine>.json)")
+    parser.add_argument('--baseline', default=None, help="baseline file (default: baselines/<backend>-<engine>-<metric>.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed relative growth before a stage regresses")
+    args = parser.parse_args()
+
+    spark = None
+    if args.backend == 'spark':
+        from pyspark.sql import SparkSession
+        spark = SparkSession.builder.master('local[*]').appName('book-recommender-benchmark') \
+            .config('spark.driver.memory', args.driver_memory).getOrCreate()
+
+    results = {
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'backend': args.backend,
+        'engine': args.engine,
+        'metric': args.metric,
+        'host': {'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(), 'python': platform.python_version()},
+        'runs': [benchmark_dataset(args, data_dir, spark) for data_dir in args.data]
+    }
+    if spark is not None:
+        spark.stop()
+
+    output_path = args.output or os.path.join(
+        BENCHMARK_DIR, 'results', f"{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}-{args.backend}-{args.engine}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as output:
+        json.dump(results, output, indent=2)
+    print(f"\nWrote {output_path}")
+
+    baseline_path = args.baseline or os.path.join(BENCHMARK_DIR, 'baselines', f"{args.backend}-{args.engine}-{args.metric}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+        print(f"Saved baseline {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; rerun with --save-baseline to record one")
+        return 0
+
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        regressions = compare(results, json.load(baseline_file), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):\n  " + "\n  ".join(regressions))
+        return 1
+    print("\nNo regressions against the baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
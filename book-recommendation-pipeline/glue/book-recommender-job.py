@@ -1,22 +1,27 @@
 import sys
-import os
-import sklearn
-import numpy as np
+import json
+import boto3
+from datetime import datetime
 from awsglue.transforms import *
 from awsglue.utils import getResolvedOptions
 from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
 from pyspark.sql import SparkSession
-from pyspark.ml.recommendation import ALS
-from pyspark.ml.feature import StringIndexer
-from pyspark.sql.functions import when, col, count
-from sklearn.metrics.pairwise import cosine_similarity
-from pyspark.ml.evaluation import RegressionEvaluator
+from pyspark.sql.functions import col, lower, trim
+from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType, ArrayType, BinaryType, MapType
 from awsglue.dynamicframe import DynamicFrame
 
-## @params: [JOB_NAME]
-args = getResolvedOptions(sys.argv, ['JOB_NAME'])
+# Training logic lives in the recommender library (shipped with --extra-py-files),
+# which this job runs on its Spark backend
+from recommender import sanitize_version, compute_similarities, build_artifacts, build_manifest, spark_backend
+from recommender.indexes import build_search_facets, build_popular_lists
+from recommender.instrumentation import start_run, stage, record_rows
+from recommender.pipeline import TOP_N_SIMILAR
+
+## @params: [JOB_NAME], optional: [DATA_VERSION, SIMILARITY_ENCODING, SIMILARITY_ENGINE, SIMILARITY_METRIC]
+OPTIONAL_PARAMS = ['DATA_VERSION', 'SIMILARITY_ENCODING', 'SIMILARITY_ENGINE', 'SIMILARITY_METRIC']
+args = getResolvedOptions(sys.argv, ['JOB_NAME'] + [p for p in OPTIONAL_PARAMS if f'--{p}' in sys.argv])
 
 sc = SparkContext()
 glueContext = GlueContext(sc)
@@ -26,216 +31,217 @@ job.init(args['JOB_NAME'], args)
 
 S3_INPUT_PATH = "s3://book-recommender-raw-data/"
 
-# Read data from S3
-books = spark.read.csv(f"{S3_INPUT_PATH}/Books.csv", sep=',', header=True, inferSchema=True, escape='"')
-ratings = spark.read.csv(f"{S3_INPUT_PATH}/Ratings.csv", sep=',', header=True, inferSchema=True, escape='"')
-
-print("Data loaded")
-# Rename columns to remove hyphens
-ratings = ratings.withColumnRenamed("User-ID", "UserID") \
-                 .withColumnRenamed("Book-Rating", "BookRating")
-
-books = books.withColumnRenamed("Book-Title", "BookTitle") \
-             .withColumnRenamed("Book-Author", "BookAuthor") \
-             .withColumnRenamed("Year-Of-Publication", "YearOfPublication") \
-             .withColumnRenamed("Image-URL-S", "ImageURLSmall") \
-             .withColumnRenamed("Image-URL-M", "ImageURLMedium") \
-             .withColumnRenamed("Image-URL-L", "ImageURLLarge")
-
-# Explore the data
-print("\n=== DATA EXPLORATION ===")
-print("Books schema:")
-books.printSchema()
-print("\nRatings schema:")
-ratings.printSchema()
-
-print("\nSample books:")
-books.show(5, truncate=False)
-print("\nSample ratings:")
-ratings.show(5)
-
-print(f"\nTotal books: {books.count()}")
-print(f"Total ratings: {ratings.count()}")
-
-print("\n=== DATA PREPROCESSING ===")
-# Filter out ratings of 0 (implicit feedback) - keep only explicit ratings
-ratings_filtered = ratings.filter(col('BookRating') > 0)
-print(f"Ratings after filtering (BookRating > 0): {ratings_filtered.count()}")
-
-# Filter users and books with minimum ratings
-min_ratings_per_user = 5
-min_ratings_per_book = 5
-
-user_counts = ratings_filtered.groupBy('UserID').agg(count('*').alias('user_rating_count'))
-book_counts = ratings_filtered.groupBy('ISBN').agg(count('*').alias('book_rating_count'))
-
-# Join and filter with proper column selection
-ratings_filtered = ratings_filtered.alias('r') \
-    .join(user_counts.alias('uc'), col('r.UserID') == col('uc.UserID')) \
-    .filter(col('user_rating_count') >= min_ratings_per_user) \
-    .select(col('r.UserID'), col('r.ISBN'), col('r.BookRating'))
-
-ratings_filtered = ratings_filtered.alias('r') \
-    .join(book_counts.alias('bc'), col('r.ISBN') == col('bc.ISBN')) \
-    .filter(col('book_rating_count') >= min_ratings_per_book) \
-    .select(col('r.UserID'), col('r.ISBN'), col('r.BookRating'))
-
-print(f"\nRatings after quality filtering: {ratings_filtered.count()}")
-
-# Create user and item indices (ALS needs integer IDs)
-print("\n=== CREATING INDICES ===")
-
-user_indexer = StringIndexer(inputCol="UserID", outputCol="userIndex")
-book_indexer = StringIndexer(inputCol="ISBN", outputCol="bookIndex")
-
-# Fit and transform
-ratings_indexed = user_indexer.fit(ratings_filtered).transform(ratings_filtered)
-ratings_indexed = book_indexer.fit(ratings_indexed).transform(ratings_indexed)
-
-print("Sample indexed ratings:")
-ratings_indexed.select('UserID', 'userIndex', 'ISBN', 'bookIndex', 'BookRating').show(10)
-
-# Split data into training and test sets
-print("\n=== SPLITTING DATA ===")
-(training, test) = ratings_indexed.randomSplit([0.8, 0.2], seed=42)
-
-print(f"Training set: {training.count()} ratings")
-print(f"Test set: {test.count()} ratings")
-
-# Build and train the ALS model
-als = ALS(
-    maxIter=10,
-    regParam=0.1,
-    rank=10,
-    userCol="userIndex",
-    itemCol="bookIndex",
-    ratingCol="BookRating",
-    coldStartStrategy="drop",
-    nonnegative=True
+# Each run loads into its own versioned tables; the pipeline flips the
+# active-version pointer only after output verification passes
+BOOKS_TABLE_BASE = "Books"
+SIMILARITIES_TABLE_BASE = "BookSimilarities"
+FACETS_TABLE_BASE = "SearchFacets"
+LISTS_TABLE_BASE = "PopularLists"
+VERSIONED_WRITE_PERCENT = "1.0"
+
+DATA_VERSION = sanitize_version(args.get('DATA_VERSION') or datetime.utcnow().strftime('%Y%m%dT%H%M%SZ'))
+print(f"Data version: {DATA_VERSION}")
+
+dynamodb_client = boto3.client('dynamodb')
+s3_client = boto3.client('s3')
+
+# Run artifacts (manifest, indexes) live outside the raw data bucket so writing
+# them does not trigger the pipeline again
+ARTIFACTS_BUCKET = "book-recommender-artifacts"
+
+def write_artifact(name, body, content_type='application/json'):
+    """Upload a run artifact under this data version's prefix"""
+    key = f"versions/{DATA_VERSION}/{name}"
+    s3_client.put_object(Bucket=ARTIFACTS_BUCKET, Key=key, Body=body, ContentType=content_type)
+    print(f"Wrote s3://{ARTIFACTS_BUCKET}/{key}")
+    return key
+
+def create_versioned_table(base_name, key_schema, attribute_definitions):
+    """Create the on-demand table for this data version (reused if a retry already created it)"""
+    table_name = f"{base_name}-{DATA_VERSION}"
+    try:
+        dynamodb_client.create_table(
+            TableName=table_name,
+            KeySchema=key_schema,
+            AttributeDefinitions=attribute_definitions,
+            BillingMode='PAY_PER_REQUEST',
+            Tags=[{'Key': 'data_version', 'Value': DATA_VERSION}]
+        )
+        print(f"Creating table {table_name}")
+    except dynamodb_client.exceptions.ResourceInUseException:
+        print(f"Table {table_name} already exists, reusing it")
+    dynamodb_client.get_waiter('table_exists').wait(TableName=table_name)
+    return table_name
+
+# Similarity lists are packed one item per source book ("list" or "binary" encoding);
+# neighbours come from ALS item factors ("als") or sparse co-occurrence ("cooccurrence")
+SIMILARITY_ENCODING = args.get('SIMILARITY_ENCODING', 'list')
+SIMILARITY_ENGINE = args.get('SIMILARITY_ENGINE', 'als')
+SIMILARITY_METRIC = args.get('SIMILARITY_METRIC', 'cosine')
+
+def write_to_dynamodb(df, table_name, frame_name):
+    """Write a DataFrame to a versioned table at full write throughput"""
+    dyf = DynamicFrame.fromDF(df, glueContext, frame_name)
+    glueContext.write_dynamic_frame_from_options(
+        frame=dyf,
+        connection_type="dynamodb",
+        connection_options={
+            "dynamodb.output.tableName": table_name,
+            "dynamodb.throughput.write.percent": VERSIONED_WRITE_PERCENT
+        }
+    )
+
+# Per-stage timings, row counts, driver memory and Spark job metrics, written as
+# run_report.json next to the manifest
+run_report = start_run(DATA_VERSION, sc)
+
+# Load, filter and index the ratings
+prepared = spark_backend.load_and_prepare(spark, S3_INPUT_PATH)
+book_mapping_with_index = prepared['book_mapping']
+book_mapping_pd = prepared['book_mapping_pd']
+
+item_isbns, similarity_list = compute_similarities(
+    spark_backend, prepared, SIMILARITY_ENGINE, SIMILARITY_METRIC, TOP_N_SIMILAR, SIMILARITY_ENCODING
 )
 
-model = als.fit(training)
-print("Model training complete")
-print("\n=== GENERATING BOOK SIMILARITIES ===")
-
-# Get item factors (books)
-item_factors = model.itemFactors
-
-print(f"Total items with factors: {item_factors.count()}")
-
-# Get mappings
-book_mapping_with_index = ratings_indexed.select('ISBN', 'bookIndex').distinct() \
-    .join(books, 'ISBN') \
-    .select('ISBN', 'bookIndex', 'BookTitle', 'BookAuthor', 'YearOfPublication', 'Publisher', 'ImageURLSmall', 'ImageURLMedium')
-
-book_mapping_pd = book_mapping_with_index.toPandas()
-item_factors_pd = item_factors.toPandas()
-
-print("Computing book similarities...")
-
-# Prepare feature matrix
-item_features_matrix = np.vstack(item_factors_pd['features'].values)
-print(f"Item features matrix shape: {item_features_matrix.shape}")
-
-# Compute cosine similarity matrix
-print("Computing cosine similarity matrix...")
-similarity_matrix = cosine_similarity(item_features_matrix)
-print(f"Similarity matrix shape: {similarity_matrix.shape}")
-
-# Extract top 20 similar books for each book
-similarity_list = []
-top_n_similar = 20
-
-print(f"Extracting top-{top_n_similar} similar books...")
-
-for item_idx in range(len(item_factors_pd)):
-    item_id_internal = item_factors_pd.iloc[item_idx]['id']
-
-    # Get book info
-    book_match = book_mapping_pd[book_mapping_pd['bookIndex'] == item_id_internal]
-    if len(book_match) == 0:
-        continue
-
-    book_info = book_match.iloc[0]
-
-    # Get top N similar books excluding itself
-    similarities = similarity_matrix[item_idx]
-    similar_indices = np.argsort(similarities)[::-1][1:top_n_similar+1]
-
-    for rank, similar_idx in enumerate(similar_indices, 1):
-        similar_item_id = item_factors_pd.iloc[similar_idx]['id']
-        similarity_score = similarities[similar_idx]
-
-        # Get similar book info
-        similar_book_match = book_mapping_pd[book_mapping_pd['bookIndex'] == similar_item_id]
-        if len(similar_book_match) == 0:
-            continue
-
-        similar_book = similar_book_match.iloc[0]
-
-        similarity_list.append({
-            'isbn': book_info['ISBN'],
-            'title': book_info['BookTitle'],
-            'author': book_info['BookAuthor'],
-            'similar_isbn': similar_book['ISBN'],
-            'similar_title': similar_book['BookTitle'],
-            'similar_author': similar_book['BookAuthor'],
-            'similarity_score': float(similarity_score),
-            'rank': rank
-        })
-
-    if (item_idx + 1) % 1000 == 0:
-        print(f"Progress: {item_idx + 1}/{len(item_factors_pd)} books")
-
 # Convert to Spark DataFrame
-similarities_df = spark.createDataFrame(similarity_list)
-
-print(f"Generated {similarities_df.count()} similarity records")
-
-print("\nSample similarities:")
-similarities_df.show(10)
-
-
-#Write book metadata to DynamoDB
-book_metadata_for_ddb = book_mapping_with_index.select(
-    col('ISBN').alias('isbn'),
-    col('BookTitle').alias('title'),
-    col('BookAuthor').alias('author'),
-    col('YearOfPublication').alias('year'),
-    col('Publisher').alias('publisher'),
-    col('ImageURLSmall').alias('image_url_small'),
-    col('ImageURLMedium').alias('image_url_medium')
-)
-
-book_metadata_dyf = DynamicFrame.fromDF(book_metadata_for_ddb, glueContext, "book_metadata_dyf")
-
-glueContext.write_dynamic_frame_from_options(
-    frame=book_metadata_dyf,
-    connection_type="dynamodb",
-    connection_options={
-        "dynamodb.output.tableName": "Books",
-        "dynamodb.throughput.write.percent": "0.2"
-    }
-)
-
-
-print("Book metadata written to DynamoDB successfully!")
-
-# Write book similarities to DynamoDB
+print(f"Generated {len(similarity_list)} packed similarity items ({SIMILARITY_ENCODING} encoding)")
+if SIMILARITY_ENCODING == 'binary':
+    similarities_schema = StructType([
+        StructField('isbn', StringType(), False),
+        StructField('neighbour_count', IntegerType(), False),
+        StructField('neighbours', BinaryType(), False)
+    ])
+else:
+    similarities_schema = StructType([
+        StructField('isbn', StringType(), False),
+        StructField('neighbour_count', IntegerType(), False),
+        StructField('similar_isbns', ArrayType(StringType()), False),
+        StructField('scores', ArrayType(IntegerType()), False)
+    ])
+similarities_df = spark.createDataFrame(similarity_list, schema=similarities_schema)
+
+# Write book metadata to this version's Books table
+with stage('write_books'):
+    books_table_name = create_versioned_table(
+        BOOKS_TABLE_BASE,
+        key_schema=[{'AttributeName': 'isbn', 'KeyType': 'HASH'}],
+        attribute_definitions=[{'AttributeName': 'isbn', 'AttributeType': 'S'}]
+    )
+
+    book_metadata_for_ddb = book_mapping_with_index.select(
+        col('ISBN').alias('isbn'),
+        col('BookTitle').alias('title'),
+        lower(trim(col('BookTitle'))).alias('title_normalized'),
+        col('BookAuthor').alias('author'),
+        col('YearOfPublication').alias('year_of_publication'),
+        col('Publisher').alias('publisher'),
+        col('ImageURLSmall').alias('image_url_small'),
+        col('ImageURLMedium').alias('image_url_medium'),
+        col('book_rating_count').alias('rating_count'),
+        col('book_rating_sum').cast('long').alias('rating_sum')
+    )
+
+    write_to_dynamodb(book_metadata_for_ddb, books_table_name, "book_metadata_dyf")
+    record_rows('items', len(book_mapping_pd))
+
+print(f"Book metadata written to {books_table_name} successfully!")
+
+# Write book similarities to this version's BookSimilarities table
 print("\nWriting book similarities to DynamoDB...")
 
-similarities_dyf = DynamicFrame.fromDF(similarities_df, glueContext, "similarities_dyf")
-
-glueContext.write_dynamic_frame_from_options(
-    frame=similarities_dyf,
-    connection_type="dynamodb",
-    connection_options={
-        "dynamodb.output.tableName": "BookSimilarities", 
-        "dynamodb.throughput.write.percent": "0.2"
-    }
+with stage('write_similarities'):
+    similarities_table_name = create_versioned_table(
+        SIMILARITIES_TABLE_BASE,
+        key_schema=[{'AttributeName': 'isbn', 'KeyType': 'HASH'}],
+        attribute_definitions=[{'AttributeName': 'isbn', 'AttributeType': 'S'}]
+    )
+    write_to_dynamodb(similarities_df, similarities_table_name, "similarities_dyf")
+    record_rows('items', len(similarity_list))
+
+print(f"Book similarities written to {similarities_table_name} successfully!")
+
+# Write author and publisher search facets to this version's SearchFacets table
+print("\nBuilding search facets...")
+with stage('facets'):
+    facet_items = build_search_facets(book_mapping_pd)
+    record_rows('terms', len(facet_items))
+
+facets_schema = StructType([
+    StructField('term', StringType(), False),
+    StructField('label', StringType(), False),
+    StructField('match_count', IntegerType(), False),
+    StructField('isbns', ArrayType(StringType()), False),
+    StructField('facets', MapType(StringType(), MapType(StringType(), IntegerType())), False)
+])
+
+with stage('write_facets'):
+    facets_table_name = create_versioned_table(
+        FACETS_TABLE_BASE,
+        key_schema=[{'AttributeName': 'term', 'KeyType': 'HASH'}],
+        attribute_definitions=[{'AttributeName': 'term', 'AttributeType': 'S'}]
+    )
+    facets_df = spark.createDataFrame(facet_items, schema=facets_schema)
+    write_to_dynamodb(facets_df, facets_table_name, "facets_dyf")
+    record_rows('items', len(facet_items))
+
+print(f"{len(facet_items)} search facet terms written to {facets_table_name} successfully!")
+
+# Write the most rated and top rated lists the recommendations handler falls back on
+print("\nBuilding popular lists...")
+with stage('popular_lists'):
+    list_items = build_popular_lists(book_mapping_pd)
+    record_rows('lists', len(list_items))
+
+lists_schema = StructType([
+    StructField('list_id', StringType(), False),
+    StructField('label', StringType(), False),
+    StructField('metric', StringType(), False),
+    StructField('prior_mean', DoubleType(), False),
+    StructField('prior_ratings', IntegerType(), False),
+    StructField('books', ArrayType(StructType([
+        StructField('isbn', StringType(), False),
+        StructField('title', StringType(), False),
+        StructField('author', StringType(), True),
+        StructField('rating_count', IntegerType(), False),
+        StructField('average_rating', DoubleType(), False)
+    ])), False)
+])
+
+with stage('write_lists'):
+    lists_table_name = create_versioned_table(
+        LISTS_TABLE_BASE,
+        key_schema=[{'AttributeName': 'list_id', 'KeyType': 'HASH'}],
+        attribute_definitions=[{'AttributeName': 'list_id', 'AttributeType': 'S'}]
+    )
+    lists_df = spark.createDataFrame(list_items, schema=lists_schema)
+    write_to_dynamodb(lists_df, lists_table_name, "lists_dyf")
+    record_rows('items', len(list_items))
+
+print(f"{len(list_items)} popular lists written to {lists_table_name} successfully!")
+
+# Manifest for output verification: expected counts and the ISBNs that have neighbour lists
+table_names = {
+    'books': books_table_name,
+    'similarities': similarities_table_name,
+    'facets': facets_table_name,
+    'lists': lists_table_name
+}
+manifest = build_manifest(
+    DATA_VERSION, table_names, len(book_mapping_pd), item_isbns, len(similarity_list),
+    len(facet_items), len(list_items), SIMILARITY_ENGINE, SIMILARITY_ENCODING
 )
+write_artifact('manifest.json', json.dumps(manifest))
+
+# Title suggestion index, catalog snapshot and trigram index for the backend handlers;
+# each is built in its own stage, so they are uploaded after building
+artifacts = list(build_artifacts(book_mapping_pd))
+with stage('upload_artifacts'):
+    for name, body, content_type in artifacts:
+        write_artifact(name, body, content_type)
+    record_rows('artifacts', len(artifacts))
 
-print("Book similarities written to DynamoDB successfully!")
+write_artifact('run_report.json', json.dumps(run_report.finish()))
 
 print("\n=== PROCESSING COMPLETE ===")
 
@@ -0,0 +1,22 @@
+"""
+Book recommender training library shared by the Glue job and local runs.
+
+The pipeline is: load and filter ratings, index books, compute each book's top-N
+neighbours (ALS item factors + cosine, or sparse co-occurrence), then build the
+table records and artifacts the backend serves. Loading and ALS training have two
+interchangeable backends: `spark_backend` for the Glue job and `numpy_backend` for
+a single machine. Both return the same prepared data, and everything downstream is
+shared, so both produce the same output format from the same filtering rules.
+"""
+from .encoding import sanitize_version, quantize_score, pack_neighbours, similarity_item
+from .pipeline import compute_similarities, build_artifacts, build_manifest
+
+__all__ = [
+    'sanitize_version',
+    'quantize_score',
+    'pack_neighbours',
+    'similarity_item',
+    'compute_similarities',
+    'build_artifacts',
+    'build_manifest'
+]
@@ -0,0 +1,31 @@
+import re
+import struct
+
+# Similarity lists are stored as one item per source book: neighbour ISBNs plus
+# scores quantized to uint16 ("list" encoding), or both packed into a single
+# binary attribute ("binary" encoding)
+PACKED_FORMAT_VERSION = 1
+SCORE_SCALE = 65535
+
+def sanitize_version(version):
+    """Restrict a data version to characters allowed in DynamoDB table names"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '-', version)[:200]
+
+def quantize_score(score):
+    """Map a cosine similarity in [-1, 1] onto an unsigned 16-bit integer"""
+    score = min(max(float(score), -1.0), 1.0)
+    return int(round((score + 1.0) / 2.0 * SCORE_SCALE))
+
+def pack_neighbours(isbns, scores):
+    """Pack neighbours as: version byte, then per neighbour a length-prefixed ISBN and a big-endian uint16 score"""
+    packed = bytearray([PACKED_FORMAT_VERSION])
+    for isbn, score in zip(isbns, scores):
+        encoded = isbn.encode('utf-8')
+        packed += struct.pack('>B', len(encoded)) + encoded + struct.pack('>H', score)
+    return bytes(packed)
+
+def similarity_item(isbn, similar_isbns, scores, encoding='list'):
+    """One packed similarity record in the given encoding"""
+    if encoding == 'binary':
+        return (isbn, len(similar_isbns), pack_neighbours(similar_isbns, scores))
+    return (isbn, len(similar_isbns), similar_isbns, scores)
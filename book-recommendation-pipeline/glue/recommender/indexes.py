@@ -0,0 +1,262 @@
+import re
+import sys
+import json
+import zlib
+import base64
+import struct
+from array import array
+from collections import defaultdict
+
+# Books table records and the serving artifacts built from them. Every builder
+# takes the book mapping DataFrame (ISBN, BookTitle, BookAuthor, YearOfPublication,
+# Publisher, ImageURLSmall, ImageURLMedium, book_rating_count, book_rating_sum) of
+# either backend.
+
+def text_value(value):
+    """A text field, or None where the CSV cell was empty"""
+    return value if isinstance(value, str) else None
+
+def book_record(row):
+    """The Books table item for one row of the book mapping"""
+    title = str(row.BookTitle)
+    return {
+        'isbn': row.ISBN,
+        'title': title,
+        'title_normalized': title.strip(' ').lower(),
+        'author': text_value(row.BookAuthor),
+        'year_of_publication': json_year(row.YearOfPublication),
+        'publisher': text_value(row.Publisher),
+        'image_url_small': text_value(row.ImageURLSmall),
+        'image_url_medium': text_value(row.ImageURLMedium),
+        'rating_count': int(row.book_rating_count),
+        'rating_sum': int(row.book_rating_sum)
+    }
+
+# Suggestions match a typed prefix against the start of the title or of any of
+# its first few words, so "potter" finds "Harry Potter and the ..."
+MAX_SUGGEST_SUFFIX_WORDS = 8
+
+def normalize_title(title):
+    """Lowercase a title and reduce it to space-separated word characters"""
+    return ' '.join(re.findall(r'\w+', str(title).lower()))
+
+def build_title_index(book_mapping_pd):
+    """
+    Build the sorted word-suffix keys of every title, each pointing back at its book, plus the
+    key positions ordered by the book's rating count (most rated first, ties in key order) so a
+    short prefix matching a large share of the keys can be served without ranking its whole range
+    """
+    books = []
+    entries = []
+    for row in book_mapping_pd.itertuples(index=False):
+        normalized = normalize_title(row.BookTitle)
+        if not normalized:
+            continue
+        book_id = len(books)
+        books.append([row.ISBN, row.BookTitle, text_value(row.BookAuthor) or '', int(row.book_rating_count)])
+        words = normalized.split(' ')
+        for start in range(min(len(words), MAX_SUGGEST_SUFFIX_WORDS)):
+            entries.append((' '.join(words[start:]), book_id))
+    entries.sort()
+    refs = [book_id for _, book_id in entries]
+    return {
+        'books': books,
+        'keys': [key for key, _ in entries],
+        'refs': refs,
+        'by_rating_count': sorted(range(len(refs)), key=lambda position: -books[refs[position]][3])
+    }
+
+def title_trigrams(normalized):
+    """Character trigrams of each word, padded with two leading spaces and one trailing space"""
+    trigrams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        for start in range(len(padded) - 2):
+            trigrams.add(padded[start:start + 3])
+    return trigrams
+
+def json_year(year):
+    """Year of publication as an int where it parses, else as the raw string"""
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return str(year)
+
+def build_trigram_index(book_mapping_pd):
+    """Build trigram posting lists (ascending book ids, little-endian uint32, base64) over normalized titles"""
+    books = []
+    postings = defaultdict(list)
+    for row in book_mapping_pd.itertuples(index=False):
+        normalized = normalize_title(row.BookTitle)
+        if not normalized:
+            continue
+        book_id = len(books)
+        books.append([
+            row.ISBN, row.BookTitle, text_value(row.BookAuthor), json_year(row.YearOfPublication),
+            text_value(row.Publisher), int(row.book_rating_count)
+        ])
+        for trigram in title_trigrams(normalized):
+            postings[trigram].append(book_id)
+
+    encoded_postings = {}
+    for trigram, book_ids in postings.items():
+        book_ids = array('I', book_ids)
+        if sys.byteorder != 'little':
+            book_ids.byteswap()
+        encoded_postings[trigram] = base64.b64encode(book_ids.tobytes()).decode('ascii')
+    return {'books': books, 'postings': encoded_postings}
+
+# Catalog snapshot served from Lambda containers' /tmp: ISBN, normalized title and
+# JSON detail columns sorted by ISBN, each addressed through a uint32 offsets array,
+# plus an open-addressing hash index (crc32, linear probing) from ISBN to position
+CATALOG_FORMAT = b'BRCAT001'
+CATALOG_HEADER = struct.Struct('<8sII7Q')
+
+def uint32_array(values):
+    """Little-endian uint32 bytes for a list of ints"""
+    values = array('I', values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+def column_with_offsets(values):
+    """Concatenate byte strings into one column and the offsets delimiting each value"""
+    offsets = [0]
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+    return b''.join(values), uint32_array(offsets)
+
+def build_catalog_snapshot(book_mapping_pd):
+    """Build the catalog snapshot file for the books written to this version's Books table"""
+    records = []
+    for row in book_mapping_pd.itertuples(index=False):
+        details = book_record(row)
+        # Titles are newline-terminated so a substring search over the column cannot match across two titles
+        title_normalized = re.sub(r'\s', ' ', details.pop('title_normalized'))
+        records.append((
+            row.ISBN.encode('utf-8'),
+            title_normalized.encode('utf-8') + b'\n',
+            json.dumps(details, separators=(',', ':')).encode('utf-8')
+        ))
+    records.sort(key=lambda record: record[0])
+
+    slot_count = 1
+    while slot_count < 2 * len(records):
+        slot_count *= 2
+    slots = [0] * slot_count
+    for position, (isbn, _, _) in enumerate(records):
+        slot = zlib.crc32(isbn) & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = position + 1
+
+    sections = []
+    for column in range(3):
+        values, offsets = column_with_offsets([record[column] for record in records])
+        sections += [offsets, values]
+    sections.append(uint32_array(slots))
+
+    section_offsets = []
+    position = CATALOG_HEADER.size
+    for section in sections:
+        section_offsets.append(position)
+        position += len(section)
+    header = CATALOG_HEADER.pack(CATALOG_FORMAT, len(records), slot_count, *section_offsets)
+    return header + b''.join(sections)
+
+# Author and publisher searches read one precomputed item per term: the most
+# rated matching ISBNs plus facet counts over every matching book
+MAX_FACET_RESULTS = 500
+MAX_FACET_VALUES = 20
+
+def publication_decade(year):
+    """Decade label such as "1990s", or "unknown" for missing and placeholder years"""
+    year = json_year(year)
+    if not isinstance(year, int) or year <= 0:
+        return "unknown"
+    return f"{year // 10 * 10}s"
+
+def build_search_facets(book_mapping_pd):
+    """Build one facets item per normalized author and publisher term"""
+    terms = defaultdict(list)
+    for row in book_mapping_pd.itertuples(index=False):
+        author = row.BookAuthor if isinstance(row.BookAuthor, str) else "unknown"
+        publisher = row.Publisher if isinstance(row.Publisher, str) else "unknown"
+        book = (int(row.book_rating_count), row.ISBN, author, publisher, publication_decade(row.YearOfPublication))
+        for field, value in (('author', row.BookAuthor), ('publisher', row.Publisher)):
+            normalized = normalize_title(value) if isinstance(value, str) else ''
+            if normalized:
+                terms[f"{field}:{normalized}"].append(book)
+
+    facet_items = []
+    for term, matches in terms.items():
+        matches.sort(key=lambda book: (-book[0], book[1]))
+        field = term.split(':', 1)[0]
+        facets = {}
+        for facet, position in (('author', 2), ('publisher', 3), ('decade', 4)):
+            counts = defaultdict(int)
+            for book in matches:
+                counts[book[position]] += 1
+            top_values = sorted(counts.items(), key=lambda value: (-value[1], value[0]))[:MAX_FACET_VALUES]
+            facets[facet] = dict(top_values)
+        # Display the most common spelling of the term
+        label = next(iter(facets[field]))
+        facet_items.append((term, label, len(matches), [book[1] for book in matches[:MAX_FACET_RESULTS]], facets))
+    return facet_items
+
+# Cold-start fallback lists for the recommendations handler: the most rated books and
+# the best rated by Bayesian average, overall and per decade and publisher. Scopes
+# with fewer books than MIN_LIST_BOOKS get no list of their own. Each list carries
+# its prior so the backend can rerank books as new ratings arrive.
+MAX_LIST_BOOKS = 50
+MIN_LIST_BOOKS = 5
+# A book's average is shrunk towards the catalog mean as if it had this many extra
+# ratings at the mean, so books with a handful of 10s do not top the lists
+BAYESIAN_PRIOR_RATINGS = 10
+
+def bayesian_average(rating_sum, rating_count, prior_mean, prior_ratings=BAYESIAN_PRIOR_RATINGS):
+    """Mean rating shrunk towards prior_mean by prior_ratings virtual ratings"""
+    return (prior_mean * prior_ratings + rating_sum) / (prior_ratings + rating_count)
+
+def build_popular_lists(book_mapping_pd):
+    """
+    Build the most rated and top rated lists overall, per decade and per publisher, as
+    (list_id, label, metric, prior_mean, prior_ratings, books) tuples
+    """
+    rating_count = int(book_mapping_pd['book_rating_count'].sum())
+    prior_mean = float(book_mapping_pd['book_rating_sum'].sum()) / rating_count if rating_count else 0.0
+
+    scopes = defaultdict(list)
+    spellings = defaultdict(lambda: defaultdict(int))
+    for row in book_mapping_pd.itertuples(index=False):
+        count = int(row.book_rating_count)
+        book = {
+            'isbn': row.ISBN,
+            'title': str(row.BookTitle),
+            'author': text_value(row.BookAuthor),
+            'rating_count': count,
+            'average_rating': round(bayesian_average(float(row.book_rating_sum), count, prior_mean), 3)
+        }
+        scopes['all'].append(book)
+        spellings['all']['All books'] += 1
+        decade = publication_decade(row.YearOfPublication)
+        if decade != "unknown":
+            scopes[f"decade:{decade}"].append(book)
+            spellings[f"decade:{decade}"][decade] += 1
+        publisher = normalize_title(row.Publisher) if isinstance(row.Publisher, str) else ''
+        if publisher:
+            scopes[f"publisher:{publisher}"].append(book)
+            spellings[f"publisher:{publisher}"][row.Publisher] += 1
+
+    list_items = []
+    for scope, books in scopes.items():
+        if scope != 'all' and len(books) < MIN_LIST_BOOKS:
+            continue
+        # Display the most common spelling of the scope
+        label = min(spellings[scope].items(), key=lambda spelling: (-spelling[1], spelling[0]))[0]
+        most_rated = sorted(books, key=lambda book: (-book['rating_count'], book['isbn']))
+        top_rated = sorted(books, key=lambda book: (-book['average_rating'], -book['rating_count'], book['isbn']))
+        prior = (round(prior_mean, 6), BAYESIAN_PRIOR_RATINGS)
+        list_items.append((f"popular:{scope}", label, 'rating_count', *prior, most_rated[:MAX_LIST_BOOKS]))
+        list_items.append((f"top_rated:{scope}", label, 'bayesian_average', *prior, top_rated[:MAX_LIST_BOOKS]))
+    return list_items
@@ -0,0 +1,182 @@
+import sys
+import time
+import resource
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+# Lightweight stage instrumentation for training runs. A run report times named stages,
+# tags each stage's Spark jobs with a job group so their job, stage and task counts can
+# be read back from the status tracker, and records driver memory at the end of each
+# stage. Code inside a stage adds row counts it already has with record_rows(); nothing
+# here triggers a Spark action. Outside a run (benchmarks, library use), stage() and
+# record_rows() do nothing. Stages may nest and repeat; each record's seconds include its
+# nested stages and self_seconds exclude them. With a memory sampler (a callable returning
+# bytes, e.g. the resident memory of the process tree), each record also gets the peak
+# sampled while it was open.
+#
+#   report = start_run(data_version, spark.sparkContext)
+#   with stage('filter'):
+#       ...
+#       record_rows('ratings', len(ratings))
+#   json.dumps(report.finish())
+
+MEMORY_SAMPLE_SECONDS = 0.1
+
+_active_report = None
+
+def python_peak_rss_mb():
+    """Peak resident memory of this (driver) Python process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+def jvm_heap_mb(spark_context):
+    """(used, max) heap of the Spark driver JVM in MB, or None when it cannot be read"""
+    try:
+        runtime = spark_context._jvm.java.lang.Runtime.getRuntime()
+        return round((runtime.totalMemory() - runtime.freeMemory()) / 2 ** 20, 1), round(runtime.maxMemory() / 2 ** 20, 1)
+    except Exception:
+        return None
+
+def spark_job_metrics(spark_context, job_group):
+    """Job, stage and task counts of a job group from the Spark status tracker"""
+    tracker = spark_context.statusTracker()
+    metrics = {'jobs': 0, 'failed_jobs': 0, 'stages': 0, 'tasks': 0, 'failed_tasks': 0}
+    for job_id in tracker.getJobIdsForGroup(job_group):
+        job = tracker.getJobInfo(job_id)
+        if job is None:
+            continue
+        metrics['jobs'] += 1
+        metrics['failed_jobs'] += job.status == 'FAILED'
+        for stage_id in job.stageIds:
+            spark_stage = tracker.getStageInfo(stage_id)
+            if spark_stage is None:
+                continue
+            metrics['stages'] += 1
+            metrics['tasks'] += spark_stage.numTasks
+            metrics['failed_tasks'] += spark_stage.numFailedTasks
+    return metrics
+
+class RunReport:
+    """Per-stage wall time, row counts, driver memory and Spark job metrics of one training run"""
+
+    def __init__(self, data_version, spark_context=None, memory_sampler=None):
+        self.data_version = data_version
+        self.spark_context = spark_context
+        self.started_at = datetime.utcnow()
+        self.stages = []
+        self._started = time.perf_counter()
+        self._open = []
+        self._nested_seconds = []
+        self._memory_sampler = memory_sampler
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+        if memory_sampler is not None:
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+            self._sampler.start()
+
+    def _sample_memory(self):
+        """Raise the sampled peak of every open stage to the sampler's current reading"""
+        if self._memory_sampler is None:
+            return
+        memory_mb = round(self._memory_sampler() / 2 ** 20, 1)
+        with self._lock:
+            for record in self._open:
+                record['peak_rss_mb'] = max(record.get('peak_rss_mb', 0.0), memory_mb)
+
+    def _sample_loop(self):
+        while not self._stopped.wait(MEMORY_SAMPLE_SECONDS):
+            self._sample_memory()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage. Stages may nest; a nested stage's Spark jobs count only towards it."""
+        record = {'name': name, 'status': 'running', 'rows': {}}
+        with self._lock:
+            self.stages.append(record)
+            self._open.append(record)
+            self._nested_seconds.append(0.0)
+        self._sample_memory()
+        job_group = f"{self.data_version}/{name}"
+        if self.spark_context is not None:
+            self.spark_context.setJobGroup(job_group, f"Training stage {name}")
+        started = time.perf_counter()
+        try:
+            yield record
+            record['status'] = 'succeeded'
+        except BaseException:
+            record['status'] = 'failed'
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            self._sample_memory()
+            with self._lock:
+                self._open.pop()
+                nested_seconds = self._nested_seconds.pop()
+                if self._nested_seconds:
+                    self._nested_seconds[-1] += seconds
+            record['seconds'] = round(seconds, 3)
+            record['self_seconds'] = round(seconds - nested_seconds, 3)
+            record['python_peak_rss_mb'] = python_peak_rss_mb()
+            if self.spark_context is not None:
+                heap = jvm_heap_mb(self.spark_context)
+                if heap:
+                    record['jvm_heap_used_mb'] = heap[0]
+                record['spark'] = spark_job_metrics(self.spark_context, job_group)
+                # Jobs after this stage belong to the enclosing stage, if any
+                if self._open:
+                    self.spark_context.setJobGroup(f"{self.data_version}/{self._open[-1]['name']}", f"Training stage {self._open[-1]['name']}")
+                else:
+                    self.spark_context.setLocalProperty('spark.jobGroup.id', None)
+                    self.spark_context.setLocalProperty('spark.job.description', None)
+            print(f"Stage {name} {record['status']} in {record['seconds']:.1f}s")
+
+    def record_rows(self, name, count):
+        """Attach a row count to the innermost open stage"""
+        if self._open:
+            self._open[-1]['rows'][name] = int(count)
+
+    def finish(self, status='succeeded'):
+        """The run report as a JSON-serializable dict; ends the active run"""
+        global _active_report
+        if _active_report is self:
+            _active_report = None
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        report = {
+            'data_version': self.data_version,
+            'status': status,
+            'started_at': self.started_at.isoformat() + 'Z',
+            'finished_at': datetime.utcnow().isoformat() + 'Z',
+            'total_seconds': round(time.perf_counter() - self._started, 3),
+            'python_peak_rss_mb': python_peak_rss_mb(),
+            'stages': self.stages
+        }
+        if self.spark_context is not None:
+            heap = jvm_heap_mb(self.spark_context)
+            if heap:
+                report['jvm_max_heap_mb'] = heap[1]
+        return report
+
+def start_run(data_version, spark_context=None, memory_sampler=None):
+    """Start recording a run; stage() and record_rows() report to it until it finishes"""
+    global _active_report
+    _active_report = RunReport(data_version, spark_context, memory_sampler)
+    return _active_report
+
+@contextmanager
+def stage(name):
+    """Time a stage of the active run, if there is one"""
+    if _active_report is None:
+        yield None
+        return
+    with _active_report.stage(name) as record:
+        yield record
+
+def record_rows(name, count):
+    """Attach a row count the caller already has to the current stage of the active run"""
+    if _active_report is not None:
+        _active_report.record_rows(name, count)
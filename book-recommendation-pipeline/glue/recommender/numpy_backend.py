@@ -0,0 +1,248 @@
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+from concurrent.futures import ThreadPoolExecutor
+from .instrumentation import stage, record_rows
+from .pipeline import (
+    MIN_RATINGS_PER_USER, MIN_RATINGS_PER_BOOK, TRAINING_FRACTION, SPLIT_SEED, SPLIT_BUCKETS,
+    ALS_RANK, ALS_MAX_ITER, ALS_REG_PARAM, ALS_SEED
+)
+
+# Single-machine backend: pandas loading and filtering plus a NumPy ALS, with no
+# Spark cluster to start. It applies the same filtering rules and hyperparameters
+# as the Spark backend, in the same stages (load_data, filter_ratings, index_books,
+# each filling in the prepared data dict). Factor solves for blocks of users or
+# books run on a thread pool; NumPy's batched solver releases the GIL.
+
+# Ratings per block of least-squares solves, bounding the per-block Gram tensors
+ALS_BLOCK_RATINGS = 50000
+
+# Rows whose unconstrained solution has negative factors are re-solved under x >= 0 by
+# an active set method, which stops once no row's set of zero factors changes. A factor
+# is only freed when its gradient is below -NNLS_TOLERANCE, so rounding cannot make it
+# flip back and forth; rows still changing after NNLS_MAX_ITERATIONS go to scipy's NNLS
+NNLS_MAX_ITERATIONS = 30
+NNLS_TOLERANCE = 1e-10
+
+BOOK_COLUMNS = {
+    "Book-Title": "BookTitle",
+    "Book-Author": "BookAuthor",
+    "Year-Of-Publication": "YearOfPublication",
+    "Image-URL-S": "ImageURLSmall",
+    "Image-URL-M": "ImageURLMedium",
+    "Image-URL-L": "ImageURLLarge"
+}
+RATING_COLUMNS = {"User-ID": "UserID", "Book-Rating": "BookRating"}
+
+def load_data(books_path, ratings_path, threads=None):
+    """
+    Read Books.csv and Ratings.csv into the prepared data dict; threads sets the ALS
+    solver pool size (default: one per CPU)
+    """
+    # Empty cells become NaN, as Spark reads them as null
+    books = pd.read_csv(books_path, dtype=str, keep_default_na=False, na_values=['']).rename(columns=BOOK_COLUMNS)
+    ratings = pd.read_csv(ratings_path, dtype={'ISBN': str}).rename(columns=RATING_COLUMNS)
+    ratings['BookRating'] = pd.to_numeric(ratings['BookRating'], errors='coerce')
+    record_rows('books', len(books))
+    record_rows('ratings', len(ratings))
+    print(f"Data loaded: {len(books)} books, {len(ratings)} ratings")
+    return {'books': books, 'ratings': ratings, 'threads': threads}
+
+def filter_ratings(prepared):
+    """Keep explicit ratings of users and books with enough of them"""
+    ratings = prepared['ratings']
+    # Book counts are taken before the user filter, as in the Spark backend
+    ratings_filtered = ratings[ratings['BookRating'] > 0]
+    print(f"Ratings after filtering (BookRating > 0): {len(ratings_filtered)}")
+
+    user_counts = ratings_filtered.groupby('UserID').size()
+    # Rating sums feed the top rated lists
+    book_counts = ratings_filtered.groupby('ISBN')['BookRating'].agg(book_rating_count='size', book_rating_sum='sum')
+    ratings_filtered = ratings_filtered[ratings_filtered['UserID'].map(user_counts) >= MIN_RATINGS_PER_USER]
+    ratings_filtered = ratings_filtered[ratings_filtered['ISBN'].map(book_counts['book_rating_count']) >= MIN_RATINGS_PER_BOOK]
+    record_rows('ratings_filtered', len(ratings_filtered))
+    print(f"Ratings after quality filtering: {len(ratings_filtered)}")
+
+    prepared.update(ratings_filtered=ratings_filtered, book_counts=book_counts)
+    return prepared
+
+def index_books(prepared):
+    """Index the rated books and join them with their metadata into the book mapping"""
+    ratings_filtered = prepared['ratings_filtered']
+    # Index books by descending rating frequency, like Spark's StringIndexer
+    frequencies = ratings_filtered['ISBN'].value_counts()
+    book_isbns = sorted(frequencies.index, key=lambda isbn: (-frequencies[isbn], isbn))
+    book_index = pd.DataFrame({'ISBN': book_isbns, 'bookIndex': np.arange(len(book_isbns), dtype=float)})
+
+    book_mapping_pd = book_index \
+        .merge(prepared['books'], on='ISBN') \
+        .merge(prepared['book_counts'].reset_index(), on='ISBN')[
+            ['ISBN', 'bookIndex', 'BookTitle', 'BookAuthor', 'YearOfPublication', 'Publisher',
+             'ImageURLSmall', 'ImageURLMedium', 'book_rating_count', 'book_rating_sum']
+        ]
+
+    record_rows('books', len(book_mapping_pd))
+    prepared.update(book_isbns=book_isbns, book_mapping_pd=book_mapping_pd)
+    return prepared
+
+def load_and_prepare(books_path, ratings_path, threads=None):
+    """
+    Load Books.csv and Ratings.csv, keep explicit ratings of users and books with enough
+    of them, and index them for ALS. Returns the same book mapping (book_mapping_pd) as
+    the Spark backend.
+    """
+    with stage('ingest'):
+        prepared = load_data(books_path, ratings_path, threads)
+    with stage('filter'):
+        filter_ratings(prepared)
+    with stage('index'):
+        return index_books(prepared)
+
+def solve_factors(rows, columns, values, fixed, n_rows, executor):
+    """
+    One ALS half-step: for each row, solve the regularized nonnegative least squares problem
+    against the fixed factors of the columns it rated. Regularization is scaled by the row's
+    rating count as in Spark's ALS.
+    """
+    order = np.argsort(rows, kind='stable')
+    rows, columns, values = rows[order], columns[order], values[order]
+    boundaries = np.searchsorted(rows, np.arange(n_rows + 1))
+    counts = np.diff(boundaries)
+    factors = np.zeros((n_rows, fixed.shape[1]))
+    identity = np.eye(fixed.shape[1])
+
+    def solve_block(first_row, last_row):
+        block_counts = counts[first_row:last_row]
+        rated = np.flatnonzero(block_counts)
+        if not len(rated):
+            return
+        start, end = boundaries[first_row], boundaries[last_row]
+        fixed_rated = fixed[columns[start:end]]
+        segment_starts = boundaries[first_row:last_row][rated] - start
+        gram = np.add.reduceat(np.einsum('ij,ik->ijk', fixed_rated, fixed_rated), segment_starts)
+        gram += ALS_REG_PARAM * block_counts[rated][:, None, None] * identity
+        rhs = np.add.reduceat(fixed_rated * values[start:end, None], segment_starts)
+        solution = np.linalg.solve(gram, rhs[..., None])[..., 0]
+        negative = (solution < 0).any(axis=1)
+        if negative.any():
+            solution[negative] = nonnegative_solve(gram[negative], rhs[negative], np.maximum(solution[negative], 0.0))
+        factors[first_row + rated] = solution
+
+    # Blocks of consecutive rows holding about ALS_BLOCK_RATINGS ratings each
+    cuts = np.searchsorted(boundaries, np.arange(ALS_BLOCK_RATINGS, len(rows), ALS_BLOCK_RATINGS))
+    edges = np.unique(np.concatenate(([0], cuts, [n_rows])))
+    list(executor.map(solve_block, edges[:-1], edges[1:]))
+    return factors
+
+def nonnegative_solve(gram, rhs, start):
+    """
+    Minimize x'Gx/2 - b'x subject to x >= 0 for a stack of small positive definite systems,
+    as Spark's nonnegative ALS does. Each iteration solves every unsettled system with its
+    zero factors fixed, then frees zero factors whose gradient is negative and fixes free
+    factors that came out negative (a primal-dual active set method).
+    """
+    solution = np.maximum(start, 0.0)
+    free = start > 0
+    fixed_identity = np.eye(gram.shape[1], dtype=bool)
+    unsettled = np.arange(len(gram))
+    for iteration in range(NNLS_MAX_ITERATIONS):
+        unsettled_gram, unsettled_rhs, unsettled_free = gram[unsettled], rhs[unsettled], free[unsettled]
+        # Fixed factors get an identity row and column and a zero right-hand side
+        masked_gram = np.where(unsettled_free[:, :, None] & unsettled_free[:, None, :], unsettled_gram, fixed_identity)
+        candidate = np.linalg.solve(masked_gram, np.where(unsettled_free, unsettled_rhs, 0.0)[..., None])[..., 0]
+        gradient = np.einsum('ijk,ik->ij', unsettled_gram, candidate) - unsettled_rhs
+        next_free = np.where(unsettled_free, candidate > 0, gradient < -NNLS_TOLERANCE)
+        solution[unsettled] = np.maximum(candidate, 0.0)
+        changed = (next_free != unsettled_free).any(axis=1)
+        free[unsettled] = next_free
+        unsettled = unsettled[changed]
+        if not len(unsettled):
+            return solution
+
+    for row in unsettled:
+        # With G = LL', x'Gx/2 - b'x is |L'x - inv(L)b|^2/2 up to a constant
+        lower = np.linalg.cholesky(gram[row])
+        solution[row] = nnls(lower.T, np.linalg.solve(lower, rhs[row]))[0]
+    return solution
+
+def training_split(user_ids, isbns):
+    """Whether each rating is in the training split, by the hash the Spark backend uses"""
+    buckets = np.fromiter(
+        (zlib.crc32(f"{SPLIT_SEED}:{user_id}:{isbn}".encode('utf-8')) % SPLIT_BUCKETS for user_id, isbn in zip(user_ids, isbns)),
+        dtype=np.int64, count=len(user_ids)
+    )
+    return buckets < TRAINING_FRACTION * SPLIT_BUCKETS
+
+def rmse(ratings, user_factors, item_factors, user_positions, item_positions):
+    residuals = ratings - np.einsum('ij,ij->i', user_factors[user_positions], item_factors[item_positions])
+    return float(np.sqrt(np.mean(residuals ** 2)))
+
+def train_als(user_positions, item_positions, ratings, n_users, n_items, threads=None, seed=ALS_SEED):
+    """Explicit-feedback ALS; returns the user and item factors"""
+    rng = np.random.default_rng(seed)
+    # Random start with unit-norm Gaussian rows, as Spark initializes ALS (nonnegative or not)
+    user_factors = rng.normal(size=(n_users, ALS_RANK))
+    user_factors /= np.linalg.norm(user_factors, axis=1, keepdims=True)
+    item_factors = rng.normal(size=(n_items, ALS_RANK))
+    item_factors /= np.linalg.norm(item_factors, axis=1, keepdims=True)
+
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as executor:
+        for iteration in range(ALS_MAX_ITER):
+            # Books first, then users, in the order Spark's ALS solves them
+            item_factors = solve_factors(item_positions, user_positions, ratings, user_factors, n_items, executor)
+            user_factors = solve_factors(user_positions, item_positions, ratings, item_factors, n_users, executor)
+            training_rmse = rmse(ratings, user_factors, item_factors, user_positions, item_positions)
+            print(f"ALS iteration {iteration + 1}/{ALS_MAX_ITER}: training RMSE {training_rmse:.4f}")
+
+    return user_factors, item_factors
+
+def als_item_factors(prepared):
+    """Train ALS on explicit ratings; returns the ISBNs with book metadata and their item factors"""
+    ratings_filtered = prepared['ratings_filtered']
+    book_isbns = prepared['book_isbns']
+    book_positions = {isbn: position for position, isbn in enumerate(book_isbns)}
+
+    user_ids = ratings_filtered['UserID'].astype(str).values
+    users, user_positions = np.unique(user_ids, return_inverse=True)
+    item_positions = ratings_filtered['ISBN'].map(book_positions).values
+    ratings = ratings_filtered['BookRating'].values.astype(float)
+
+    # Split data into training and test sets
+    training = training_split(user_ids, ratings_filtered['ISBN'].values)
+    print(f"Training set: {int(training.sum())} ratings")
+    print(f"Test set: {int((~training).sum())} ratings")
+
+    user_factors, item_factors = train_als(
+        user_positions[training], item_positions[training], ratings[training],
+        len(users), len(book_isbns), prepared.get('threads'), prepared.get('als_seed', ALS_SEED)
+    )
+    print("Model training complete")
+
+    # Books only in the test split have no factors; keep books with factors and metadata
+    trained = np.bincount(item_positions[training], minlength=len(book_isbns)) > 0
+    mapped = set(prepared['book_mapping_pd']['ISBN'])
+    keep = [position for position, isbn in enumerate(book_isbns) if trained[position] and isbn in mapped]
+    print(f"Total items with factors: {int(trained.sum())}")
+
+    if prepared.get('evaluate_als'):
+        # Held-out ratings of users or books without factors are dropped, as Spark's coldStartStrategy does
+        trained_users = np.bincount(user_positions[training], minlength=len(users)) > 0
+        held_out = ~training & trained_users[user_positions] & trained[item_positions]
+        prepared['als_evaluation'] = {
+            'training_ratings': int(training.sum()),
+            'held_out_ratings': int((~training).sum()),
+            'training_rmse': rmse(ratings[training], user_factors, item_factors, user_positions[training], item_positions[training]),
+            'held_out_rmse': rmse(ratings[held_out], user_factors, item_factors, user_positions[held_out], item_positions[held_out])
+        }
+
+    return [book_isbns[position] for position in keep], item_factors[keep]
+
+def interactions(prepared):
+    """Distinct (UserID, ISBN) pairs of every rating, explicit or implicit, of the mapped books"""
+    ratings = prepared['ratings']
+    mapped = set(prepared['book_mapping_pd']['ISBN'])
+    interactions_pd = ratings[ratings['ISBN'].isin(mapped)][['UserID', 'ISBN']].drop_duplicates()
+    record_rows('interactions', len(interactions_pd))
+    return interactions_pd
@@ -0,0 +1,90 @@
+import json
+import gzip
+from .instrumentation import stage, record_rows
+from .indexes import build_title_index, build_trigram_index, build_catalog_snapshot
+from .similarity import dense_cosine_top_n, cooccurrence_top_n
+
+# Preprocessing and model settings shared by both backends, so they train on the same data
+MIN_RATINGS_PER_USER = 5
+MIN_RATINGS_PER_BOOK = 5
+TRAINING_FRACTION = 0.8
+SPLIT_SEED = 42
+# Ratings are split by the CRC-32 of "<SPLIT_SEED>:<UserID>:<ISBN>" modulo SPLIT_BUCKETS,
+# so both backends hold out the same ratings whatever their row order or partitioning
+SPLIT_BUCKETS = 1000
+ALS_RANK = 10
+# Seed of the initial factors; evaluation runs may set als_seed in the prepared data instead
+ALS_SEED = 42
+ALS_MAX_ITER = 10
+ALS_REG_PARAM = 0.1
+TOP_N_SIMILAR = 20
+
+def compute_similarities(backend, prepared, engine='als', metric='cosine', top_n=TOP_N_SIMILAR, encoding='list'):
+    """
+    Compute every book's packed top-N neighbour record with the given backend module.
+    Returns the ISBNs that have a neighbour list and the similarity records.
+    """
+    if engine == 'cooccurrence':
+        print(f"\n=== GENERATING BOOK SIMILARITIES ({metric} co-occurrence) ===")
+        item_isbns = list(dict.fromkeys(prepared['book_mapping_pd']['ISBN']))
+        with stage('interactions'):
+            interactions_pd = backend.interactions(prepared)
+        with stage('similarity'):
+            neighbour_isbns, similarity_list = cooccurrence_top_n(item_isbns, interactions_pd, top_n, metric, encoding)
+            record_rows('similarity_items', len(similarity_list))
+        return neighbour_isbns, similarity_list
+
+    with stage('als_fit'):
+        item_isbns, features = backend.als_item_factors(prepared)
+        record_rows('items_with_factors', len(item_isbns))
+    print("Computing book similarities...")
+    with stage('similarity'):
+        item_isbns, similarity_list = dense_cosine_top_n(item_isbns, features, top_n, encoding)
+        record_rows('similarity_items', len(similarity_list))
+    return item_isbns, similarity_list
+
+def build_artifacts(book_mapping_pd):
+    """Serving artifacts for a data version as (name, body, content type) tuples"""
+    # Each artifact is built in its own stage; uploading it is up to the caller
+    print("\nBuilding title suggestion index...")
+    with stage('title_index'):
+        title_index = build_title_index(book_mapping_pd)
+        title_index_body = gzip.compress(json.dumps(title_index).encode('utf-8'))
+        record_rows('keys', len(title_index['keys']))
+    print(f"Title index has {len(title_index['keys'])} keys for {len(title_index['books'])} books")
+    yield 'title_index.json.gz', title_index_body, 'application/gzip'
+
+    print("\nBuilding catalog snapshot...")
+    with stage('catalog_snapshot'):
+        catalog_snapshot = build_catalog_snapshot(book_mapping_pd)
+        record_rows('books', len(book_mapping_pd))
+    print(f"Catalog snapshot has {len(book_mapping_pd)} books in {len(catalog_snapshot)} bytes")
+    yield 'catalog.bin', catalog_snapshot, 'application/octet-stream'
+
+    print("\nBuilding title trigram index...")
+    with stage('trigram_index'):
+        trigram_index = build_trigram_index(book_mapping_pd)
+        trigram_index_body = gzip.compress(json.dumps(trigram_index).encode('utf-8'))
+        record_rows('trigrams', len(trigram_index['postings']))
+    print(f"Trigram index has {len(trigram_index['postings'])} trigrams for {len(trigram_index['books'])} books")
+    yield 'title_trigrams.json.gz', trigram_index_body, 'application/gzip'
+
+def build_manifest(data_version, table_names, book_count, item_isbns, similarity_count, facet_count, list_count, engine, encoding, top_n=TOP_N_SIMILAR):
+    """Manifest for output verification: expected counts and the ISBNs that have neighbour lists"""
+    return {
+        'data_version': data_version,
+        'books_table': table_names['books'],
+        'similarities_table': table_names['similarities'],
+        'facets_table': table_names['facets'],
+        'lists_table': table_names['lists'],
+        'books_count': book_count,
+        'similarity_items': similarity_count,
+        'facet_terms': facet_count,
+        'list_items': list_count,
+        'top_n': top_n,
+        'similarity_encoding': encoding,
+        'similarity_engine': engine,
+        # Co-occurrence lists hold only books rated together, so they can be shorter than top_n
+        'complete_lists': engine != 'cooccurrence',
+        'isbns': item_isbns
+    }
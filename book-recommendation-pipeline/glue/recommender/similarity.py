@@ -0,0 +1,125 @@
+import numpy as np
+from scipy import sparse
+from .encoding import quantize_score, similarity_item
+
+# Similarities are computed one block of source books at a time, so memory
+# follows the block size instead of the n x n similarity matrix
+SIMILARITY_BLOCK_ROWS = 1024
+MIN_COOCCURRENCE = 2
+
+def top_neighbours(columns, scores, top_n):
+    """
+    Positions into columns/scores of the top_n best scores, best first; books tied
+    at the cut are taken by column so reruns produce the same lists
+    """
+    n_neighbours = min(top_n, len(columns))
+    threshold = scores[np.argpartition(scores, -n_neighbours)[-n_neighbours:]].min()
+    candidates = np.flatnonzero(scores >= threshold)
+    return candidates[np.lexsort((columns[candidates], -scores[candidates]))][:n_neighbours]
+
+def dense_cosine_blocks(features):
+    """Yield (first row, block) cosine similarities of SIMILARITY_BLOCK_ROWS books at a time against every book"""
+    print(f"Item features matrix shape: {features.shape}")
+    norms = np.linalg.norm(features, axis=1)
+    normalized = features / np.where(norms == 0, 1.0, norms)[:, None]
+    for start in range(0, len(features), SIMILARITY_BLOCK_ROWS):
+        yield start, normalized[start:start + SIMILARITY_BLOCK_ROWS] @ normalized.T
+
+def dense_top_n(item_isbns, blocks, top_n, encoding='list'):
+    """Pack every book's top_n neighbours from dense similarity blocks"""
+    all_columns = np.arange(len(item_isbns))
+    print(f"Extracting top-{top_n} similar books...")
+    similarity_list = []
+    for start, block in blocks:
+        for row in range(block.shape[0]):
+            item_idx = start + row
+            not_self = all_columns != item_idx
+            if not not_self.any():
+                continue
+            columns, scores = all_columns[not_self], block[row][not_self]
+            best = top_neighbours(columns, scores, top_n)
+            similar_isbns = [item_isbns[column] for column in columns[best]]
+            quantized = [quantize_score(score) for score in scores[best]]
+            similarity_list.append(similarity_item(item_isbns[item_idx], similar_isbns, quantized, encoding))
+
+        print(f"Progress: {min(start + SIMILARITY_BLOCK_ROWS, len(item_isbns))}/{len(item_isbns)} books")
+
+    return item_isbns, similarity_list
+
+def dense_cosine_top_n(item_isbns, features, top_n, encoding='list'):
+    """Rank every book's neighbours by cosine similarity of its latent factors"""
+    return dense_top_n(item_isbns, dense_cosine_blocks(features), top_n, encoding)
+
+def user_item_matrix(item_isbns, interactions_pd):
+    """Sparse binary user x item matrix of (UserID, ISBN) interactions; repeated pairs count once"""
+    item_positions = {isbn: position for position, isbn in enumerate(item_isbns)}
+    interactions_pd = interactions_pd[interactions_pd['ISBN'].isin(item_positions)]
+    print(f"Interactions (explicit and implicit): {len(interactions_pd)}")
+
+    _, user_positions = np.unique(interactions_pd['UserID'].astype(str).values, return_inverse=True)
+    item_columns = interactions_pd['ISBN'].map(item_positions).values
+    user_items = sparse.csr_matrix(
+        (np.ones(len(interactions_pd), dtype=np.float32), (user_positions, item_columns)),
+        shape=(user_positions.max() + 1 if len(interactions_pd) else 0, len(item_isbns))
+    )
+    user_items.data[:] = 1.0
+    print(f"User x item matrix: {user_items.shape}, {user_items.nnz} interactions")
+    return user_items
+
+def cooccurrence_blocks(user_items, metric='cosine'):
+    """
+    Yield (first row, block) sparse item-item cosine or Jaccard similarities for
+    SIMILARITY_BLOCK_ROWS items at a time. Co-occurrence counts come from a sparse
+    product, and pairs rated together by fewer than MIN_COOCCURRENCE users are dropped.
+    """
+    item_users = user_items.T.tocsr()
+    item_user_counts = np.asarray(user_items.sum(axis=0)).ravel()
+    for start in range(0, user_items.shape[1], SIMILARITY_BLOCK_ROWS):
+        # Co-occurrence counts of this block of items with every item
+        block = (item_users[start:start + SIMILARITY_BLOCK_ROWS] @ user_items).tocsr()
+        block.data[block.data < MIN_COOCCURRENCE] = 0
+        block.eliminate_zeros()
+
+        rows = np.repeat(np.arange(start, start + block.shape[0]), np.diff(block.indptr))
+        if metric == 'jaccard':
+            block.data = block.data / (item_user_counts[rows] + item_user_counts[block.indices] - block.data)
+        else:
+            block.data = block.data / np.sqrt(item_user_counts[rows] * item_user_counts[block.indices])
+        yield start, block
+
+def sparse_top_n(item_isbns, blocks, top_n, encoding='list'):
+    """
+    Pack the top_n neighbours of every book from sparse similarity blocks. Books without
+    a neighbour get no list, so the ISBNs that have one are returned with the lists.
+    """
+    similarity_list = []
+    neighbour_isbns = []
+    for start, block in blocks:
+        for row in range(block.shape[0]):
+            item_idx = start + row
+            columns = block.indices[block.indptr[row]:block.indptr[row + 1]]
+            scores = block.data[block.indptr[row]:block.indptr[row + 1]]
+            not_self = columns != item_idx
+            columns, scores = columns[not_self], scores[not_self]
+            if not len(columns):
+                continue
+
+            best = top_neighbours(columns, scores, top_n)
+            similar_isbns = [item_isbns[column] for column in columns[best]]
+            quantized = [quantize_score(score) for score in scores[best]]
+            similarity_list.append(similarity_item(item_isbns[item_idx], similar_isbns, quantized, encoding))
+            neighbour_isbns.append(item_isbns[item_idx])
+
+        print(f"Progress: {min(start + SIMILARITY_BLOCK_ROWS, len(item_isbns))}/{len(item_isbns)} books")
+
+    return neighbour_isbns, similarity_list
+
+def cooccurrence_top_n(item_isbns, interactions_pd, top_n, metric='cosine', encoding='list'):
+    """
+    Rank neighbours by item-item cosine or Jaccard similarity of a sparse binary user x item
+    matrix built from (UserID, ISBN) interactions. Co-occurrence counts are computed one block
+    of items at a time with a sparse product and pruned to the top N per item, so memory
+    follows the number of co-rated pairs rather than n x n.
+    """
+    user_items = user_item_matrix(item_isbns, interactions_pd)
+    return sparse_top_n(item_isbns, cooccurrence_blocks(user_items, metric), top_n, encoding)
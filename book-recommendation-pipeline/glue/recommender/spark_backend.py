@@ -0,0 +1,170 @@
+from pyspark.ml.recommendation import ALS
+from pyspark.ml.feature import StringIndexer
+from pyspark.ml.evaluation import RegressionEvaluator
+from pyspark.sql.functions import col, count, crc32, concat_ws, lit, sum as spark_sum
+import numpy as np
+from .instrumentation import stage, record_rows
+from .pipeline import (
+    MIN_RATINGS_PER_USER, MIN_RATINGS_PER_BOOK, TRAINING_FRACTION, SPLIT_SEED, SPLIT_BUCKETS,
+    ALS_RANK, ALS_MAX_ITER, ALS_REG_PARAM, ALS_SEED
+)
+
+# Spark backend: distributed loading, filtering and pyspark.ml ALS, used by the Glue job.
+# Loading runs in stages (load_data, filter_ratings, index_books), each filling in the
+# prepared data dict; load_and_prepare chains them.
+
+def load_data(spark, input_path):
+    """Read Books.csv and Ratings.csv from input_path into the prepared data dict"""
+    # Read data
+    books = spark.read.csv(f"{input_path}/Books.csv", sep=',', header=True, inferSchema=True, escape='"')
+    ratings = spark.read.csv(f"{input_path}/Ratings.csv", sep=',', header=True, inferSchema=True, escape='"')
+
+    print("Data loaded")
+    # Rename columns to remove hyphens
+    ratings = ratings.withColumnRenamed("User-ID", "UserID") \
+                     .withColumnRenamed("Book-Rating", "BookRating")
+
+    books = books.withColumnRenamed("Book-Title", "BookTitle") \
+                 .withColumnRenamed("Book-Author", "BookAuthor") \
+                 .withColumnRenamed("Year-Of-Publication", "YearOfPublication") \
+                 .withColumnRenamed("Image-URL-S", "ImageURLSmall") \
+                 .withColumnRenamed("Image-URL-M", "ImageURLMedium") \
+                 .withColumnRenamed("Image-URL-L", "ImageURLLarge")
+
+    return {'spark': spark, 'books': books, 'ratings': ratings}
+
+def filter_ratings(prepared):
+    """Keep explicit ratings of users and books with enough of them"""
+    print("\n=== DATA PREPROCESSING ===")
+    # Filter out ratings of 0 (implicit feedback) - keep only explicit ratings
+    ratings_filtered = prepared['ratings'].filter(col('BookRating') > 0)
+
+    # Filter users and books with minimum ratings
+    user_counts = ratings_filtered.groupBy('UserID').agg(count('*').alias('user_rating_count'))
+    # Rating sums feed the top rated lists
+    book_counts = ratings_filtered.groupBy('ISBN').agg(
+        count('*').alias('book_rating_count'), spark_sum('BookRating').alias('book_rating_sum')
+    )
+
+    # Join and filter with proper column selection
+    ratings_filtered = ratings_filtered.alias('r') \
+        .join(user_counts.alias('uc'), col('r.UserID') == col('uc.UserID')) \
+        .filter(col('user_rating_count') >= MIN_RATINGS_PER_USER) \
+        .select(col('r.UserID'), col('r.ISBN'), col('r.BookRating'))
+
+    ratings_filtered = ratings_filtered.alias('r') \
+        .join(book_counts.alias('bc'), col('r.ISBN') == col('bc.ISBN')) \
+        .filter(col('book_rating_count') >= MIN_RATINGS_PER_BOOK) \
+        .select(col('r.UserID'), col('r.ISBN'), col('r.BookRating')) \
+        .cache()
+
+    # Both indexers, the book mapping and ALS read the filtered ratings, so they are cached
+    # once here and counting them only materializes the cache
+    ratings_filtered_count = ratings_filtered.count()
+    record_rows('ratings_filtered', ratings_filtered_count)
+    print(f"\nRatings after quality filtering: {ratings_filtered_count}")
+
+    prepared.update(ratings_filtered=ratings_filtered, book_counts=book_counts)
+    return prepared
+
+def index_books(prepared):
+    """Index users and books for ALS and join the rated books with their metadata into the book mapping"""
+    ratings_filtered = prepared['ratings_filtered']
+
+    # Create user and item indices (ALS needs integer IDs)
+    print("\n=== CREATING INDICES ===")
+
+    user_indexer = StringIndexer(inputCol="UserID", outputCol="userIndex")
+    book_indexer = StringIndexer(inputCol="ISBN", outputCol="bookIndex")
+
+    # Fit and transform
+    ratings_indexed = user_indexer.fit(ratings_filtered).transform(ratings_filtered)
+    ratings_indexed = book_indexer.fit(ratings_indexed).transform(ratings_indexed)
+
+    # Get mappings
+    book_mapping_with_index = ratings_indexed.select('ISBN', 'bookIndex').distinct() \
+        .join(prepared['books'], 'ISBN') \
+        .join(prepared['book_counts'], 'ISBN') \
+        .select('ISBN', 'bookIndex', 'BookTitle', 'BookAuthor', 'YearOfPublication', 'Publisher', 'ImageURLSmall', 'ImageURLMedium', 'book_rating_count', 'book_rating_sum')
+
+    book_mapping_pd = book_mapping_with_index.toPandas()
+    record_rows('books', len(book_mapping_pd))
+    print(f"Books with ratings and metadata: {len(book_mapping_pd)}")
+
+    prepared.update(
+        ratings_indexed=ratings_indexed,
+        book_mapping=book_mapping_with_index,
+        book_mapping_pd=book_mapping_pd
+    )
+    return prepared
+
+def load_and_prepare(spark, input_path):
+    """
+    Load Books.csv and Ratings.csv, keep explicit ratings of users and books with enough
+    of them, and index them for ALS. The returned dict holds the Spark DataFrames and the
+    book mapping as pandas (book_mapping_pd), which is what the shared pipeline code reads.
+    """
+    with stage('ingest'):
+        prepared = load_data(spark, input_path)
+    with stage('filter'):
+        filter_ratings(prepared)
+    with stage('index'):
+        return index_books(prepared)
+
+def als_item_factors(prepared):
+    """Train ALS on explicit ratings; returns the ISBNs with book metadata and their item factors"""
+    ratings_indexed = prepared['ratings_indexed']
+    book_mapping_pd = prepared['book_mapping_pd']
+
+    # Split data into training and test sets
+    print("\n=== SPLITTING DATA ===")
+    # Hashed rather than randomSplit, so the NumPy backend holds out the same ratings. The
+    # held-out split is only evaluated, and counted, when evaluate_als is set
+    bucket = crc32(concat_ws(':', lit(str(SPLIT_SEED)), col('UserID').cast('string'), col('ISBN'))) % SPLIT_BUCKETS
+    in_training = bucket < TRAINING_FRACTION * SPLIT_BUCKETS
+    training = ratings_indexed.filter(in_training)
+
+    # Build and train the ALS model
+    als = ALS(
+        maxIter=ALS_MAX_ITER,
+        regParam=ALS_REG_PARAM,
+        rank=ALS_RANK,
+        userCol="userIndex",
+        itemCol="bookIndex",
+        ratingCol="BookRating",
+        coldStartStrategy="drop",
+        nonnegative=True,
+        seed=prepared.get('als_seed', ALS_SEED)
+    )
+
+    model = als.fit(training)
+    print("Model training complete")
+    if prepared.get('evaluate_als'):
+        held_out = ratings_indexed.filter(~in_training)
+        evaluator = RegressionEvaluator(metricName='rmse', labelCol='BookRating', predictionCol='prediction')
+        prepared['als_evaluation'] = {
+            'training_ratings': training.count(),
+            'held_out_ratings': held_out.count(),
+            'training_rmse': evaluator.evaluate(model.transform(training)),
+            'held_out_rmse': evaluator.evaluate(model.transform(held_out))
+        }
+    print("\n=== GENERATING BOOK SIMILARITIES ===")
+
+    # Get item factors (books)
+    item_factors = model.itemFactors
+    item_factors_pd = item_factors.toPandas()
+    print(f"Total items with factors: {len(item_factors_pd)}")
+
+    # Keep only items with book metadata so every neighbour slot can be filled
+    isbn_by_index = dict(zip(book_mapping_pd['bookIndex'], book_mapping_pd['ISBN']))
+    item_factors_pd = item_factors_pd[item_factors_pd['id'].isin(isbn_by_index.keys())].reset_index(drop=True)
+    item_isbns = [isbn_by_index[item_id] for item_id in item_factors_pd['id']]
+
+    return item_isbns, np.vstack(item_factors_pd['features'].values)
+
+def interactions(prepared):
+    """Distinct (UserID, ISBN) pairs of every rating, explicit or implicit, of the mapped books"""
+    catalog_isbns = prepared['book_mapping'].select('ISBN').distinct()
+    interactions_pd = prepared['ratings'].join(catalog_isbns, 'ISBN').select('UserID', 'ISBN').distinct().toPandas()
+    record_rows('interactions', len(interactions_pd))
+    return interactions_pd
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import base64
+import argparse
+from datetime import datetime
+from recommender import sanitize_version, compute_similarities, build_artifacts, build_manifest
+from recommender.indexes import book_record, build_search_facets, build_popular_lists
+from recommender.instrumentation import start_run, stage
+from recommender.pipeline import TOP_N_SIMILAR
+
+# Runs the recommender pipeline on one machine and writes what the Glue job would
+# load into DynamoDB and S3 to a local directory:
+#   books.jsonl, similarities.jsonl, search_facets.jsonl, popular_lists.jsonl  (one table item per line)
+#   manifest.json, title_index.json.gz, catalog.bin, title_trigrams.json.gz, run_report.json
+#
+#   python run_local.py --books Books.csv --ratings Ratings.csv --output out/
+#   python run_local.py ... --backend spark   (local[*] Spark, needs pyspark)
+
+def similarity_record(item):
+    """A packed similarity tuple as a JSON-serializable table item"""
+    if len(item) == 3:
+        isbn, neighbour_count, neighbours = item
+        return {'isbn': isbn, 'neighbour_count': neighbour_count, 'neighbours': base64.b64encode(neighbours).decode('ascii')}
+    isbn, neighbour_count, similar_isbns, scores = item
+    return {'isbn': isbn, 'neighbour_count': neighbour_count, 'similar_isbns': similar_isbns, 'scores': scores}
+
+def write_json_lines(path, records):
+    with open(path, 'w', encoding='utf-8') as output:
+        for record in records:
+            output.write(json.dumps(record) + '\n')
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the book recommender locally")
+    parser.add_argument('--books', required=True, help="path to Books.csv")
+    parser.add_argument('--ratings', required=True, help="path to Ratings.csv")
+    parser.add_argument('--output', required=True, help="directory for the table items and artifacts")
+    parser.add_argument('--backend', choices=['numpy', 'spark'], default='numpy')
+    parser.add_argument('--engine', choices=['als', 'cooccurrence'], default='als')
+    parser.add_argument('--metric', choices=['cosine', 'jaccard'], default='cosine')
+    parser.add_argument('--encoding', choices=['list', 'binary'], default='list')
+    parser.add_argument('--threads', type=int, default=None, help="ALS solver threads for the numpy backend")
+    parser.add_argument('--data-version', default=None)
+    args = parser.parse_args()
+
+    data_version = sanitize_version(args.data_version or datetime.utcnow().strftime('%Y%m%dT%H%M%SZ'))
+    os.makedirs(args.output, exist_ok=True)
+    started = time.time()
+
+    if args.backend == 'spark':
+        from pyspark.sql import SparkSession
+        from recommender import spark_backend as backend
+        spark = SparkSession.builder.master('local[*]').appName('book-recommender-local').getOrCreate()
+        run_report = start_run(data_version, spark.sparkContext)
+        books_dir = os.path.dirname(os.path.abspath(args.books))
+        if os.path.dirname(os.path.abspath(args.ratings)) != books_dir:
+            parser.error("the spark backend reads Books.csv and Ratings.csv from one directory")
+        prepared = backend.load_and_prepare(spark, books_dir)
+    else:
+        from recommender import numpy_backend as backend
+        run_report = start_run(data_version)
+        prepared = backend.load_and_prepare(args.books, args.ratings, args.threads)
+
+    book_mapping_pd = prepared['book_mapping_pd']
+    item_isbns, similarity_list = compute_similarities(
+        backend, prepared, args.engine, args.metric, TOP_N_SIMILAR, args.encoding
+    )
+    with stage('facets'):
+        facet_items = build_search_facets(book_mapping_pd)
+    with stage('popular_lists'):
+        list_items = build_popular_lists(book_mapping_pd)
+
+    write_json_lines(os.path.join(args.output, 'books.jsonl'), (book_record(row) for row in book_mapping_pd.itertuples(index=False)))
+    write_json_lines(os.path.join(args.output, 'similarities.jsonl'), map(similarity_record, similarity_list))
+    write_json_lines(os.path.join(args.output, 'search_facets.jsonl'), (
+        {'term': term, 'label': label, 'match_count': match_count, 'isbns': isbns, 'facets': facets}
+        for term, label, match_count, isbns, facets in facet_items
+    ))
+    write_json_lines(os.path.join(args.output, 'popular_lists.jsonl'), (
+        {'list_id': list_id, 'label': label, 'metric': metric, 'prior_mean': prior_mean, 'prior_ratings': prior_ratings, 'books': books}
+        for list_id, label, metric, prior_mean, prior_ratings, books in list_items
+    ))
+
+    table_names = {
+        'books': f"Books-{data_version}",
+        'similarities': f"BookSimilarities-{data_version}",
+        'facets': f"SearchFacets-{data_version}",
+        'lists': f"PopularLists-{data_version}"
+    }
+    manifest = build_manifest(
+        data_version, table_names, len(book_mapping_pd), item_isbns, len(similarity_list),
+        len(facet_items), len(list_items), args.engine, args.encoding
+    )
+    with open(os.path.join(args.output, 'manifest.json'), 'w', encoding='utf-8') as output:
+        json.dump(manifest, output)
+
+    for name, body, _ in build_artifacts(book_mapping_pd):
+        with open(os.path.join(args.output, name), 'wb') as output:
+            output.write(body)
+
+    with open(os.path.join(args.output, 'run_report.json'), 'w', encoding='utf-8') as output:
+        json.dump(run_report.finish(), output, indent=2)
+
+    print(f"\nWrote {len(book_mapping_pd)} books and {len(similarity_list)} similarity items "
+          f"to {args.output} in {time.time() - started:.1f}s ({args.backend} backend, {args.engine} engine)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import re
+import boto3
+from datetime import datetime
+
+def sanitize_version(version):
+    """Restrict a data version to characters allowed in DynamoDB table names (mirrors the Glue job)"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '-', version)[:200]
+
+def delete_version_tables(dynamodb_client, version, base_names):
+    """Delete a data version's tables, skipping any that do not exist; returns the deleted table names"""
+    deleted_tables = []
+    for base_name in base_names:
+        table_name = f"{base_name}-{version}"
+        try:
+            dynamodb_client.delete_table(TableName=table_name)
+            deleted_tables.append(table_name)
+        except dynamodb_client.exceptions.ResourceNotFoundException:
+            pass
+        except dynamodb_client.exceptions.ResourceInUseException:
+            print(f"Table {table_name} is still being created or updated; delete it manually")
+    return deleted_tables
+
+def lambda_handler(event, context):
+    """
+    Flip the active data version pointer to a verified Glue run, or roll back to the previous version.
+    With {"discard": true} the tables of a failed or unverified run are deleted instead.
+    """
+    dynamodb_client = boto3.client('dynamodb')
+    dynamodb_resource = boto3.resource('dynamodb')
+
+    # Configuration
+    PIPELINE_STATE_TABLE = "PipelineState"
+    ACTIVE_VERSION_ID = "active-version"
+    RUN_LOCK_ID = "run-lock"
+    BOOKS_TABLE_BASE = "Books"
+    SIMILARITIES_TABLE_BASE = "BookSimilarities"
+    FACETS_TABLE_BASE = "SearchFacets"
+    LISTS_TABLE_BASE = "PopularLists"
+    ARTIFACTS_BUCKET = "book-recommender-artifacts"
+    TABLE_BASES = (BOOKS_TABLE_BASE, SIMILARITIES_TABLE_BASE, FACETS_TABLE_BASE, LISTS_TABLE_BASE)
+
+    state_table = dynamodb_resource.Table(PIPELINE_STATE_TABLE)
+
+    results = {
+        "activated": False,
+        "version": None,
+        "previous_version": None,
+        "deleted_tables": [],
+        "message": ""
+    }
+
+    try:
+        current = state_table.get_item(Key={'id': ACTIVE_VERSION_ID}, ConsistentRead=True).get('Item')
+
+        if event.get('discard'):
+            # A run that failed after the pointer was written (or a rerun of a kept version) keeps its tables
+            version = sanitize_version(event['data_version'])
+            if current and version in (current.get('version'), current.get('previous_version')):
+                results["message"] = f"Version {version} is referenced by the active version pointer; tables kept"
+                return results
+            results["deleted_tables"] = delete_version_tables(dynamodb_client, version, TABLE_BASES)
+            results["message"] = f"Discarded version {version}"
+            return results
+
+        if event.get('rollback'):
+            # Instant rollback: swap the pointer back to the previous version's tables
+            if not current or not current.get('previous_version'):
+                results["message"] = "No previous version to roll back to"
+                return results
+            new_version = current['previous_version']
+            previous_version = current['version']
+        else:
+            new_version = sanitize_version(event['data_version'])
+            previous_version = current['version'] if current else None
+            if previous_version == new_version:
+                previous_version = current.get('previous_version')
+
+        # The retired version falls out of the retention window (active + previous)
+        retired_version = current.get('previous_version') if current and not event.get('rollback') else None
+
+        item = {
+            'id': ACTIVE_VERSION_ID,
+            'version': new_version,
+            'books_table': f"{BOOKS_TABLE_BASE}-{new_version}",
+            'similarities_table': f"{SIMILARITIES_TABLE_BASE}-{new_version}",
+            'similarities_format': 'packed',
+            'facets_table': f"{FACETS_TABLE_BASE}-{new_version}",
+            'lists_table': f"{LISTS_TABLE_BASE}-{new_version}",
+            'artifacts_bucket': ARTIFACTS_BUCKET,
+            'artifacts_prefix': f"versions/{new_version}/",
+            'activated_at': datetime.utcnow().isoformat() + 'Z'
+        }
+        if previous_version:
+            item['previous_version'] = previous_version
+
+        # Inputs behind this version, used by the trigger stage to skip retraining identical data
+        if not event.get('rollback'):
+            for key in ('input_fingerprint', 'content_hash'):
+                if event.get(key):
+                    item[key] = event[key]
+
+        # Guard against a concurrent flip: only replace the pointer we just read
+        if current:
+            state_table.put_item(
+                Item=item,
+                ConditionExpression='#version = :version',
+                ExpressionAttributeNames={'#version': 'version'},
+                ExpressionAttributeValues={':version': current['version']}
+            )
+        else:
+            state_table.put_item(
+                Item=item,
+                ConditionExpression='attribute_not_exists(#id)',
+                ExpressionAttributeNames={'#id': 'id'}
+            )
+
+        results["activated"] = True
+        results["version"] = new_version
+        results["previous_version"] = previous_version
+
+        # Release the run lock held by this execution
+        if event.get('execution_name'):
+            try:
+                state_table.delete_item(
+                    Key={'id': RUN_LOCK_ID},
+                    ConditionExpression='execution_name = :execution_name',
+                    ExpressionAttributeValues={':execution_name': event['execution_name']}
+                )
+            except state_table.meta.client.exceptions.ConditionalCheckFailedException:
+                pass
+
+        # Drop tables of the version that is no longer active or kept for rollback
+        if retired_version and retired_version not in (new_version, previous_version):
+            results["deleted_tables"] = delete_version_tables(dynamodb_client, retired_version, TABLE_BASES)
+
+        results["message"] = f"Active data version is now {new_version}"
+        return results
+
+    except Exception as e:
+        error_msg = f"Activation error: {str(e)}"
+        print(error_msg)
+        results["message"] = error_msg
+        return results
@@ -1,20 +1,53 @@
+import csv
 import json
+import time
+import codecs
+import hashlib
 import boto3
 from botocore.exceptions import ClientError
 
+# Columns the Glue job reads from each input file
+REQUIRED_COLUMNS = {
+    "Books.csv": ["ISBN", "Book-Title", "Book-Author", "Year-Of-Publication", "Publisher", "Image-URL-S", "Image-URL-M"],
+    "Ratings.csv": ["User-ID", "ISBN", "Book-Rating"]
+}
+
+# Objects are streamed in ranged GETs so multi-GB inputs never sit in Lambda memory
+CHUNK_SIZE = 8 * 1024 * 1024
+MAX_BAD_ROW_RATIO = 0.01
+MAX_BAD_ROW_EXAMPLES = 5
+TIME_MARGIN_SECONDS = 15
+
 def lambda_handler(event, context):
     s3 = boto3.client('s3')
 
     BUCKET_NAME = "book-recommender-raw-data"
     REQUIRED_FILES = ["Books.csv", "Ratings.csv"]
+
+    # "full" parse-checks every row, "sample" checks every sample_every-th row;
+    # both modes count every row and hash the full content
+    validation_mode = event.get('validation_mode', 'full')
+    sample_every = 1 if validation_mode == 'full' else event.get('sample_every', 100)
+
+    remaining_seconds = context.get_remaining_time_in_millis() / 1000 if context else 900
+    deadline = time.time() + remaining_seconds - TIME_MARGIN_SECONDS
     
     results = {
         "valid": True,
         "missing_files": [],
         "existing_files": [],
         "file_sizes": {},
+        "file_stats": {},
+        "content_hash": None,
         "message": ""
     }
+    etags = {}
+
+    # A zero, negative or non-integer stride would fail or skip rows silently
+    if isinstance(sample_every, bool) or not isinstance(sample_every, int) or sample_every < 1:
+        results["valid"] = False
+        results["message"] = f"sample_every must be a positive integer, got {sample_every!r}"
+        return results
     
     try:
         # Check each required file
@@ -23,6 +56,7 @@ def lambda_handler(event, context):
                 response = s3.head_object(Bucket = BUCKET_NAME, Key = file_name)
                 results["existing_files"].append(file_name)
                 results["file_sizes"][file_name] = response['ContentLength']
+                etags[file_name] = response['ETag']
                 
                 if response['ContentLength'] < 100:
                     results["valid"]=False
@@ -37,8 +71,35 @@ def lambda_handler(event, context):
         
         if results["missing_files"]:
             results["message"]=f"Missing files: {', '.join(results['missing_files'])}"
-        elif results["valid"]:
-            results["message"] = "All required files are present and valid"
+            return results
+        if not results["valid"]:
+            return results
+
+        # Stream each file and check its header and rows
+        for file_name in REQUIRED_FILES:
+            stats = validate_csv(
+                s3, BUCKET_NAME, file_name, results["file_sizes"][file_name],
+                etags[file_name], sample_every, deadline
+            )
+            results["file_stats"][file_name] = stats
+
+            if stats["missing_columns"]:
+                results["valid"] = False
+                results["message"] = f"File {file_name} is missing columns: {', '.join(stats['missing_columns'])}"
+                return results
+            if stats["rows"] == 0:
+                results["valid"] = False
+                results["message"] = f"File {file_name} has no data rows"
+                return results
+            if stats["bad_rows"] > MAX_BAD_ROW_RATIO * stats["checked_rows"]:
+                results["valid"] = False
+                results["message"] = f"File {file_name} has {stats['bad_rows']} malformed rows out of {stats['checked_rows']} checked"
+                return results
+
+        # Combined hash of both inputs, used downstream to skip retraining on identical data
+        combined = "\n".join(f"{file_name}:{results['file_stats'][file_name]['sha256']}" for file_name in REQUIRED_FILES)
+        results["content_hash"] = hashlib.sha256(combined.encode('utf-8')).hexdigest()
+        results["message"] = "All required files are present and valid"
         return results
         
     except Exception as e:
@@ -48,5 +109,85 @@ def lambda_handler(event, context):
             "message": error_msg,
             "missing_files": REQUIRED_FILES,
             "existing_files": [],
-            "file_sizes": {}
-        }
\ No newline at end of file
+            "file_sizes": {},
+            "file_stats": {},
+            "content_hash": None
+        }
+
+def iter_object_lines(s3, bucket, key, size, etag, hasher, deadline):
+    """Yield text lines from an S3 object read in ranged chunks, hashing the raw bytes on the way"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    for start in range(0, size, CHUNK_SIZE):
+        if time.time() > deadline:
+            raise TimeoutError(f"Validation of {key} did not finish within the time limit")
+        end = min(start + CHUNK_SIZE, size) - 1
+        chunk = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)['Body'].read()
+        hasher.update(chunk)
+
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def validate_csv(s3, bucket, key, size, etag, sample_every, deadline):
+    """Check the header and parse-check rows of a CSV object without buffering it"""
+    hasher = hashlib.sha256()
+    reader = csv.reader(iter_object_lines(s3, bucket, key, size, etag, hasher, deadline))
+
+    header = [column.strip().lstrip('\ufeff') for column in next(reader, [])]
+    stats = {
+        "bytes": size,
+        "columns": header,
+        "missing_columns": [column for column in REQUIRED_COLUMNS[key] if column not in header],
+        "rows": 0,
+        "checked_rows": 0,
+        "bad_rows": 0,
+        "bad_row_examples": [],
+        "sha256": None
+    }
+    if stats["missing_columns"]:
+        return stats
+
+    positions = {column: header.index(column) for column in REQUIRED_COLUMNS[key]}
+    for row in reader:
+        stats["rows"] += 1
+        if stats["rows"] % sample_every:
+            continue
+        stats["checked_rows"] += 1
+        problem = check_row(key, row, len(header), positions)
+        if problem:
+            stats["bad_rows"] += 1
+            if len(stats["bad_row_examples"]) < MAX_BAD_ROW_EXAMPLES:
+                stats["bad_row_examples"].append(f"row {stats['rows']}: {problem}")
+
+    stats["sha256"] = hasher.hexdigest()
+    return stats
+
+def check_row(key, row, column_count, positions):
+    """Return a description of what is wrong with a row, or None if it parses"""
+    if len(row) != column_count:
+        return f"expected {column_count} fields, found {len(row)}"
+    if not row[positions["ISBN"]].strip():
+        return "empty ISBN"
+
+    if key == "Ratings.csv":
+        try:
+            int(row[positions["User-ID"]])
+        except ValueError:
+            return f"non-numeric User-ID {row[positions['User-ID']]!r}"
+        try:
+            rating = int(row[positions["Book-Rating"]])
+        except ValueError:
+            return f"non-numeric Book-Rating {row[positions['Book-Rating']]!r}"
+        if rating < 0 or rating > 10:
+            return f"Book-Rating {rating} outside 0-10"
+    else:
+        if not row[positions["Book-Title"]].strip():
+            return "empty Book-Title"
+
+    return None
\ No newline at end of file
@@ -1,37 +1,87 @@
 import json
+import re
+import time
+import random
+import struct
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+# Neighbour scores are cosine similarities quantized to unsigned 16-bit integers
+SCORE_SCALE = 65535
+
 def lambda_handler(event, context):
     """
     Verify that Glue job completed successfully and DynamoDB tables are populated
     """
     dynamodb_client = boto3.client('dynamodb')  
-    dynamodb_resource = boto3.resource('dynamodb')  
+    s3 = boto3.client('s3')
     glue = boto3.client('glue')
     
     # Configuration
-    DYNAMODB_TABLES = ["Books", "BookSimilarities"]
+    DYNAMODB_TABLES = ["Books", "BookSimilarities", "SearchFacets", "PopularLists"]
     MIN_EXPECTED_BOOKS = 1000
-    MIN_EXPECTED_SIMILARITIES = 10000
+    MIN_EXPECTED_SIMILARITIES = 1000  # one packed neighbour list per book
+    MIN_EXPECTED_FACET_TERMS = 100  # one item per author and per publisher
+    MIN_EXPECTED_LISTS = 2  # the overall most rated and top rated lists
+    MANIFEST_COUNT_KEYS = {
+        "Books": "books_count",
+        "BookSimilarities": "similarity_items",
+        "SearchFacets": "facet_terms",
+        "PopularLists": "list_items"
+    }
+    VERSIONED_ONLY_TABLES = {"SearchFacets", "PopularLists"}
+    ARTIFACTS_BUCKET = "book-recommender-artifacts"
+    SCAN_SEGMENTS = 16
+    SAMPLE_SIZE = 500
+    TIME_MARGIN_SECONDS = 15
+    STAGE_REGRESSION_RATIO = 1.5  # stages this much slower than the active version's run are reported
+    MIN_STAGE_REGRESSION_SECONDS = 60
     
     # Get glue job name from event or use default
     glue_job_name = event.get('glue_job_name', 'book-recommender')
+    glue_job_run_id = event.get('glue_job_run_id')
+
+    # Verification modes for versioned tables: "count" runs a parallel segmented
+    # Select=COUNT scan, "sample" checks a seeded random sample from the job manifest
+    verification_modes = event.get('verification_modes', ['count', 'sample'])
+
+    # The active-version pointer item (DynamoDB JSON) passed by the state machine; its
+    # run report is the baseline stage timings are compared against
+    baseline_version = event.get('active_version', {}).get('Item', {}).get('version', {}).get('S')
+
+    # Verify the versioned tables written by this run when a data version is given
+    data_version = event.get('data_version')
+    if data_version:
+        data_version = re.sub(r'[^A-Za-z0-9_.-]', '-', data_version)[:200]
+    table_names = {
+        base_name: f"{base_name}-{data_version}" if data_version else base_name
+        for base_name in DYNAMODB_TABLES
+        if data_version or base_name not in VERSIONED_ONLY_TABLES
+    }
+
+    # Stop scanning and sampling early enough to report within the Lambda time limit
+    remaining_seconds = context.get_remaining_time_in_millis() / 1000 if context else 900
+    deadline = time.time() + remaining_seconds - TIME_MARGIN_SECONDS
     
     results = {
         "verified": True,
         "checks": {},
         "message": "",
         "glue_job_status": "UNKNOWN",
-        "table_counts": {}
+        "table_counts": {},
+        "data_version": data_version
     }
     
     try:
         # Check 1: Verify Glue job status
         try:
-            response = glue.get_job_runs(JobName=glue_job_name, MaxResults=1)
-            if response['JobRuns']:
-                latest_run = response['JobRuns'][0]
+            if glue_job_run_id:
+                job_runs = [glue.get_job_run(JobName=glue_job_name, RunId=glue_job_run_id)['JobRun']]
+            else:
+                job_runs = glue.get_job_runs(JobName=glue_job_name, MaxResults=1)['JobRuns']
+            if job_runs:
+                latest_run = job_runs[0]
                 job_status = latest_run['JobRunState']
                 results["glue_job_status"] = job_status
                 results["checks"]["glue_job_completed"] = (job_status == "SUCCEEDED")
@@ -49,18 +99,61 @@ def lambda_handler(event, context):
             results["verified"] = False
             results["message"] = f"Error checking Glue job: {str(e)}"
         
+        # Load the manifest the Glue job wrote for this data version
+        manifest = None
+        if data_version:
+            try:
+                manifest_object = s3.get_object(Bucket=ARTIFACTS_BUCKET, Key=f"versions/{data_version}/manifest.json")
+                manifest = json.loads(manifest_object['Body'].read())
+                results["checks"]["manifest_found"] = True
+            except Exception as e:
+                results["checks"]["manifest_found"] = False
+                results["verified"] = False
+                results["message"] = f"Manifest for version {data_version} not readable: {str(e)}"
+        
+        # Surface the job's run report; a missing report does not fail verification
+        if data_version:
+            run_report = read_run_report(s3, ARTIFACTS_BUCKET, data_version)
+            baseline_report = None
+            if run_report and baseline_version and baseline_version != data_version:
+                baseline_report = read_run_report(s3, ARTIFACTS_BUCKET, baseline_version)
+            results["run_report"] = summarize_run_report(
+                run_report, baseline_report, STAGE_REGRESSION_RATIO, MIN_STAGE_REGRESSION_SECONDS
+            )
+        
         # Check 2: Verify DynamoDB tables exist and have data
-        for table_name in DYNAMODB_TABLES:
+        for base_name, table_name in table_names.items():
             try:
                 # Use client for describe_table
                 describe_response = dynamodb_client.describe_table(TableName=table_name)
                 item_count = describe_response['Table'].get('ItemCount', 0)
-                results["table_counts"][table_name] = item_count
                 results["checks"][f"{table_name}_exists"] = True
+
+                # ItemCount is refreshed only about every six hours, so count freshly loaded tables exactly
+                if data_version and 'count' in verification_modes:
+                    item_count = count_items_parallel(dynamodb_client, table_name, SCAN_SEGMENTS, deadline)
+                    if item_count is None:
+                        results["checks"][f"{table_name}_counted"] = False
+                        results["verified"] = False
+                        results["message"] = f"Counting {table_name} did not finish within the time limit"
+                        continue
+                    if manifest:
+                        expected_count = manifest[MANIFEST_COUNT_KEYS[base_name]]
+                        count_matches = item_count == expected_count
+                        results["checks"][f"{table_name}_count_matches_manifest"] = count_matches
+                        if not count_matches:
+                            results["verified"] = False
+                            if not results["message"]:
+                                results["message"] = f"Table {table_name} has {item_count} items, manifest expects {expected_count}"
+                results["table_counts"][table_name] = item_count
                 
                 # Check if table has reasonable amount of data
-                if table_name == "Books":
+                if base_name == "Books":
                     has_sufficient_data = item_count >= MIN_EXPECTED_BOOKS
+                elif base_name == "SearchFacets":
+                    has_sufficient_data = item_count >= MIN_EXPECTED_FACET_TERMS
+                elif base_name == "PopularLists":
+                    has_sufficient_data = item_count >= MIN_EXPECTED_LISTS
                 else:  # BookSimilarities
                     has_sufficient_data = item_count >= MIN_EXPECTED_SIMILARITIES
                 
@@ -76,6 +169,28 @@ def lambda_handler(event, context):
                 results["verified"] = False
                 results["message"] = f"Table {table_name} not accessible: {str(e)}"
         
+        # Check 3: Verify a seeded random sample of books and their neighbour lists
+        if manifest and 'sample' in verification_modes:
+            seed = event.get('sample_seed', data_version)
+            sample = verify_sample(
+                dynamodb_client, table_names["Books"], table_names["BookSimilarities"],
+                manifest, SAMPLE_SIZE, seed, deadline
+            )
+            results["sample"] = sample
+            results["checks"]["sample_completed"] = sample["completed"]
+            results["checks"]["sample_books_present"] = sample["missing_books"] == 0
+            results["checks"]["sample_lists_complete"] = sample["missing_lists"] == 0 and sample["incomplete_lists"] == 0
+            results["checks"]["sample_scores_valid"] = sample["invalid_scores"] == 0
+            
+            failed_checks = [
+                name for name in ("sample_completed", "sample_books_present", "sample_lists_complete", "sample_scores_valid")
+                if not results["checks"][name]
+            ]
+            if failed_checks:
+                results["verified"] = False
+                if not results["message"]:
+                    results["message"] = f"Sample verification failed: {', '.join(failed_checks)}"
+        
         if results["verified"]:
             total_items = sum(results["table_counts"].values())
             results["message"] = f"Output verification passed. Total items: {total_items}"
@@ -91,4 +206,162 @@ def lambda_handler(event, context):
             "checks": {},
             "table_counts": {},
             "glue_job_status": "UNKNOWN"
-        }
\ No newline at end of file
+        }
+
+def read_run_report(s3, bucket, data_version):
+    """The run report the Glue job wrote for a data version, or None"""
+    try:
+        report_object = s3.get_object(Bucket=bucket, Key=f"versions/{data_version}/run_report.json")
+        return json.loads(report_object['Body'].read())
+    except Exception as e:
+        print(f"Run report for version {data_version} not readable: {str(e)}")
+        return None
+
+def summarize_run_report(run_report, baseline_report, regression_ratio, min_regression_seconds):
+    """
+    Stage timings of the run, the slowest stage, and the stages that took regression_ratio
+    times longer (and at least min_regression_seconds more) than in the baseline run
+    """
+    if not run_report:
+        return {"found": False}
+
+    stage_seconds = {}
+    for stage in run_report.get('stages', []):
+        stage_seconds[stage['name']] = stage_seconds.get(stage['name'], 0) + stage.get('seconds', 0)
+    summary = {
+        "found": True,
+        "total_seconds": run_report.get('total_seconds'),
+        "stage_seconds": stage_seconds,
+        "slowest_stage": max(stage_seconds, key=stage_seconds.get) if stage_seconds else None,
+        "failed_spark_tasks": sum(stage.get('spark', {}).get('failed_tasks', 0) for stage in run_report.get('stages', [])),
+        "baseline_version": baseline_report.get('data_version') if baseline_report else None,
+        "slower_stages": []
+    }
+    if baseline_report:
+        baseline_seconds = {}
+        for stage in baseline_report.get('stages', []):
+            baseline_seconds[stage['name']] = baseline_seconds.get(stage['name'], 0) + stage.get('seconds', 0)
+        for name, seconds in stage_seconds.items():
+            baseline = baseline_seconds.get(name)
+            if baseline and seconds >= baseline * regression_ratio and seconds - baseline >= min_regression_seconds:
+                summary["slower_stages"].append({"stage": name, "seconds": seconds, "baseline_seconds": baseline})
+    return summary
+
+def count_items_parallel(dynamodb_client, table_name, total_segments, deadline):
+    """Count items with a parallel segmented Select=COUNT scan; returns None if the deadline passes"""
+    def count_segment(segment):
+        segment_count = 0
+        scan_kwargs = {
+            'TableName': table_name,
+            'Select': 'COUNT',
+            'Segment': segment,
+            'TotalSegments': total_segments
+        }
+        while True:
+            if time.time() > deadline:
+                return None
+            response = dynamodb_client.scan(**scan_kwargs)
+            segment_count += response['Count']
+            if 'LastEvaluatedKey' not in response:
+                return segment_count
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        segment_counts = list(executor.map(count_segment, range(total_segments)))
+
+    if any(segment_count is None for segment_count in segment_counts):
+        return None
+    return sum(segment_counts)
+
+def verify_sample(dynamodb_client, books_table, similarities_table, manifest, sample_size, seed, deadline):
+    """
+    Check a seeded random sample of manifest ISBNs with BatchGetItem: each book must exist,
+    have a complete neighbour list, and carry in-range, best-first scores
+    """
+    isbns = manifest['isbns']
+    known_isbns = set(isbns)
+    expected_neighbours = min(manifest['top_n'], len(isbns) - 1)
+    complete_lists = manifest.get('complete_lists', True)
+    sampled_isbns = random.Random(seed).sample(isbns, min(sample_size, len(isbns)))
+
+    sample = {
+        "completed": True,
+        "sampled": len(sampled_isbns),
+        "missing_books": 0,
+        "missing_lists": 0,
+        "incomplete_lists": 0,
+        "invalid_scores": 0
+    }
+
+    # Both tables share a BatchGetItem request, which is capped at 100 keys in total
+    batches = [sampled_isbns[start:start + 50] for start in range(0, len(sampled_isbns), 50)]
+
+    def check_batch(batch):
+        keys = [{'isbn': {'S': isbn}} for isbn in batch]
+        request_items = {
+            books_table: {'Keys': keys, 'ProjectionExpression': 'isbn'},
+            similarities_table: {'Keys': keys}
+        }
+        found_books, lists = set(), {}
+        attempt = 0
+        while request_items:
+            if time.time() > deadline:
+                return None
+            response = dynamodb_client.batch_get_item(RequestItems=request_items)
+            found_books.update(item['isbn']['S'] for item in response['Responses'].get(books_table, []))
+            lists.update((item['isbn']['S'], item) for item in response['Responses'].get(similarities_table, []))
+            request_items = response.get('UnprocessedKeys')
+            if request_items:
+                time.sleep(0.05 * (2 ** attempt))
+                attempt += 1
+
+        batch_result = {"missing_books": 0, "missing_lists": 0, "incomplete_lists": 0, "invalid_scores": 0}
+        for isbn in batch:
+            if isbn not in found_books:
+                batch_result["missing_books"] += 1
+            if isbn not in lists:
+                batch_result["missing_lists"] += 1
+                continue
+            item = lists[isbn]
+            neighbours = decode_neighbours(item)
+            neighbour_isbns = [similar_isbn for similar_isbn, _ in neighbours]
+            list_length_ok = (len(neighbours) == expected_neighbours if complete_lists
+                              else 1 <= len(neighbours) <= expected_neighbours)
+            if (not list_length_ok
+                    or int(item['neighbour_count']['N']) != len(neighbours)
+                    or isbn in neighbour_isbns
+                    or not known_isbns.issuperset(neighbour_isbns)):
+                batch_result["incomplete_lists"] += 1
+            scores = [score for _, score in neighbours]
+            if any(score < 0 or score > SCORE_SCALE for score in scores) or scores != sorted(scores, reverse=True):
+                batch_result["invalid_scores"] += 1
+        return batch_result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(batches)))) as executor:
+        for batch_result in executor.map(check_batch, batches):
+            if batch_result is None:
+                sample["completed"] = False
+                continue
+            for key, value in batch_result.items():
+                sample[key] += value
+
+    return sample
+
+def decode_neighbours(item):
+    """Decode a packed similarity item (low-level client format) into (similar_isbn, quantized_score) pairs"""
+    if 'neighbours' in item:
+        data = item['neighbours']['B']
+        neighbours = []
+        offset = 1  # skip the format version byte
+        while offset < len(data):
+            isbn_length = data[offset]
+            similar_isbn = data[offset + 1:offset + 1 + isbn_length].decode('utf-8')
+            offset += 1 + isbn_length
+            (score,) = struct.unpack_from('>H', data, offset)
+            offset += 2
+            neighbours.append((similar_isbn, score))
+        return neighbours
+
+    similar_isbns = [value['S'] for value in item.get('similar_isbns', {}).get('L', [])]
+    scores = [int(value['N']) for value in item.get('scores', {}).get('L', [])]
+    return list(zip(similar_isbns, scores))
@@ -0,0 +1,100 @@
+import time
+import hashlib
+import boto3
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+def lambda_handler(event, context):
+    """
+    Decide whether this pipeline execution should train, so that one upload batch causes one run.
+    Executions started by earlier uploads of a batch, by byte-identical re-uploads, or while another
+    execution is training the same inputs are skipped; a run on different inputs waits and retries.
+    """
+    s3 = boto3.client('s3')
+    dynamodb_resource = boto3.resource('dynamodb')
+
+    # Configuration
+    BUCKET_NAME = "book-recommender-raw-data"
+    REQUIRED_FILES = ["Books.csv", "Ratings.csv"]
+    MANIFEST_KEY = "_READY"
+    QUIET_WINDOW_SECONDS = 120
+    PIPELINE_STATE_TABLE = "PipelineState"
+    LOCK_TTL_SECONDS = 6 * 60 * 60
+
+    state_table = dynamodb_resource.Table(PIPELINE_STATE_TABLE)
+    execution_name = event.get('execution')
+    trigger_key = (event.get('event') or {}).get('detail', {}).get('object', {}).get('key')
+
+    results = {
+        "proceed": False,
+        "retry": False,
+        "reason": "",
+        "fingerprint": None,
+        "etags": {}
+    }
+
+    # Check 1: All inputs are present; the event for the missing file will start its own execution
+    last_modified = {}
+    for file_name in REQUIRED_FILES + [MANIFEST_KEY]:
+        try:
+            response = s3.head_object(Bucket=BUCKET_NAME, Key=file_name)
+            last_modified[file_name] = response['LastModified']
+            if file_name != MANIFEST_KEY:
+                results["etags"][file_name] = f"{response['ETag']}:{response['ContentLength']}"
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                raise e
+            if file_name != MANIFEST_KEY:
+                results["reason"] = f"Waiting for {file_name}"
+                return results
+
+    # Check 2: The upload batch has settled
+    newest_data_file = max(last_modified[file_name] for file_name in REQUIRED_FILES)
+    if trigger_key != MANIFEST_KEY:
+        if MANIFEST_KEY in last_modified and last_modified[MANIFEST_KEY] >= newest_data_file:
+            results["reason"] = "Batch is handled by the execution started for its manifest"
+            return results
+        quiet_seconds = (datetime.now(timezone.utc) - max(last_modified.values())).total_seconds()
+        if quiet_seconds < QUIET_WINDOW_SECONDS:
+            results["reason"] = "Superseded by a later upload in the same batch"
+            return results
+
+    # Check 3: The inputs differ from the ones behind the active version
+    fingerprint = hashlib.sha256(
+        "\n".join(f"{file_name}:{results['etags'][file_name]}" for file_name in REQUIRED_FILES).encode('utf-8')
+    ).hexdigest()
+    results["fingerprint"] = fingerprint
+
+    active_version = state_table.get_item(Key={'id': 'active-version'}, ConsistentRead=True).get('Item', {})
+    if active_version.get('input_fingerprint') == fingerprint:
+        results["reason"] = f"Inputs unchanged since version {active_version.get('version')}"
+        return results
+
+    # Check 4: Claim the run lock so concurrent executions for the same inputs merge into one
+    now = int(time.time())
+    try:
+        state_table.put_item(
+            Item={
+                'id': 'run-lock',
+                'execution_name': execution_name,
+                'fingerprint': fingerprint,
+                'expires_at': now + LOCK_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(#id) OR expires_at < :now',
+            ExpressionAttributeNames={'#id': 'id'},
+            ExpressionAttributeValues={':now': now}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise e
+        lock = state_table.get_item(Key={'id': 'run-lock'}, ConsistentRead=True).get('Item', {})
+        if lock.get('fingerprint') == fingerprint:
+            results["reason"] = f"Same inputs are being trained by execution {lock.get('execution_name')}"
+        else:
+            results["retry"] = True
+            results["reason"] = f"Execution {lock.get('execution_name')} is training older inputs"
+        return results
+
+    results["proceed"] = True
+    results["reason"] = "Inputs settled and changed since the active version"
+    return results
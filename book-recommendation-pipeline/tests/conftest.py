@@ -0,0 +1,27 @@
+import os
+import sys
+import subprocess
+import pytest
+
+# Local tests of the training library with the NumPy backend; the Spark comparisons run
+# when pyspark (and a Java runtime) is installed and are skipped otherwise.
+#
+#   cd book-recommendation-pipeline && python -m pytest tests
+
+PIPELINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(PIPELINE_DIR, 'benchmarks')
+sys.path[:0] = [os.path.join(PIPELINE_DIR, 'glue'), BENCHMARKS_DIR]
+
+# The generated dataset the recorded Spark reference was computed on
+REFERENCE_DATASET = 'books-10000'
+REFERENCE_PATH = os.path.join(BENCHMARKS_DIR, 'references', f"spark-{REFERENCE_DATASET}.json")
+
+@pytest.fixture(scope='session')
+def dataset_dir(tmp_path_factory):
+    """The reference dataset, regenerated with generate_data.py's default seed"""
+    output = tmp_path_factory.mktemp('data') / REFERENCE_DATASET
+    subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, 'generate_data.py'), '--books', '10000', '--output', str(output)],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    return str(output)
@@ -0,0 +1,36 @@
+import json
+import numpy as np
+import pytest
+from conftest import REFERENCE_PATH
+from compare_backends import backend_outputs, compare, DEFAULT_RMSE_TOLERANCE
+from recommender import numpy_backend
+
+@pytest.fixture(scope='module')
+def spark_reference():
+    with open(REFERENCE_PATH, encoding='utf-8') as reference_file:
+        return json.load(reference_file)
+
+@pytest.fixture(scope='module')
+def numpy_outputs(dataset_dir):
+    return backend_outputs('numpy', dataset_dir, ['cooccurrence', 'als'])
+
+def test_numpy_backend_matches_recorded_spark_outputs(spark_reference, numpy_outputs):
+    assert compare(spark_reference, numpy_outputs, DEFAULT_RMSE_TOLERANCE) == []
+
+def test_spark_backend_matches_numpy_backend(dataset_dir, numpy_outputs):
+    pytest.importorskip('pyspark')
+    from pyspark.sql import SparkSession
+    spark = SparkSession.builder.master('local[2]').appName('book-recommender-tests').getOrCreate()
+    try:
+        spark_outputs = backend_outputs('spark', dataset_dir, ['cooccurrence', 'als'], spark=spark)
+    finally:
+        spark.stop()
+    assert compare(spark_outputs, numpy_outputs, DEFAULT_RMSE_TOLERANCE) == []
+
+def test_training_split_does_not_depend_on_row_order():
+    user_ids = np.array([str(user_id) for user_id in range(5000)])
+    isbns = np.array([f"{isbn:010d}" for isbn in range(5000)])
+    training = numpy_backend.training_split(user_ids, isbns)
+    order = np.random.default_rng(0).permutation(len(user_ids))
+    assert (numpy_backend.training_split(user_ids[order], isbns[order]) == training[order]).all()
+    assert 0.77 < training.mean() < 0.83
@@ -0,0 +1,36 @@
+import json
+import numpy as np
+import pandas as pd
+from recommender.indexes import build_title_index, build_trigram_index
+
+def book_mapping(rows):
+    """A book mapping frame with the columns the index builders read"""
+    frame = pd.DataFrame(rows, columns=['ISBN', 'BookTitle', 'BookAuthor', 'YearOfPublication', 'Publisher', 'book_rating_count'])
+    frame['ImageURLSmall'] = frame['ImageURLMedium'] = None
+    frame['book_rating_sum'] = frame['book_rating_count'] * 7
+    return frame
+
+BOOKS = book_mapping([
+    ('0001', 'The Hobbit', 'J. R. R. Tolkien', '1937', 'Allen & Unwin', 40),
+    ('0002', 'The Road', np.nan, '2006', np.nan, 90),
+    ('0003', 'Road to Nowhere', None, '1999', 'Penguin', 90),
+    ('0004', 'Hobbit Tales', 'Anon', 'unknown', 'Penguin', 5)
+])
+
+def test_missing_text_is_valid_json():
+    title_index = build_title_index(BOOKS)
+    assert [book[2] for book in title_index['books']] == ['J. R. R. Tolkien', '', '', 'Anon']
+    json.dumps(title_index, allow_nan=False)
+    json.dumps(build_trigram_index(BOOKS), allow_nan=False)
+
+def test_positions_by_rating_count():
+    title_index = build_title_index(BOOKS)
+    refs, books = title_index['refs'], title_index['books']
+    positions = title_index['by_rating_count']
+    assert sorted(positions) == list(range(len(refs)))
+    counts = [books[refs[position]][3] for position in positions]
+    assert counts == sorted(counts, reverse=True)
+    # Ties keep key order, as ranking a key range with heapq.nlargest would
+    for first, second in zip(positions, positions[1:]):
+        if books[refs[first]][3] == books[refs[second]][3]:
+            assert first < second
@@ -0,0 +1,32 @@
+import numpy as np
+from scipy.optimize import nnls
+from recommender.numpy_backend import nonnegative_solve
+
+def random_systems(rng, count, rank, ratings):
+    """Regularized normal equations of count rows with the given ratings each, as ALS builds them"""
+    fixed = rng.normal(size=(count, ratings, rank))
+    gram = np.einsum('nij,nik->njk', fixed, fixed) + 0.1 * ratings * np.eye(rank)
+    rhs = np.einsum('nij,ni->nj', fixed, rng.integers(1, 11, size=(count, ratings)).astype(float))
+    return gram, rhs
+
+def reference_solve(gram, rhs):
+    lower = np.linalg.cholesky(gram)
+    return nnls(lower.T, np.linalg.solve(lower, rhs))[0]
+
+def test_matches_scipy_nnls():
+    rng = np.random.default_rng(7)
+    gram, rhs = random_systems(rng, 500, 10, 15)
+    start = np.maximum(np.linalg.solve(gram, rhs[..., None])[..., 0], 0.0)
+    solution = nonnegative_solve(gram, rhs, start)
+    expected = np.array([reference_solve(g, b) for g, b in zip(gram, rhs)])
+    assert np.abs(solution - expected).max() < 1e-9
+
+def test_solution_satisfies_optimality_conditions():
+    rng = np.random.default_rng(11)
+    gram, rhs = random_systems(rng, 200, 10, 3)
+    solution = nonnegative_solve(gram, rhs, np.zeros_like(rhs))
+    gradient = np.einsum('ijk,ik->ij', gram, solution) - rhs
+    assert (solution >= 0).all()
+    # Free factors have zero gradient and zero factors a nonnegative one
+    assert np.abs(gradient[solution > 0]).max() < 1e-8
+    assert (gradient[solution == 0] > -1e-8).all()
@@ -0,0 +1,38 @@
+import os
+import sys
+import json
+import pytest
+import run_local
+
+@pytest.mark.parametrize('engine', ['als', 'cooccurrence'])
+def test_run_local_writes_consistent_outputs(dataset_dir, tmp_path, monkeypatch, engine):
+    output = tmp_path / engine
+    monkeypatch.setattr(sys, 'argv', [
+        'run_local.py', '--books', os.path.join(dataset_dir, 'Books.csv'), '--ratings', os.path.join(dataset_dir, 'Ratings.csv'),
+        '--output', str(output), '--engine', engine, '--data-version', '20260101T000000Z'
+    ])
+    run_local.main()
+
+    with open(output / 'manifest.json', encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+    def lines(name):
+        with open(output / name, encoding='utf-8') as items:
+            return [json.loads(line) for line in items]
+    books, similarities = lines('books.jsonl'), lines('similarities.jsonl')
+
+    assert manifest['books_table'] == 'Books-20260101T000000Z'
+    assert manifest['books_count'] == len(books)
+    assert manifest['similarity_items'] == len(similarities)
+    assert manifest['facet_terms'] == len(lines('search_facets.jsonl'))
+    assert manifest['list_items'] == len(lines('popular_lists.jsonl'))
+    assert sorted(manifest['isbns']) == sorted(item['isbn'] for item in similarities)
+    # Neighbours are books in the catalog, never the book itself, best first
+    catalog = {book['isbn'] for book in books}
+    for item in similarities:
+        assert item['neighbour_count'] == len(item['similar_isbns']) == len(item['scores'])
+        assert item['isbn'] not in item['similar_isbns'] and set(item['similar_isbns']) <= catalog
+        assert item['scores'] == sorted(item['scores'], reverse=True)
+        if manifest['complete_lists']:
+            assert item['neighbour_count'] == manifest['top_n']
+    for name in ('title_index.json.gz', 'catalog.bin', 'title_trigrams.json.gz', 'run_report.json'):
+        assert (output / name).stat().st_size > 0